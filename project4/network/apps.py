@@ -1,5 +1,13 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
 
 
 class NetworkConfig(AppConfig):
     name = 'network'
+
+    def ready(self):
+        from .db import configure_sqlite
+        from .instrumentation import install_query_recorder
+
+        connection_created.connect(configure_sqlite)
+        connection_created.connect(install_query_recorder)
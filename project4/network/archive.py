@@ -0,0 +1,72 @@
+"""
+Hot and cold storage for posts.
+
+`archive_posts` moves posts older than NETWORK_ARCHIVE_AFTER_DAYS out of
+the Post table into ArchivedPost, a narrow table with compressed content
+and a single (author, timestamp) index. Their likes, timeline entries and
+search index rows go with them, which is what keeps the Post table, its
+indexes and everything hanging off it sized by recent activity only.
+
+The global, Following and trending feeds and search read only the hot
+table. Profile feeds read through `profile_fetcher`, which pages past the
+author's hot posts into their archived ones, so old profile pages keep
+working. That only needs the archive once a page reaches the end of the
+hot posts, because every archived post is older than every hot one.
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import caching
+from .models import ArchivedPost, Post, compress_content
+from .pagination import merge, queryset_fetcher
+
+BATCH_SIZE = 1000
+
+
+def archive_posts(older_than_days, batch_size=BATCH_SIZE):
+    """
+    Move posts older than `older_than_days` into the archive, one
+    transaction per batch of `batch_size`, returning how many were moved.
+    Safe to rerun after an interruption.
+    """
+    cutoff = timezone.now() - timedelta(days=older_than_days)
+    moved = 0
+    while True:
+        with transaction.atomic():
+            posts = list(
+                Post.objects.filter(timestamp__lt=cutoff).order_by("pk").select_for_update()
+                .only("id", "author_id", "timestamp", "like_count", "content")[:batch_size]
+            )
+            if not posts:
+                break
+            ArchivedPost.objects.bulk_create([
+                ArchivedPost(
+                    id=post.id, author_id=post.author_id, timestamp=post.timestamp,
+                    like_count=post.like_count, data=compress_content(post.content),
+                )
+                for post in posts
+            ], ignore_conflicts=True)
+            Post.objects.filter(pk__in=[post.id for post in posts]).delete()
+        moved += len(posts)
+    if moved:
+        caching.feed_changed()
+    return moved
+
+
+def profile_fetcher(author):
+    """
+    A fetch(cursor, limit, offset) callable (see pagination.paginate) over
+    `author`'s hot and archived posts together.
+    """
+    hot = queryset_fetcher(Post.objects.filter(author=author).select_related("author"))
+    cold = queryset_fetcher(ArchivedPost.objects.filter(author=author).select_related("author"))
+
+    def fetch(cursor, limit, offset):
+        rows = hot(cursor, offset + limit, 0)
+        if len(rows) == offset + limit and not (cursor is not None and cursor.backwards):
+            return rows[offset:]
+        return merge(cursor, limit, offset, rows, cold(cursor, offset + limit, 0))
+
+    return fetch
@@ -0,0 +1,240 @@
+"""
+Production static files: bundling, fingerprinting, precompression and
+serving.
+
+`collectstatic` with StaticStorage concatenates and minifies each bundle in
+NETWORK_STATIC_BUNDLES, fingerprints every file with Django's manifest
+storage (so names change whenever contents do) and writes gzip, and with
+the optional `brotli` package brotli, variants of the fingerprinted files.
+Minification uses `rjsmin`/`rcssmin` when installed and otherwise only
+drops indentation, blank lines and whole-line comments, which is safe
+without a parser.
+
+StaticFilesMiddleware then serves STATIC_ROOT itself, sending the brotli or
+gzip variant when the client accepts it. Fingerprinted files are sent as immutable for
+a year, so browsers never ask for them again; anything else must be
+revalidated.
+
+Both only run with NETWORK_STATIC_PIPELINE on, which needs collectstatic
+to have been run. In development the `{% bundle %}` tag emits one tag per
+source file instead.
+"""
+import gzip
+import mimetypes
+import os
+import re
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage, staticfiles_storage
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.files.base import ContentFile
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.http import http_date
+from django.views.static import was_modified_since
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import rjsmin
+except ImportError:
+    rjsmin = None
+
+try:
+    import rcssmin
+except ImportError:
+    rcssmin = None
+
+COMPRESSIBLE = (".js", ".css", ".svg", ".txt", ".json", ".map", ".html")
+
+# Don't bother compressing files smaller than this.
+MIN_COMPRESS_SIZE = 200
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "public, max-age=0, must-revalidate"
+
+
+def minify_js(source):
+    if rjsmin is not None:
+        return rjsmin.jsmin(source)
+    lines = []
+    in_comment = False
+    for line in source.splitlines():
+        line = line.strip()
+        if in_comment:
+            in_comment = "*/" not in line
+            continue
+        if line.startswith("/*"):
+            in_comment = "*/" not in line
+            continue
+        if line and not line.startswith("//"):
+            lines.append(line)
+    # Keeping the newlines leaves automatic semicolon insertion unchanged.
+    return "\n".join(lines)
+
+
+def minify_css(source):
+    if rcssmin is not None:
+        return rcssmin.cssmin(source)
+    source = re.sub(r"/\*.*?\*/", "", source, flags=re.S)
+    source = re.sub(r"\s+", " ", source)
+    source = re.sub(r"\s*([{};,>])\s*", r"\1", source)
+    return source.replace(";}", "}").strip()
+
+
+def build_bundle(name, sources, read):
+    """
+    Concatenate and minify `sources`, read with `read(path)`, into the
+    contents of bundle `name`.
+    """
+    if name.endswith(".js"):
+        # The separator keeps a file without a final semicolon from running
+        # into the next one.
+        return ";\n".join(minify_js(read(source)) for source in sources) + "\n"
+    return "\n".join(minify_css(read(source)) for source in sources) + "\n"
+
+
+def compress(content):
+    """
+    Return an {extension: bytes} dict of the compressed variants of
+    `content` that are smaller than it.
+    """
+    variants = {".gz": gzip.compress(content, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants[".br"] = brotli.compress(content)
+    return {ext: data for ext, data in variants.items() if len(data) < len(content)}
+
+
+class StaticStorage(ManifestStaticFilesStorage):
+    """
+    Manifest storage that also builds the NETWORK_STATIC_BUNDLES and writes
+    compressed variants of the fingerprinted files.
+    """
+
+    def post_process(self, paths, dry_run=False, **options):
+        if not dry_run:
+            for name, sources in settings.NETWORK_STATIC_BUNDLES.items():
+                self._replace(name, build_bundle(name, sources, self._read).encode())
+                paths[name] = (self, name)
+
+        yield from super().post_process(paths, dry_run, **options)
+
+        if not dry_run:
+            for name in set(self.hashed_files.values()):
+                if name.endswith(COMPRESSIBLE):
+                    with self.open(name) as file:
+                        content = file.read()
+                    if len(content) >= MIN_COMPRESS_SIZE:
+                        for ext, data in compress(content).items():
+                            self._replace(name + ext, data)
+
+    def _read(self, name):
+        with self.open(name) as file:
+            return file.read().decode()
+
+    def _replace(self, name, content):
+        if self.exists(name):
+            self.delete(name)
+        self._save(name, ContentFile(content))
+
+
+def _accepted_encodings(request):
+    accepted = set()
+    for part in request.headers.get("Accept-Encoding", "").split(","):
+        coding, _, params = part.strip().partition(";")
+        if params.replace(" ", "") not in ("q=0", "q=0.0"):
+            accepted.add(coding.strip().lower())
+    return accepted
+
+
+class StaticFilesMiddleware:
+    """
+    Serves the files under STATIC_ROOT at STATIC_URL, precompressed where
+    possible. The directory is indexed once at startup, so run collectstatic
+    before starting the server. Put it first in MIDDLEWARE so asset requests
+    skip sessions, authentication and the request metrics.
+    """
+    sync_capable = True
+    async_capable = True
+
+    ENCODINGS = ((".br", "br"), (".gz", "gzip"))
+
+    def __init__(self, get_response):
+        if not settings.NETWORK_STATIC_PIPELINE or not settings.STATIC_ROOT:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        self.prefix = settings.STATIC_URL
+        self.files = self.index(settings.STATIC_ROOT)
+        self.immutable = set(getattr(staticfiles_storage, "hashed_files", {}).values())
+
+    @staticmethod
+    def index(root):
+        """
+        Map each file's name relative to `root` to its path on disk.
+        """
+        files = {}
+        for directory, _, names in os.walk(root):
+            for name in names:
+                path = os.path.join(directory, name)
+                files[os.path.relpath(path, root).replace(os.sep, "/")] = path
+        return files
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        response = self.serve(request)
+        if response is None:
+            response = self.get_response(request)
+        return response
+
+    async def __acall__(self, request):
+        response = self.serve(request)
+        if response is None:
+            response = await self.get_response(request)
+        return response
+
+    def serve(self, request):
+        """
+        Return the response for a static file request, or None if `request`
+        is not for a file under STATIC_ROOT.
+        """
+        if request.method not in ("GET", "HEAD") or not request.path.startswith(self.prefix):
+            return None
+        name = request.path[len(self.prefix):]
+        path = self.files.get(name)
+        if path is None:
+            return None
+
+        immutable = name in self.immutable
+        if not immutable:
+            modified = os.stat(path).st_mtime
+            if not was_modified_since(request.headers.get("If-Modified-Since"), modified):
+                return HttpResponseNotModified()
+
+        content_type, _ = mimetypes.guess_type(name)
+        encoding = None
+        accepted = _accepted_encodings(request)
+        for ext, coding in self.ENCODINGS:
+            if coding in accepted and name + ext in self.files:
+                path, encoding = self.files[name + ext], coding
+                break
+
+        with open(path, "rb") as file:
+            content = file.read()
+        response = HttpResponse(
+            b"" if request.method == "HEAD" else content,
+            content_type=content_type or "application/octet-stream")
+        response["Content-Length"] = len(content)
+        response["Cache-Control"] = IMMUTABLE if immutable else REVALIDATE
+        response["Vary"] = "Accept-Encoding"
+        response["X-Content-Type-Options"] = "nosniff"
+        if encoding:
+            response["Content-Encoding"] = encoding
+        if not immutable:
+            response["Last-Modified"] = http_date(modified)
+        return response
@@ -0,0 +1,17 @@
+"""
+The network URLs with the async feed and interaction views, and the live
+events stream, in place of their sync versions. project4/urls.py serves these when NETWORK_ASYNC_VIEWS
+is on, which project4/asgi.py enables by default.
+"""
+from django.urls import path
+
+from . import async_views, urls
+
+urlpatterns = [
+    path("", async_views.index, name="index"),
+    path("profile/<str:username>", async_views.profile, name="profile"),
+    path("following", async_views.following, name="following"),
+    path("edit_post/<int:post_id>", async_views.edit_post, name="edit_post"),
+    path("toggle_like/<int:post_id>", async_views.toggle_like, name="toggle_like"),
+    path("events", async_views.events_stream, name="events"),
+] + urls.urlpatterns
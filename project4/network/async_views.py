@@ -0,0 +1,148 @@
+"""
+Async versions of the feed and interaction views, served in place of the
+sync ones when the app runs under ASGI (see network/async_urls.py).
+
+Each view resolves the user with `request.auser()` up front and then only
+touches the database through the async ORM or `sync_to_async`, so a request
+waiting on the database never holds a worker thread of the server.
+Django runs all of a request's sync_to_async calls, the async ORM's
+included, one at a time on that request's own thread, so the views await
+their queries in turn: gathering them would not make them overlap. Queries
+of different requests do overlap.
+"""
+import json
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.decorators import login_required
+from django.http import JsonResponse, StreamingHttpResponse
+from django.shortcuts import render
+from django.views.decorators.http import require_http_methods
+
+from . import archive, caching, events, graph, likes, routing, throttling, timeline
+from .feeds import load_feed, load_page
+from .models import Post
+
+
+async def _resolve_user(request):
+    """
+    Load the user once, asynchronously, and pin it on the request so the
+    templates' `user` never triggers a sync session/user lookup.
+    """
+    request.user = await request.auser()
+    return request.user
+
+
+@routing.replica_reads
+@caching.cache_anonymous_page
+async def index(request):
+    await _resolve_user(request)
+    page_obj = await sync_to_async(load_feed)(request, Post.objects.all())
+    return render(request, "network/index.html", {
+        "page_obj": page_obj
+    })
+
+
+@routing.replica_reads
+@login_required
+async def profile(request, username):
+    """
+    Async version of `views.profile`.
+    """
+    user = await _resolve_user(request)
+    profile_user = await routing.aget_user(request, username)
+
+    page_obj = await sync_to_async(load_page)(request, archive.profile_fetcher(profile_user))
+    is_following, follows_you = False, False
+    if user.is_authenticated and user != profile_user:
+        is_following, follows_you = await sync_to_async(graph.get_graph().relationship)(
+            user.pk, profile_user.pk)
+
+    return render(request, "network/profile.html", {
+        "profile_user": profile_user,
+        "is_following": is_following,
+        "follows_you": follows_you,
+        "page_obj": page_obj,
+    })
+
+
+@routing.replica_reads
+@login_required
+async def following(request):
+    user = await _resolve_user(request)
+    page_obj = await sync_to_async(load_page)(request, timeline.fetcher(user))
+    suggested = await sync_to_async(graph.suggested_users)(user)
+    return render(request, "network/following.html", {
+        "page_obj": page_obj,
+        "suggested_users": suggested,
+    })
+
+
+@throttling.throttle("edit_post")
+@login_required
+@require_http_methods(["PUT"])
+async def edit_post(request, post_id):
+    try:
+        data = json.loads(request.body)
+    except json.JSONDecodeError:
+        return JsonResponse({"success": False, "error": "Invalid JSON"}, status=400)
+
+    new_content = data.get("content", "").strip()
+    if new_content == "":
+        return JsonResponse({"success": False, "error": "Content cannot be empty"}, status=400)
+
+    try:
+        post = await Post.objects.aget(pk=post_id)
+    except Post.DoesNotExist:
+        return JsonResponse({"success": False, "error": "Post not found"}, status=404)
+
+    user = await request.auser()
+    if post.author_id != user.pk:
+        return JsonResponse({"success": False, "error": "Not authorized"}, status=403)
+
+    post.content = new_content
+    await post.asave(update_fields=["content"])
+    await sync_to_async(caching.post_changed)(post.id)
+
+    return JsonResponse({"success": True, "new_content": post.content})
+
+
+@throttling.throttle("toggle_like")
+@login_required
+async def toggle_like(request, post_id):
+    if request.method != "PUT":
+        return JsonResponse({"error": "Invalid request method."}, status=400)
+
+    user = await request.auser()
+    try:
+        liked, like_count = await sync_to_async(likes.toggle)(post_id, user.id)
+    except Post.DoesNotExist:
+        return JsonResponse({"error": "Post not found."}, status=404)
+
+    return JsonResponse({
+        "success": True,
+        "liked": liked,
+        "likes": like_count
+    })
+
+
+@login_required
+async def events_stream(request):
+    """
+    Server-Sent Events stream of new posts by the people the user follows
+    and like counts for the posts listed in `?posts=1,2,3`.
+    """
+    user = await request.auser()
+    followed_ids = await sync_to_async(graph.get_graph().following)(user.pk)
+    watched_ids = {
+        int(post_id) for post_id in request.GET.get("posts", "").split(",")
+        if post_id.isdigit()
+    }
+
+    response = StreamingHttpResponse(
+        events.stream(user.pk, followed_ids, watched_ids),
+        content_type="text/event-stream",
+    )
+    response["Cache-Control"] = "no-cache"
+    # Stop nginx and similar proxies from buffering the stream.
+    response["X-Accel-Buffering"] = "no"
+    return response
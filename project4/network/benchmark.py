@@ -0,0 +1,309 @@
+"""
+Helpers shared by the benchmark management commands.
+
+Benchmarks drive the real views through Django's test Client against the
+configured database, so they measure the same code paths as production
+requests, minus the network and the WSGI/ASGI server.
+"""
+import asyncio
+import http.cookiejar
+import random
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from contextlib import ExitStack, contextmanager
+from types import SimpleNamespace
+
+from django.db import connections
+from django.test import AsyncClient, Client, override_settings
+from django.test.utils import (
+    CaptureQueriesContext, setup_test_environment, teardown_test_environment)
+
+# Users created by the seed_network command.
+SEED_PREFIX = "seed-"
+
+# Vocabulary of seeded posts; picked with zipf_weights so search terms
+# range from very common to rare.
+WORDS = (
+    "the a to and of in is it you that for on was with this my at be have "
+    "just so not but are day all time new like get one today love good what "
+    "now out up about back work people think great know really week night "
+    "home coffee music game city weekend project code python django friends "
+    "photo trip book movie summer launch update news team"
+).split()
+
+
+def zipf_weights(count, alpha):
+    """
+    Cumulative weights (for random.choices) giving the item at rank i a
+    probability proportional to 1 / (i + 1) ** alpha.
+    """
+    total, cumulative = 0.0, []
+    for rank in range(count):
+        total += 1 / (rank + 1) ** alpha
+        cumulative.append(total)
+    return cumulative
+
+
+def percentile(values, p):
+    """
+    The p-th percentile (0-100) of `values` by nearest rank.
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(int(round(p / 100 * len(ordered))) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+def summarize(latencies, elapsed, errors=0):
+    """
+    Throughput and latency percentiles (in milliseconds) for one run.
+    """
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "throughput": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+    }
+
+
+@contextmanager
+def test_environment():
+    """
+    Let the test Client talk to the app outside the test runner (it needs
+    "testserver" in ALLOWED_HOSTS, which this arranges). Write throttling
+    is switched off, since a benchmark is exactly the traffic it rejects.
+    """
+    setup_test_environment()
+    try:
+        with override_settings(NETWORK_THROTTLING=False):
+            yield
+    finally:
+        teardown_test_environment()
+
+
+def run_concurrently(worker, threads, duration):
+    """
+    Call `worker(client, index)` in a loop on `threads` threads for
+    `duration` seconds. Each thread gets its own Client and database
+    connection. Returns (latencies, elapsed, errors), the arguments of
+    `summarize`.
+    """
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def loop(index):
+        client = Client()
+        own_latencies, own_errors = [], 0
+        try:
+            while time.perf_counter() < deadline:
+                started = time.perf_counter()
+                try:
+                    ok = worker(client, index)
+                except Exception:
+                    ok = False
+                if ok:
+                    own_latencies.append(time.perf_counter() - started)
+                else:
+                    own_errors += 1
+        finally:
+            connections.close_all()
+        with lock:
+            latencies.extend(own_latencies)
+            errors.append(own_errors)
+
+    started = time.perf_counter()
+    workers = [threading.Thread(target=loop, args=(i,)) for i in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return latencies, time.perf_counter() - started, sum(errors)
+
+
+def run_concurrently_async(worker, concurrency, duration):
+    """
+    The asyncio counterpart of `run_concurrently`: runs `concurrency` tasks
+    each awaiting `worker(client, index)` with its own AsyncClient, all on
+    one event loop as under an ASGI server.
+    """
+    latencies = []
+    errors = 0
+
+    async def loop(index, deadline):
+        nonlocal errors
+        client = AsyncClient()
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                ok = await worker(client, index)
+            except Exception:
+                ok = False
+            if ok:
+                latencies.append(time.perf_counter() - started)
+            else:
+                errors += 1
+
+    async def main():
+        deadline = time.perf_counter() + duration
+        await asyncio.gather(*(loop(i, deadline) for i in range(concurrency)))
+
+    started = time.perf_counter()
+    asyncio.run(main())
+    connections.close_all()
+    return latencies, time.perf_counter() - started, errors
+
+
+def run_mix(actions, weights, threads, duration, client_factory):
+    """
+    Replay a weighted mix of `actions`, a {name: action(client)} dict of
+    callables returning True on success, on `threads` threads for
+    `duration` seconds. Each thread makes its client with
+    `client_factory(index)`. Returns ({name: (latencies, queries, errors)},
+    elapsed), where `queries` holds the number of database queries each
+    successful request ran, counted only for in-process clients.
+    """
+    names = list(actions)
+    cumulative = []
+    for name in names:
+        cumulative.append((cumulative[-1] if cumulative else 0) + weights.get(name, 0))
+    results = {name: ([], [], 0) for name in names}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def loop(index):
+        client = client_factory(index)
+        in_process = isinstance(client, Client)
+        own = {name: ([], [], 0) for name in names}
+        try:
+            while time.perf_counter() < deadline:
+                name = random.choices(names, cum_weights=cumulative)[0]
+                latencies, queries, errors = own[name]
+                with ExitStack() as stack:
+                    captured = [
+                        stack.enter_context(CaptureQueriesContext(connection))
+                        for connection in connections.all()
+                    ] if in_process else []
+                    started = time.perf_counter()
+                    try:
+                        ok = actions[name](client)
+                    except Exception:
+                        ok = False
+                    latency = time.perf_counter() - started
+                if ok:
+                    latencies.append(latency)
+                    if in_process:
+                        queries.append(sum(len(context) for context in captured))
+                else:
+                    own[name] = (latencies, queries, errors + 1)
+        finally:
+            connections.close_all()
+        with lock:
+            for name, (latencies, queries, errors) in own.items():
+                total = results[name]
+                results[name] = (total[0] + latencies, total[1] + queries, total[2] + errors)
+
+    started = time.perf_counter()
+    workers = [threading.Thread(target=loop, args=(i,)) for i in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return results, time.perf_counter() - started
+
+
+def summarize_mix(results, elapsed):
+    """
+    Per-view `summarize` output plus the mean queries per request.
+    """
+    views = {}
+    for name, (latencies, queries, errors) in results.items():
+        views[name] = summarize(latencies, elapsed, errors)
+        views[name]["queries_per_request"] = (
+            round(sum(queries) / len(queries), 2) if queries else None)
+    return views
+
+
+def compare(baseline, current, tolerance=0.1, query_slack=0.5):
+    """
+    Compare two benchmark reports and return a list of regressions: views
+    whose throughput fell or whose p95 latency rose by more than
+    `tolerance` (a fraction), or whose queries per request grew by more
+    than `query_slack`.
+    """
+    regressions = []
+    for name, before in baseline["views"].items():
+        after = current["views"].get(name)
+        if after is None:
+            continue
+        if after["throughput"] < before["throughput"] * (1 - tolerance):
+            regressions.append(
+                f"{name}: throughput {before['throughput']} -> {after['throughput']} req/s")
+        if after["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {before['p95_ms']} -> {after['p95_ms']} ms")
+        if (before["queries_per_request"] is not None
+                and after["queries_per_request"] is not None
+                and after["queries_per_request"] > before["queries_per_request"] + query_slack):
+            regressions.append(
+                f"{name}: queries per request {before['queries_per_request']} "
+                f"-> {after['queries_per_request']}")
+    return regressions
+
+
+class _NoRedirects(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class HttpClient:
+    """
+    A stand-in for the test Client that sends real HTTP requests to a
+    running server, keeping its cookies and passing the CSRF token on
+    unsafe requests. Redirects are not followed, as with the test Client.
+    """
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip("/")
+        self.cookies = http.cookiejar.CookieJar()
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(self.cookies), _NoRedirects)
+
+    def _cookie(self, name):
+        return next((cookie.value for cookie in self.cookies if cookie.name == name), None)
+
+    def request(self, method, path, body=None, content_type=None):
+        headers = {"Content-Type": content_type} if content_type else {}
+        if method not in ("GET", "HEAD") and self._cookie("csrftoken"):
+            headers["X-CSRFToken"] = self._cookie("csrftoken")
+            headers["Referer"] = self.base_url + path
+        request = urllib.request.Request(
+            self.base_url + path, data=body, headers=headers, method=method)
+        try:
+            with self.opener.open(request) as response:
+                response.read()
+                return SimpleNamespace(status_code=response.status)
+        except urllib.error.HTTPError as error:
+            return SimpleNamespace(status_code=error.code)
+
+    def get(self, path):
+        return self.request("GET", path)
+
+    def post(self, path, data=None):
+        body = urllib.parse.urlencode(data or {}).encode()
+        return self.request("POST", path, body, "application/x-www-form-urlencoded")
+
+    def put(self, path, data="", content_type="application/octet-stream"):
+        return self.request("PUT", path, data.encode(), content_type)
+
+    def login(self, login_path, username, password):
+        self.get(login_path)
+        response = self.post(login_path, {"username": username, "password": password})
+        return response.status_code == 302
@@ -0,0 +1,184 @@
+"""
+Response and fragment caching for the feeds.
+
+Cached entries are never deleted. Instead every key embeds a version
+number, and writes bump the version so stale entries stop being read and
+simply expire. There are four kinds of version:
+
+* the feed version, bumped by any write visible on the global feed, which
+  keys the full-page cache served to anonymous visitors;
+* one version per post, bumped when the post is edited or liked, which
+  keys the rendered post card fragment;
+* one timeline version per user, bumped when they follow or unfollow
+  someone, which together with the feed version keys their Following feed;
+* one graph version per user, bumped on the same writes, which tells every
+  process whether its in-memory copy of the user's follows is current
+  (see network/graph.py).
+
+Versions start from the current time rather than 1, so a version key that
+gets evicted can never come back as a number that was already used.
+"""
+import time
+from functools import wraps
+from hashlib import md5
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+
+FEED_VERSION_KEY = "network:feed-version"
+POST_VERSION_KEY = "network:post-version:{}"
+TIMELINE_VERSION_KEY = "network:timeline-version:{}"
+GRAPH_VERSION_KEY = "network:graph-version:{}"
+
+
+def _fresh_version():
+    return time.time_ns() // 1000
+
+
+def _get_versions(keys):
+    versions = cache.get_many(keys)
+    missing = {key: _fresh_version() for key in keys if key not in versions}
+    if missing:
+        # add() rather than set() so a concurrent bump is never overwritten.
+        for key, version in missing.items():
+            cache.add(key, version, None)
+        versions.update(cache.get_many(list(missing)))
+    return versions
+
+
+def _bump(key):
+    try:
+        return cache.incr(key)
+    except ValueError:
+        return _get_versions([key])[key]
+
+
+def feed_version():
+    return _get_versions([FEED_VERSION_KEY])[FEED_VERSION_KEY]
+
+
+def post_versions(post_ids):
+    """
+    Return a {post_id: version} dict for the given posts in one cache call.
+    """
+    keys = {POST_VERSION_KEY.format(post_id): post_id for post_id in post_ids}
+    if not keys:
+        return {}
+    versions = _get_versions(list(keys))
+    return {post_id: versions[key] for key, post_id in keys.items()}
+
+
+def timeline_version(user_id):
+    key = TIMELINE_VERSION_KEY.format(user_id)
+    return _get_versions([key])[key]
+
+
+def graph_versions(user_ids):
+    """
+    Return a {user_id: version} dict for the given users in one cache call.
+    """
+    keys = {GRAPH_VERSION_KEY.format(user_id): user_id for user_id in user_ids}
+    if not keys:
+        return {}
+    versions = _get_versions(list(keys))
+    return {user_id: versions[key] for key, user_id in keys.items()}
+
+
+def feed_changed():
+    """
+    Invalidate the cached anonymous feed pages.
+    """
+    _bump(FEED_VERSION_KEY)
+
+
+def post_changed(post_id):
+    """
+    Invalidate the cached card of one post and the pages showing it.
+    """
+    _bump(POST_VERSION_KEY.format(post_id))
+    feed_changed()
+
+
+def timeline_changed(user_id):
+    """
+    Invalidate anything derived from the user's Following feed.
+    """
+    _bump(TIMELINE_VERSION_KEY.format(user_id))
+
+
+def graph_changed(user_id):
+    """
+    Invalidate every cached copy of the user's follows, returning the new
+    graph version.
+    """
+    return _bump(GRAPH_VERSION_KEY.format(user_id))
+
+
+def feed_etag(request, *versions):
+    """
+    Build an ETag for a feed response from the path, the viewer and the
+    versions of everything the response was built from. Computing it runs
+    no feed query, so unchanged feeds are answered with a bare 304.
+    """
+    parts = [request.get_full_path(), request.user.pk, feed_version(), *versions]
+    return md5(":".join(map(str, parts)).encode()).hexdigest()
+
+
+def attach_cache_versions(posts):
+    """
+    Set `cache_version` on each post, used to key its card fragment.
+    """
+    versions = post_versions([post.id for post in posts])
+    for post in posts:
+        post.cache_version = versions[post.id]
+    return posts
+
+
+def _page_key(request):
+    path = md5(request.get_full_path().encode()).hexdigest()
+    return f"network:page:{feed_version()}:{path}"
+
+
+def cache_anonymous_page(view):
+    """
+    Serve anonymous visitors a cached copy of the page, keyed by the full
+    path and the current feed version. Logged-in users always get a fresh
+    render because the page carries their Like and Edit controls.
+    Works on both sync and async views.
+    """
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            if request.method != "GET" or (await request.auser()).is_authenticated:
+                return await view(request, *args, **kwargs)
+
+            key = await sync_to_async(_page_key)(request)
+            content = await cache.aget(key)
+            if content is not None:
+                return HttpResponse(content)
+
+            response = await view(request, *args, **kwargs)
+            if response.status_code == 200:
+                await cache.aset(key, response.content, settings.NETWORK_PAGE_CACHE_TIMEOUT)
+            return response
+
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if request.method != "GET" or request.user.is_authenticated:
+            return view(request, *args, **kwargs)
+
+        key = _page_key(request)
+        content = cache.get(key)
+        if content is not None:
+            return HttpResponse(content)
+
+        response = view(request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(key, response.content, settings.NETWORK_PAGE_CACHE_TIMEOUT)
+        return response
+
+    return wrapper
@@ -0,0 +1,64 @@
+"""
+Denormalized counters on User and Post.
+
+The views adjust these with F() expressions so concurrent requests never
+overwrite each other's increments. `rebuild_counters` recomputes every
+counter from the source tables and is used to repair any drift.
+"""
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import User, Post, Follow, ArchivedPost
+from .trending import rescored
+
+
+def adjust(queryset, **deltas):
+    """
+    Atomically add each delta to the matching counter column of every row in
+    the queryset, e.g. adjust(User.objects.filter(pk=1), post_count=1).
+    """
+    return queryset.update(**{
+        field: F(field) + delta for field, delta in deltas.items()
+    })
+
+
+def count_of(queryset, field):
+    """
+    Correlated subquery counting the rows of `queryset` whose `field` points
+    at the outer row, or 0 when there are none.
+    """
+    counted = (
+        queryset.filter(**{field: OuterRef("pk")})
+        .order_by()
+        .values(field)
+        .annotate(n=Count("*"))
+        .values("n")
+    )
+    return Coalesce(Subquery(counted, output_field=IntegerField()), 0)
+
+
+def post_count():
+    """
+    An expression counting each user's posts, hot and archived, for use in
+    User.objects.update().
+    """
+    return count_of(Post.objects.all(), "author") + count_of(ArchivedPost.objects.all(), "author")
+
+
+def rebuild_counters():
+    """
+    Recompute every denormalized counter from the Follow, Post, ArchivedPost
+    and likes tables, and the trending scores that depend on them. Each model is
+    updated with a single UPDATE statement.
+    """
+    likes = Post.likes.through.objects.all()
+    follows = Follow.objects.all()
+
+    like_count = count_of(likes, "post")
+    post_rows = Post.objects.update(like_count=like_count, trending_score=rescored(like_count))
+    user_rows = User.objects.update(
+        follower_count=count_of(follows, "following"),
+        following_count=count_of(follows, "follower"),
+        post_count=post_count(),
+    )
+    return user_rows, post_rows
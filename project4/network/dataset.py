@@ -0,0 +1,182 @@
+"""
+Streaming export and import of the network's data as NDJSON.
+
+An export is one JSON object per line in dependency order: users, then
+follows, then posts, each post carrying the ids of the users who liked it
+(none for archived posts, which keep only a like count). Every table is
+read with .iterator(), so memory stays flat however large the tables are;
+likes are attached to their posts by walking both tables in post id order
+side by side.
+
+An import inserts rows with bulk_create in batches, one transaction per
+batch, and maps the file's ids to the ones the database assigns. Users are
+matched by username, so a user that already exists is reused rather than
+duplicated. Each batch also saves the number of lines done in
+ImportProgress, so an interrupted import resumes after the last committed
+batch; user lines are always re-read to rebuild the id map, which is
+harmless because they are matched by username.
+"""
+import json
+from collections import Counter
+
+from django.db import transaction
+from django.utils.dateparse import parse_datetime
+
+from .likes import Like
+from .models import User, Post, ArchivedPost, Follow, ImportProgress
+
+FORMAT_VERSION = 1
+CHUNK_SIZE = 2000
+BATCH_SIZE = 5000
+
+USER_FIELDS = (
+    "username", "email", "password", "first_name", "last_name",
+    "is_active", "date_joined", "last_login",
+)
+
+
+def _encode(value):
+    # Full isoformat keeps microseconds, which DjangoJSONEncoder drops.
+    return value.isoformat()
+
+
+def export(out, chunk_size=CHUNK_SIZE):
+    """
+    Write every user, follow, post and like to the `out` text stream and
+    return the number of rows written per type.
+    """
+    counts = Counter()
+
+    def write(row):
+        out.write(json.dumps(row, default=_encode))
+        out.write("\n")
+        counts[row["type"]] += 1
+
+    write({"type": "meta", "version": FORMAT_VERSION})
+
+    users = User.objects.order_by("pk").values("id", *USER_FIELDS)
+    for user in users.iterator(chunk_size=chunk_size):
+        write({"type": "user", **user})
+
+    follows = Follow.objects.order_by("pk").values_list("follower_id", "following_id")
+    for follower_id, following_id in follows.iterator(chunk_size=chunk_size):
+        write({"type": "follow", "follower": follower_id, "following": following_id})
+
+    likes = (
+        Like.objects.order_by("post_id", "user_id")
+        .values_list("post_id", "user_id").iterator(chunk_size=chunk_size)
+    )
+    like = next(likes, None)
+    posts = Post.objects.order_by("pk").values_list("id", "author_id", "content", "timestamp")
+    for post_id, author_id, content, timestamp in posts.iterator(chunk_size=chunk_size):
+        liked_by = []
+        while like is not None and like[0] <= post_id:
+            if like[0] == post_id:
+                liked_by.append(like[1])
+            like = next(likes, None)
+        counts["like"] += len(liked_by)
+        write({
+            "type": "post", "id": post_id, "author": author_id,
+            "content": content, "timestamp": timestamp, "likes": liked_by,
+        })
+
+    # Archived posts only kept the number of their likes, not who liked them.
+    archived = ArchivedPost.objects.order_by("pk").only("id", "author_id", "timestamp", "data")
+    for post in archived.iterator(chunk_size=chunk_size):
+        write({
+            "type": "post", "id": post.id, "author": post.author_id,
+            "content": post.content, "timestamp": post.timestamp, "likes": [],
+        })
+
+    del counts["meta"]
+    return counts
+
+
+class Importer:
+    """
+    Loads an export file into the database, see the module docstring.
+    `source` names the file in ImportProgress.
+    """
+
+    def __init__(self, source, batch_size=BATCH_SIZE, restart=False):
+        self.batch_size = batch_size
+        self.progress, _ = ImportProgress.objects.get_or_create(source=source)
+        if restart:
+            self.progress.line = 0
+            self.progress.save()
+        self.resumed_from = self.progress.line
+        self.user_ids = {}
+        self.counts = Counter()
+
+    def run(self, lines):
+        """
+        Import the rows in `lines` and return the number imported per type.
+        """
+        kind, batch, last = None, [], 0
+        for number, line in enumerate(lines, 1):
+            row = json.loads(line)
+            if row["type"] == "meta":
+                if row["version"] != FORMAT_VERSION:
+                    raise ValueError(f"Unsupported export format version {row['version']}.")
+                continue
+            if number <= self.resumed_from and row["type"] != "user":
+                continue
+            if batch and (row["type"] != kind or len(batch) >= self.batch_size):
+                self.flush(kind, batch, last)
+                batch = []
+            kind, last = row["type"], number
+            batch.append(row)
+        if batch:
+            self.flush(kind, batch, last)
+        return self.counts
+
+    def flush(self, kind, rows, last_line):
+        with transaction.atomic():
+            getattr(self, f"import_{kind}s")(rows)
+            if last_line > self.progress.line:
+                self.progress.line = last_line
+                self.progress.save(update_fields=["line", "updated"])
+
+    def import_users(self, rows):
+        User.objects.bulk_create([
+            User(**{
+                **{field: row[field] for field in USER_FIELDS},
+                "date_joined": parse_datetime(row["date_joined"]),
+                "last_login": row["last_login"] and parse_datetime(row["last_login"]),
+            })
+            for row in rows
+        ], ignore_conflicts=True)
+        found = dict(
+            User.objects.filter(username__in=[row["username"] for row in rows])
+            .values_list("username", "pk")
+        )
+        for row in rows:
+            self.user_ids[row["id"]] = found[row["username"]]
+        self.counts["user"] += len(rows)
+
+    def import_follows(self, rows):
+        follows = [
+            Follow(follower_id=self.user_ids[row["follower"]],
+                   following_id=self.user_ids[row["following"]])
+            for row in rows
+            if row["follower"] in self.user_ids and row["following"] in self.user_ids
+        ]
+        Follow.objects.bulk_create(follows, ignore_conflicts=True)
+        self.counts["follow"] += len(follows)
+
+    def import_posts(self, rows):
+        rows = [row for row in rows if row["author"] in self.user_ids]
+        posts = Post.objects.bulk_create([
+            Post(author_id=self.user_ids[row["author"]], content=row["content"],
+                 timestamp=parse_datetime(row["timestamp"]))
+            for row in rows
+        ])
+        likes = [
+            Like(post_id=post.pk, user_id=self.user_ids[user_id])
+            for post, row in zip(posts, rows)
+            for user_id in row["likes"]
+            if user_id in self.user_ids
+        ]
+        Like.objects.bulk_create(likes, ignore_conflicts=True)
+        self.counts["post"] += len(posts)
+        self.counts["like"] += len(likes)
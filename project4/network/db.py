@@ -0,0 +1,17 @@
+"""
+Database connection setup.
+"""
+from django.conf import settings
+
+
+def configure_sqlite(sender, connection, **kwargs):
+    """
+    connection_created handler applying NETWORK_SQLITE_PRAGMAS to every new
+    SQLite connection. WAL lets readers run alongside the single writer and
+    synchronous=NORMAL only syncs at checkpoints, which is safe under WAL.
+    """
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        for name, value in settings.NETWORK_SQLITE_PRAGMAS.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
@@ -0,0 +1,150 @@
+"""
+Real-time push of new posts and like counts over Server-Sent Events.
+
+Writes publish small events to a broker, and every open `/events` stream
+subscribes to it and forwards the events its viewer cares about: new posts
+by authors they follow, and like counts of the posts they have on screen.
+
+Streams never forward events one by one. They collect them for
+NETWORK_PUSH_INTERVAL seconds and send one coalesced batch, keeping only
+the latest count per post, so however hot a post gets each connection
+receives at most one update for it per interval.
+
+The broker is pluggable through NETWORK_EVENT_BROKER. The default
+LocalBroker only reaches streams served by the same process; a
+multi-process deployment needs a broker with the same three methods
+backed by a shared channel such as Redis pub/sub.
+"""
+import asyncio
+import json
+import threading
+from collections import namedtuple
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+KEEP_ALIVE_SECONDS = 15
+
+Subscription = namedtuple("Subscription", ["queue", "loop"])
+
+
+class LocalBroker:
+    """
+    In-process pub/sub. Each subscription is an asyncio queue on the event
+    loop that created it; `publish` is safe to call from any thread.
+    """
+
+    def __init__(self, queue_size=1000):
+        self.queue_size = queue_size
+        self._subscriptions = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self):
+        subscription = Subscription(
+            asyncio.Queue(self.queue_size), asyncio.get_running_loop())
+        with self._lock:
+            self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    def publish(self, event):
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(_offer, subscription.queue, event)
+            except RuntimeError:
+                # The subscriber's loop has closed.
+                self.unsubscribe(subscription)
+
+
+def _offer(queue, event):
+    # A subscriber too slow to keep up loses events rather than memory;
+    # every event carries absolute state, so later ones repair the gap.
+    try:
+        queue.put_nowait(event)
+    except asyncio.QueueFull:
+        pass
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    with _broker_lock:
+        if _broker is None:
+            _broker = import_string(settings.NETWORK_EVENT_BROKER)()
+        return _broker
+
+
+def post_created(post):
+    get_broker().publish({
+        "type": "post", "id": post.id, "author_id": post.author_id,
+    })
+
+
+def likes_changed(post_id, like_count):
+    get_broker().publish({"type": "likes", "post": post_id, "likes": like_count})
+
+
+def follow_changed(follower_id, following_id, active):
+    get_broker().publish({
+        "type": "follow", "follower": follower_id,
+        "following": following_id, "active": active,
+    })
+
+
+def format_event(name, data):
+    return f"event: {name}\ndata: {json.dumps(data)}\n\n"
+
+
+async def stream(user_id, followed_ids, watched_ids, interval=None, broker=None):
+    """
+    Yield SSE messages for one connection until the client goes away.
+
+    `followed_ids` is updated as the user follows and unfollows people;
+    `watched_ids` are the posts whose like counts the client displays.
+    """
+    interval = interval or settings.NETWORK_PUSH_INTERVAL
+    broker = broker or get_broker()
+    subscription = broker.subscribe()
+    loop = asyncio.get_running_loop()
+    followed_ids = set(followed_ids)
+    try:
+        yield ": connected\n\n"
+        last_sent = loop.time()
+        while True:
+            new_posts, like_counts = [], {}
+            deadline = loop.time() + interval
+            while (remaining := deadline - loop.time()) > 0:
+                try:
+                    event = await asyncio.wait_for(subscription.queue.get(), remaining)
+                except asyncio.TimeoutError:
+                    break
+                kind = event["type"]
+                if kind == "likes" and event["post"] in watched_ids:
+                    like_counts[event["post"]] = event["likes"]
+                elif kind == "post" and event["author_id"] in followed_ids:
+                    new_posts.append(event["id"])
+                elif kind == "follow" and event["follower"] == user_id:
+                    if event["active"]:
+                        followed_ids.add(event["following"])
+                    else:
+                        followed_ids.discard(event["following"])
+
+            if new_posts:
+                yield format_event("posts", {"count": len(new_posts), "ids": new_posts})
+            if like_counts:
+                yield format_event("likes", like_counts)
+            if new_posts or like_counts:
+                last_sent = loop.time()
+            elif loop.time() - last_sent >= KEEP_ALIVE_SECONDS:
+                yield ": keep-alive\n\n"
+                last_sent = loop.time()
+    finally:
+        broker.unsubscribe(subscription)
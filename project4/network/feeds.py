@@ -0,0 +1,77 @@
+"""
+Feed loading shared by the index, profile and following views.
+
+A feed is a Post queryset turned into one page of posts that carry
+everything the post card templates need, so rendering a page costs the
+same fixed number of queries whatever its size.
+"""
+from .caching import attach_cache_versions
+from .models import Post
+from .pagination import paginate, queryset_fetcher
+
+PAGE_SIZE = 10
+
+
+def attach_viewer_context(posts, viewer):
+    """
+    Mark every post with `viewer_liked`, fetching the viewer's likes for the
+    whole list in a single query.
+    """
+    posts = list(posts)
+    liked_ids = set()
+    if viewer.is_authenticated and posts:
+        liked_ids = set(
+            Post.likes.through.objects
+            .filter(user_id=viewer.id, post_id__in=[post.id for post in posts])
+            .values_list("post_id", flat=True)
+        )
+    for post in posts:
+        post.viewer_liked = post.id in liked_ids
+    return posts
+
+
+def load_feed(request, posts):
+    """
+    Return the requested cursor page of `posts` for the current viewer,
+    with the cache versions that key each post's card fragment.
+
+    Authors are joined in with select_related and like counts come from the
+    stored `like_count` column, so the page itself is one query plus one for
+    the viewer's likes.
+    """
+    return load_page(request, queryset_fetcher(posts.select_related("author")))
+
+
+def load_page(request, fetch):
+    """
+    Like `load_feed`, for feeds that read their rows through a custom
+    fetch(cursor, limit, offset) callable instead of a single queryset.
+    """
+    page_obj = paginate(request, fetch, PAGE_SIZE)
+    page_obj.object_list = attach_viewer_context(page_obj.object_list, request.user)
+    attach_cache_versions(page_obj.object_list)
+    return page_obj
+
+
+def serialize_post(post, viewer):
+    """
+    The compact JSON form of a post used by the feed API.
+    """
+    return {
+        "id": post.id,
+        "author": post.author.username,
+        "content": post.content,
+        "timestamp": post.timestamp.isoformat(),
+        "likes": post.like_count,
+        "liked": post.viewer_liked,
+        "editable": post.author_id == viewer.pk and not post.archived,
+        "archived": post.archived,
+    }
+
+
+def serialize_page(page_obj, viewer):
+    return {
+        "posts": [serialize_post(post, viewer) for post in page_obj],
+        "next": page_obj.next_cursor,
+        "previous": page_obj.previous_cursor,
+    }
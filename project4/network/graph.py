@@ -0,0 +1,207 @@
+"""
+Follow-graph queries answered from compact in-memory adjacency lists.
+
+The first time a user's follows are needed they are loaded, through the
+(follower, following) unique index, into a sorted array of user ids:
+8 bytes per edge instead of the ~60 a set of ints costs, with membership
+checked by binary search. The lists live in a per-process LRU cache
+bounded by the total number of ids it holds (NETWORK_GRAPH_CACHE_IDS).
+
+Each list remembers the user's graph version (see network/caching.py) it
+was loaded at and is reloaded once the version moves, so a follow made in
+another process is seen on the next lookup when the cache is shared.
+Follows made in this process are applied to the cached list directly
+instead of reloading it. As the versions are only seen by processes
+sharing the cache, lists are also reloaded once they are
+NETWORK_GRAPH_MAX_AGE seconds old, which bounds how stale a list can get
+with a per-process cache. Lists are always loaded from the primary
+database: one read from a lagging replica would be stamped with the
+current version and kept until it expired.
+"""
+import random
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import Counter, OrderedDict
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+from . import caching
+from .models import User, Follow
+
+
+def _contains(ids, user_id):
+    index = bisect_left(ids, user_id)
+    return index < len(ids) and ids[index] == user_id
+
+
+def _weight(ids):
+    # Count the entry itself too, so empty lists still use up the budget.
+    return len(ids) + 1
+
+
+class FollowGraph:
+    """
+    LRU cache of who each user follows, with the graph queries built on it.
+    Safe to share between threads.
+    """
+
+    def __init__(self, max_ids):
+        self.max_ids = max_ids
+        self._lists = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def _store(self, user_id, version, loaded, ids):
+        self._discard(user_id)
+        if _weight(ids) > self.max_ids:
+            return
+        self._lists[user_id] = (version, loaded, ids)
+        self._size += _weight(ids)
+        while self._size > self.max_ids:
+            _, (_, _, evicted) = self._lists.popitem(last=False)
+            self._size -= _weight(evicted)
+
+    def _discard(self, user_id):
+        cached = self._lists.pop(user_id, None)
+        if cached is not None:
+            self._size -= _weight(cached[2])
+
+    def clear(self):
+        with self._lock:
+            self._lists.clear()
+            self._size = 0
+
+    def following_many(self, user_ids):
+        """
+        Return {user_id: sorted array of the ids they follow}, loading all
+        the lists that are missing or stale with a single query.
+        """
+        user_ids = set(user_ids)
+        # Read the versions before loading, so a follow landing in between
+        # leaves the list marked stale rather than current.
+        versions = caching.graph_versions(user_ids)
+        now = time.monotonic()
+        oldest = now - settings.NETWORK_GRAPH_MAX_AGE
+        found, missing = {}, []
+        with self._lock:
+            for user_id in user_ids:
+                cached = self._lists.get(user_id)
+                if cached is not None and cached[0] == versions[user_id] and cached[1] >= oldest:
+                    self._lists.move_to_end(user_id)
+                    found[user_id] = cached[2]
+                else:
+                    missing.append(user_id)
+
+        if missing:
+            loaded = {user_id: array("q") for user_id in missing}
+            rows = (
+                Follow.objects.using(DEFAULT_DB_ALIAS).filter(follower_id__in=missing)
+                .order_by("follower_id", "following_id")
+                .values_list("follower_id", "following_id")
+            )
+            for follower_id, following_id in rows.iterator():
+                loaded[follower_id].append(following_id)
+            with self._lock:
+                for user_id, ids in loaded.items():
+                    self._store(user_id, versions[user_id], now, ids)
+            found.update(loaded)
+        return found
+
+    def following(self, user_id):
+        return self.following_many([user_id])[user_id]
+
+    def is_following(self, follower_id, following_id):
+        return _contains(self.following(follower_id), following_id)
+
+    def following_among(self, follower_id, user_ids):
+        """
+        Return the subset of `user_ids` that `follower_id` follows, e.g. the
+        authors on a page of posts, with one lookup.
+        """
+        followed = self.following(follower_id)
+        return {user_id for user_id in user_ids if _contains(followed, user_id)}
+
+    def relationship(self, viewer_id, user_id):
+        """
+        Return (viewer follows user, user follows viewer).
+        """
+        lists = self.following_many([viewer_id, user_id])
+        return _contains(lists[viewer_id], user_id), _contains(lists[user_id], viewer_id)
+
+    def is_mutual(self, user_id, other_id):
+        return all(self.relationship(user_id, other_id))
+
+    def suggestions(self, user_id, limit=5, sources=None):
+        """
+        Who to follow: users followed by the people `user_id` follows,
+        ranked by how many of those people follow them. Reads the lists of
+        at most NETWORK_GRAPH_SUGGESTION_SOURCES followed users, sampled at
+        random when there are more. Returns [(user_id, overlap)].
+        """
+        sources = sources or settings.NETWORK_GRAPH_SUGGESTION_SOURCES
+        followed = self.following(user_id)
+        sample = followed if len(followed) <= sources else random.sample(followed, sources)
+
+        overlap = Counter()
+        for ids in self.following_many(sample).values():
+            overlap.update(ids)
+        candidates = [
+            (candidate, count) for candidate, count in overlap.items()
+            if candidate != user_id and not _contains(followed, candidate)
+        ]
+        candidates.sort(key=lambda item: (-item[1], item[0]))
+        return candidates[:limit]
+
+    def follow_changed(self, follower_id, following_id, active):
+        """
+        Record that `follower_id` followed (`active`) or unfollowed
+        `following_id`, updating this process's copy in place and
+        invalidating everyone else's.
+        """
+        version = caching.graph_changed(follower_id)
+        with self._lock:
+            cached = self._lists.get(follower_id)
+            if cached is None:
+                return
+            if cached[0] != version - 1:
+                # Another write got in first; reload on next use.
+                self._discard(follower_id)
+                return
+            ids = array("q", cached[2])
+            index = bisect_left(ids, following_id)
+            present = index < len(ids) and ids[index] == following_id
+            if active and not present:
+                ids.insert(index, following_id)
+            elif not active and present:
+                del ids[index]
+            self._store(follower_id, version, cached[1], ids)
+
+
+_graph = None
+_graph_lock = threading.Lock()
+
+
+def get_graph():
+    global _graph
+    with _graph_lock:
+        if _graph is None:
+            _graph = FollowGraph(settings.NETWORK_GRAPH_CACHE_IDS)
+        return _graph
+
+
+def suggested_users(user, limit=5):
+    """
+    Return the User objects suggested to `user`, best first, each with an
+    `overlap` attribute: how many people `user` follows also follow them.
+    """
+    ranked = get_graph().suggestions(user.pk, limit)
+    found = User.objects.in_bulk([user_id for user_id, _ in ranked])
+    suggested = []
+    for user_id, overlap in ranked:
+        if user_id in found:
+            found[user_id].overlap = overlap
+            suggested.append(found[user_id])
+    return suggested
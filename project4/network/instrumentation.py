@@ -0,0 +1,172 @@
+"""
+Per-request performance instrumentation.
+
+InstrumentationMiddleware times every request and gives it a RequestStats
+object, held in a context variable so it follows the request into the
+threads async views run their queries on. While the request runs:
+
+* `record_query`, installed on every database connection by apps.py,
+  adds each query and its duration;
+* the DjangoTemplates backend below adds the time spent rendering.
+
+When the response is ready the totals go into the histograms in
+network/metrics.py, labelled with the view name, and a sample of requests
+slower than NETWORK_SLOW_REQUEST_SECONDS is logged with its slowest
+queries.
+"""
+import heapq
+import logging
+import random
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.template.backends import django as django_backend
+
+from . import metrics
+
+logger = logging.getLogger("network.slow_requests")
+
+_current = ContextVar("network_request_stats", default=None)
+
+
+class RequestStats:
+    __slots__ = ("queries", "db_time", "template_time")
+
+    def __init__(self):
+        self.queries = []
+        self.db_time = 0.0
+        self.template_time = 0.0
+
+
+def record_query(execute, sql, params, many, context):
+    """
+    Database execute wrapper adding the query to the current request's
+    stats, if any.
+    """
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = time.perf_counter() - started
+        stats.db_time += duration
+        stats.queries.append((duration, sql))
+
+
+def install_query_recorder(sender, connection, **kwargs):
+    """
+    connection_created handler putting `record_query` on every connection.
+    A per-request `connection.execute_wrapper()` would only see the
+    request thread's connections, not those of async views' ORM threads.
+    """
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class TimedTemplate:
+    """
+    Wraps a backend template to add its render time to the current
+    request's stats. Templates it includes are timed as part of it.
+    """
+
+    def __init__(self, template):
+        self.template = template
+
+    def __getattr__(self, name):
+        return getattr(self.template, name)
+
+    def render(self, context=None, request=None):
+        stats = _current.get()
+        if stats is None:
+            return self.template.render(context, request)
+        started = time.perf_counter()
+        try:
+            return self.template.render(context, request)
+        finally:
+            stats.template_time += time.perf_counter() - started
+
+
+class DjangoTemplates(django_backend.DjangoTemplates):
+    """
+    The Django template backend, with render times recorded.
+    """
+
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name))
+
+
+def _view_name(request):
+    match = getattr(request, "resolver_match", None)
+    if match is None:
+        return "unmatched"
+    return match.view_name
+
+
+def _log_slow_request(request, response, stats, elapsed):
+    slowest = heapq.nlargest(
+        settings.NETWORK_SLOW_REQUEST_TOP_QUERIES, stats.queries, key=lambda query: query[0])
+    logger.warning(
+        "Slow request %s %s -> %s: %.1f ms, %d queries in %.1f ms, templates %.1f ms\n%s",
+        request.method, request.get_full_path(), response.status_code,
+        elapsed * 1000, len(stats.queries), stats.db_time * 1000,
+        stats.template_time * 1000,
+        "\n".join(f"  {duration * 1000:.1f} ms  {sql}" for duration, sql in slowest),
+    )
+
+
+class InstrumentationMiddleware:
+    """
+    Records wall time, database queries and time, template time and
+    response size for every request. Put it first in MIDDLEWARE so the
+    session and authentication lookups are measured too.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats, started = RequestStats(), time.perf_counter()
+        token = _current.set(stats)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.record(request, response, stats, time.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        stats, started = RequestStats(), time.perf_counter()
+        token = _current.set(stats)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.record(request, response, stats, time.perf_counter() - started)
+        return response
+
+    def record(self, request, response, stats, elapsed):
+        view = _view_name(request)
+        metrics.request_duration.labels(view=view).observe(elapsed)
+        metrics.db_queries.labels(view=view).observe(len(stats.queries))
+        metrics.db_duration.labels(view=view).observe(stats.db_time)
+        metrics.template_duration.labels(view=view).observe(stats.template_time)
+        if not response.streaming:
+            metrics.response_size.labels(view=view).observe(len(response.content))
+        metrics.requests.labels(view=view, status=str(response.status_code)).inc()
+
+        if (elapsed >= settings.NETWORK_SLOW_REQUEST_SECONDS
+                and random.random() < settings.NETWORK_SLOW_REQUEST_SAMPLE_RATE):
+            _log_slow_request(request, response, stats, elapsed)
@@ -0,0 +1,247 @@
+"""
+The like/unlike write path.
+
+`toggle` flips a like with one delete-or-insert on the likes table and a
+single counter UPDATE on the post, without loading the post or its likes.
+
+With NETWORK_LIKE_BUFFERING enabled, toggles are instead recorded in an
+in-process LikeBuffer and written in bulk: one bulk insert, one delete per
+post and one counter recount for all touched posts. Flushes are idempotent
+and failed ones are retried, so every recorded event reaches the database
+at least once as long as the process shuts down cleanly (the buffer is
+flushed from an atexit hook).
+"""
+import atexit
+import logging
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import IntegrityError, connections, transaction
+from django.db.models import F
+
+from . import caching, events
+from .trending import rescored
+from .counters import count_of
+from .models import User, Post
+
+logger = logging.getLogger(__name__)
+
+Like = Post.likes.through
+
+
+def _insert(post_id, user_id):
+    """
+    Insert a like row, returning False if it already existed.
+    """
+    try:
+        with transaction.atomic():
+            Like.objects.create(post_id=post_id, user_id=user_id)
+    except IntegrityError:
+        return False
+    return True
+
+
+def write_like(post_id, user_id):
+    """
+    Flip the user's like on the post straight in the database and return
+    (liked, like_count). Raises Post.DoesNotExist for unknown posts.
+    """
+    with transaction.atomic():
+        removed, _ = Like.objects.filter(post_id=post_id, user_id=user_id).delete()
+        if removed:
+            liked, delta = False, -1
+        else:
+            liked, delta = True, int(_insert(post_id, user_id))
+
+        # The counter update doubles as the check that the post exists.
+        updated = Post.objects.filter(pk=post_id).update(
+            like_count=F("like_count") + delta,
+            trending_score=rescored(F("like_count") + delta))
+        if not updated:
+            raise Post.DoesNotExist
+
+    like_count = Post.objects.values_list("like_count", flat=True).get(pk=post_id)
+    return liked, like_count
+
+
+class LikeBuffer:
+    """
+    Collects like and unlike events in memory and writes them in bulk.
+
+    Events are keyed by (post_id, user_id), so repeated toggles by the same
+    user collapse into their final state before reaching the database.
+    The batch being written stays visible to `toggle` as `_inflight` until
+    it commits, so a toggle arriving meanwhile flips the buffered state
+    rather than the stale stored one.
+    """
+
+    def __init__(self, max_events=500, max_delay=1.0):
+        self.max_events = max_events
+        self.max_delay = max_delay
+        self._lock = threading.Lock()
+        # Held for a whole flush, so only one batch is ever in flight.
+        self._flush_lock = threading.Lock()
+        self._pending = {}
+        self._deltas = defaultdict(int)
+        self._inflight = {}
+        self._inflight_deltas = defaultdict(int)
+        self._commits = 0
+        self._timer = None
+
+    def __len__(self):
+        return len(self._pending)
+
+    def toggle(self, post_id, user_id):
+        """
+        Flip the user's like on the post and return (liked, like_count) as
+        they will be once the buffer is flushed.
+        """
+        key = (post_id, user_id)
+        while True:
+            with self._lock:
+                commits = self._commits
+            like_count = Post.objects.values_list("like_count", flat=True).get(pk=post_id)
+            stored = Like.objects.filter(post_id=post_id, user_id=user_id).exists()
+            self._lock.acquire()
+            if self._commits == commits:
+                break
+            # A batch committed after the reads above, which then missed it.
+            self._lock.release()
+
+        try:
+            liked = not self._pending.get(key, self._inflight.get(key, stored))
+            self._pending[key] = liked
+            self._deltas[post_id] += 1 if liked else -1
+            like_count += self._deltas[post_id] + self._inflight_deltas[post_id]
+            full = len(self._pending) >= self.max_events
+            if not full and self._timer is None:
+                self._timer = threading.Timer(self.max_delay, self._flush_in_background)
+                self._timer.daemon = True
+                self._timer.start()
+        finally:
+            self._lock.release()
+
+        if full:
+            self.flush()
+        return liked, max(like_count, 0)
+
+    def flush(self):
+        """
+        Write every pending event. If the write fails, the events go back
+        into the buffer (unless newer ones replaced them) and the error is
+        raised. Events for posts or users that no longer exist are dropped.
+        Returns the number of events written.
+        """
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+                self._inflight = batch
+                self._deltas, self._inflight_deltas = defaultdict(int), self._deltas
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+            if not batch:
+                return 0
+
+            try:
+                written = self._write(batch)
+            except Exception:
+                with self._lock:
+                    for key, liked in batch.items():
+                        self._pending.setdefault(key, liked)
+                    for post_id, delta in self._inflight_deltas.items():
+                        self._deltas[post_id] += delta
+                    self._inflight, self._inflight_deltas = {}, defaultdict(int)
+                raise
+            with self._lock:
+                self._inflight, self._inflight_deltas = {}, defaultdict(int)
+                self._commits += 1
+
+        touched = {post_id for post_id, _ in batch}
+        for post_id in touched:
+            caching.post_changed(post_id)
+        for post_id, like_count in Post.objects.filter(pk__in=touched).values_list("id", "like_count"):
+            events.likes_changed(post_id, like_count)
+        return written
+
+    def _write(self, batch):
+        with transaction.atomic():
+            # Posts deleted or archived since their events were buffered,
+            # and users deleted since, would fail the whole batch on the
+            # foreign keys. Their events are dropped; locking the posts
+            # keeps the rest from being deleted until the batch commits.
+            existing_posts = set(
+                Post.objects.select_for_update()
+                .filter(pk__in={post_id for post_id, _ in batch}).values_list("pk", flat=True)
+            )
+            existing_users = set(
+                User.objects.filter(pk__in={user_id for _, user_id in batch})
+                .values_list("pk", flat=True)
+            )
+            batch = {
+                (post_id, user_id): liked for (post_id, user_id), liked in batch.items()
+                if post_id in existing_posts and user_id in existing_users
+            }
+            added = [
+                Like(post_id=post_id, user_id=user_id)
+                for (post_id, user_id), liked in batch.items() if liked
+            ]
+            removed = defaultdict(list)
+            for (post_id, user_id), liked in batch.items():
+                if not liked:
+                    removed[post_id].append(user_id)
+            touched = {post_id for post_id, _ in batch}
+
+            Like.objects.bulk_create(added, batch_size=500, ignore_conflicts=True)
+            for post_id, user_ids in removed.items():
+                Like.objects.filter(post_id=post_id, user_id__in=user_ids).delete()
+            # Recounting rather than adding deltas keeps replays idempotent.
+            like_count = count_of(Like.objects.all(), "post")
+            Post.objects.filter(pk__in=touched).update(
+                like_count=like_count, trending_score=rescored(like_count))
+        return len(batch)
+
+    def _flush_in_background(self):
+        try:
+            self.flush()
+        except Exception:
+            logger.exception("Failed to flush buffered likes, will retry")
+            with self._lock:
+                if self._timer is None:
+                    self._timer = threading.Timer(self.max_delay, self._flush_in_background)
+                    self._timer.daemon = True
+                    self._timer.start()
+        finally:
+            connections.close_all()
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_buffer():
+    """
+    Return this process's LikeBuffer, creating it (and its shutdown hook)
+    on first use.
+    """
+    global _buffer
+    with _buffer_lock:
+        if _buffer is None:
+            _buffer = LikeBuffer(
+                settings.NETWORK_LIKE_BUFFER_SIZE, settings.NETWORK_LIKE_BUFFER_DELAY)
+            atexit.register(_buffer.flush)
+        return _buffer
+
+
+def toggle(post_id, user_id):
+    """
+    Flip a like through the configured write path, returning
+    (liked, like_count).
+    """
+    if settings.NETWORK_LIKE_BUFFERING:
+        return get_buffer().toggle(post_id, user_id)
+    liked, like_count = write_like(post_id, user_id)
+    caching.post_changed(post_id)
+    events.likes_changed(post_id, like_count)
+    return liked, like_count
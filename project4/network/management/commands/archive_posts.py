@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from network.archive import BATCH_SIZE, archive_posts
+
+
+class Command(BaseCommand):
+    help = (
+        "Move posts older than NETWORK_ARCHIVE_AFTER_DAYS from the posts table to "
+        "the compressed archive, in batches. Safe to run repeatedly, e.g. nightly."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--older-than", type=int, default=None,
+            help="Age in days (default NETWORK_ARCHIVE_AFTER_DAYS).")
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        days = options["older_than"]
+        if days is None:
+            days = settings.NETWORK_ARCHIVE_AFTER_DAYS
+        moved = archive_posts(days, options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Archived {moved} posts older than {days} days."))
@@ -0,0 +1,118 @@
+import json
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection
+from django.db.models import Count, Sum
+from django.db.models.functions import Length
+
+from network.archive import archive_posts
+from network.benchmark import summarize
+from network.models import ArchivedPost, Post, User
+
+TABLES = ("network_post", "network_post_likes", "network_timelineentry", "network_archivedpost")
+
+
+class Command(BaseCommand):
+    help = (
+        "Report the database size and hot posts table scan times, archive posts "
+        "older than --older-than days, compact the database and report them again. "
+        "The posts really are archived, so run it on a seeded copy, e.g. a "
+        "separate NETWORK_SQLITE_PATH."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--older-than", type=int, default=None,
+            help="Age in days (default NETWORK_ARCHIVE_AFTER_DAYS).")
+        parser.add_argument("--repeat", type=int, default=20, help="Runs of each scan.")
+
+    def handle(self, *args, **options):
+        days = options["older_than"]
+        if days is None:
+            days = settings.NETWORK_ARCHIVE_AFTER_DAYS
+        before = self.measure(options["repeat"])
+        started = time.perf_counter()
+        moved = archive_posts(days)
+        archive_seconds = time.perf_counter() - started
+        self.compact()
+        report = {
+            "database": connection.vendor,
+            "older_than_days": days,
+            "archived": moved,
+            "archive_seconds": round(archive_seconds, 2),
+            "before": before,
+            "after": self.measure(options["repeat"]),
+        }
+        self.stdout.write(json.dumps(report, indent=2))
+
+    def measure(self, repeat):
+        # A profile with the most posts, read back to its last hot ones.
+        author = User.objects.order_by("-post_count").first()
+        scans = {
+            "full_scan": lambda: Post.objects.aggregate(rows=Count("id"), chars=Sum(Length("content"))),
+            "index_page": lambda: list(Post.objects.order_by("-timestamp", "-id")[:11]),
+            "profile_oldest_hot_page": lambda: list(
+                Post.objects.filter(author=author).order_by("timestamp", "id")[:11]),
+        }
+        timings = {}
+        for name, scan in scans.items():
+            latencies = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                scan()
+                latencies.append(time.perf_counter() - started)
+            timings[name] = summarize(latencies, sum(latencies))
+        return {
+            "database_bytes": self.database_size(),
+            "table_bytes": self.table_sizes(),
+            "hot_posts": Post.objects.count(),
+            "archived_posts": ArchivedPost.objects.count(),
+            "scans": timings,
+        }
+
+    def database_size(self):
+        with connection.cursor() as cursor:
+            if connection.vendor == "sqlite":
+                cursor.execute("PRAGMA page_count")
+                pages = cursor.fetchone()[0]
+                cursor.execute("PRAGMA page_size")
+                return pages * cursor.fetchone()[0]
+            if connection.vendor == "postgresql":
+                cursor.execute("SELECT pg_database_size(current_database())")
+                return cursor.fetchone()[0]
+        return None
+
+    def table_sizes(self):
+        """
+        Bytes used by each of TABLES and its indexes, where the database can
+        tell (SQLite needs the dbstat table, which most builds include).
+        """
+        with connection.cursor() as cursor:
+            if connection.vendor == "postgresql":
+                sizes = {}
+                for table in TABLES:
+                    cursor.execute("SELECT pg_total_relation_size(%s)", [table])
+                    sizes[table] = cursor.fetchone()[0]
+                return sizes
+            if connection.vendor == "sqlite":
+                try:
+                    cursor.execute(
+                        "SELECT m.tbl_name, SUM(s.pgsize) FROM dbstat s "
+                        "JOIN sqlite_master m ON m.name = s.name GROUP BY m.tbl_name")
+                except OperationalError:
+                    return None
+                return {table: size for table, size in cursor.fetchall() if table in TABLES}
+        return None
+
+    def compact(self):
+        """
+        Return the space freed by the archived rows to the filesystem, so
+        the size after is comparable.
+        """
+        with connection.cursor() as cursor:
+            if connection.vendor == "sqlite":
+                cursor.execute("VACUUM")
+            elif connection.vendor == "postgresql":
+                cursor.execute(f"VACUUM FULL ANALYZE {', '.join(TABLES)}")
@@ -0,0 +1,74 @@
+import json
+import random
+
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from network import timeline
+from network.benchmark import (
+    run_concurrently, run_concurrently_async, summarize, test_environment)
+from network.models import User, Post, Follow
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare requests/sec and latency of the sync views under WSGI-style "
+        "threads with the async views on one ASGI event loop, at the same "
+        "concurrency, over a mix of feed page reads."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--concurrency", type=int, default=32)
+        parser.add_argument("--duration", type=float, default=10.0, help="Seconds per run.")
+        parser.add_argument("--users", type=int, default=20)
+        parser.add_argument("--posts", type=int, default=200)
+
+    def handle(self, *args, **options):
+        users = [
+            User.objects.create_user(f"bench-asgi-{i}", password="bench")
+            for i in range(options["users"])
+        ]
+        for _ in range(options["posts"]):
+            Post.objects.create(author=random.choice(users), content="benchmark")
+        for user in users:
+            for followed in random.sample(users, min(5, len(users))):
+                if followed != user:
+                    Follow.objects.get_or_create(follower=user, following=followed)
+            timeline.rebuild(user)
+
+        def pick_url(index):
+            roll = random.random()
+            if roll < 0.5:
+                return reverse("index")
+            if roll < 0.8:
+                return reverse("following")
+            return reverse("profile", args=[random.choice(users).username])
+
+        def wsgi_worker(client, index):
+            if not getattr(client, "logged_in", False):
+                client.force_login(users[index % len(users)])
+                client.logged_in = True
+            return client.get(pick_url(index)).status_code == 200
+
+        async def asgi_worker(client, index):
+            if not getattr(client, "logged_in", False):
+                await client.aforce_login(users[index % len(users)])
+                client.logged_in = True
+            return (await client.get(pick_url(index))).status_code == 200
+
+        results = {}
+        try:
+            with test_environment():
+                with override_settings(ROOT_URLCONF="network.urls"):
+                    results["wsgi"] = summarize(*run_concurrently(
+                        wsgi_worker, options["concurrency"], options["duration"]))
+                with override_settings(ROOT_URLCONF="network.async_urls"):
+                    results["asgi"] = summarize(*run_concurrently_async(
+                        asgi_worker, options["concurrency"], options["duration"]))
+        finally:
+            User.objects.filter(username__startswith="bench-asgi-").delete()
+
+        results["concurrency"] = options["concurrency"]
+        self.stdout.write(json.dumps(results, indent=2))
+
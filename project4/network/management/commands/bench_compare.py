@@ -0,0 +1,47 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from network.benchmark import compare
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare two bench_endpoints reports and fail when any view got slower "
+        "or runs more queries than the baseline allows, for use as a "
+        "regression gate."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("baseline", help="Report of the reference run.")
+        parser.add_argument("current", help="Report of the run to check.")
+        parser.add_argument(
+            "--tolerance", type=float, default=0.1,
+            help="Allowed fractional drop in throughput or rise in p95 latency.")
+        parser.add_argument(
+            "--query-slack", type=float, default=0.5,
+            help="Allowed rise in mean queries per request.")
+
+    def handle(self, *args, **options):
+        with open(options["baseline"]) as file:
+            baseline = json.load(file)
+        with open(options["current"]) as file:
+            current = json.load(file)
+
+        for name, after in current["views"].items():
+            before = baseline["views"].get(name)
+            if before is None:
+                self.stdout.write(f"{name:<18} (new)")
+                continue
+            self.stdout.write(
+                f"{name:<18} {before['throughput']:>8} -> {after['throughput']:>8} req/s  "
+                f"p95 {before['p95_ms']:>8} -> {after['p95_ms']:>8} ms  "
+                f"queries {before['queries_per_request']} -> {after['queries_per_request']}"
+            )
+
+        regressions = compare(
+            baseline, current, options["tolerance"], options["query_slack"])
+        if regressions:
+            raise CommandError(
+                f"{len(regressions)} regression(s):\n" + "\n".join(regressions))
+        self.stdout.write(self.style.SUCCESS("No regressions."))
@@ -0,0 +1,153 @@
+import json
+import random
+from datetime import datetime, timezone
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.urls import reverse
+
+from network.benchmark import (
+    SEED_PREFIX, WORDS, HttpClient, run_mix, summarize, summarize_mix, test_environment)
+from network.models import User, Post
+
+# Relative weight of each view in the default workload, roughly the shape
+# of a read-heavy social feed.
+DEFAULT_MIX = {
+    "index": 25,
+    "following": 20,
+    "profile": 12,
+    "api_posts": 8,
+    "api_following": 5,
+    "api_profile_posts": 3,
+    "search": 4,
+    "api_search": 2,
+    "toggle_like": 12,
+    "new_post": 4,
+    "edit_post": 2,
+    "toggle_follow": 3,
+}
+
+
+def parse_mix(value):
+    """
+    Parse "index=30,toggle_like=10" into weights; unknown views are an error.
+    """
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        if name not in DEFAULT_MIX:
+            raise CommandError(f"Unknown view in --mix: {name}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+class Command(BaseCommand):
+    help = (
+        "Replay a mixed workload over every network view and report throughput, "
+        "latency percentiles and queries per request for each one, as JSON. Run "
+        "seed_network first. By default requests go through the test Client in "
+        "this process; with --url they are sent to a running server instead "
+        "(queries per request are then not available, and the server should run "
+        "with NETWORK_THROTTLING=0). Compare two reports with bench_compare."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=4)
+        parser.add_argument("--duration", type=float, default=10.0, help="Seconds.")
+        parser.add_argument(
+            "--mix", type=parse_mix,
+            help="Comma separated view=weight pairs replacing the default mix.")
+        parser.add_argument("--url", help="Base URL of a running server to benchmark.")
+        parser.add_argument("--output", help="Also write the report to this file.")
+        parser.add_argument("--seed", type=int, help="Random seed for the workload.")
+
+    def handle(self, *args, **options):
+        if options["seed"] is not None:
+            random.seed(options["seed"])
+        mix = options["mix"] or DEFAULT_MIX
+
+        seeded = User.objects.filter(username__startswith=SEED_PREFIX)
+        viewers = list(
+            seeded.filter(following_count__gt=0, post_count__gt=0)[:options["threads"] * 4])
+        if not viewers:
+            raise CommandError("No seeded users with posts and follows; run seed_network first.")
+        usernames = list(seeded.order_by("-follower_count").values_list("username", flat=True)[:200])
+        post_ids = list(Post.objects.order_by("-timestamp").values_list("id", flat=True)[:1000])
+        own_posts = {
+            viewer.pk: list(Post.objects.filter(author=viewer).values_list("id", flat=True)[:50])
+            for viewer in viewers
+        }
+
+        def make_client(index):
+            viewer = viewers[index % len(viewers)]
+            if options["url"]:
+                client = HttpClient(options["url"])
+                if not client.login(reverse("login"), viewer.username, "seed"):
+                    raise CommandError(f"Could not log in as {viewer.username}.")
+            else:
+                client = Client()
+                client.force_login(viewer)
+            client.viewer = viewer
+            return client
+
+        def get(client, url):
+            return client.get(url).status_code == 200
+
+        actions = {
+            "index": lambda client: get(client, reverse("index")),
+            "following": lambda client: get(client, reverse("following")),
+            "profile": lambda client: get(
+                client, reverse("profile", args=[random.choice(usernames)])),
+            "api_posts": lambda client: get(client, reverse("api_posts")),
+            "api_following": lambda client: get(client, reverse("api_following")),
+            "api_profile_posts": lambda client: get(
+                client, reverse("api_profile_posts", args=[random.choice(usernames)])),
+            "search": lambda client: get(
+                client, reverse("search") + "?q=" + random.choice(WORDS)),
+            "api_search": lambda client: get(
+                client, reverse("api_search") + "?q=" + random.choice(WORDS)),
+            "toggle_like": lambda client: client.put(
+                reverse("toggle_like", args=[random.choice(post_ids)])).status_code == 200,
+            "new_post": lambda client: client.post(
+                reverse("new_post"), {"content": " ".join(random.choices(WORDS, k=12))}
+            ).status_code == 302,
+            "edit_post": lambda client: client.put(
+                reverse("edit_post", args=[random.choice(own_posts[client.viewer.pk])]),
+                json.dumps({"content": " ".join(random.choices(WORDS, k=12))}),
+                content_type="application/json",
+            ).status_code == 200,
+            "toggle_follow": lambda client: client.post(
+                reverse("toggle_follow", args=[random.choice(usernames)])).status_code == 302,
+        }
+        actions = {name: action for name, action in actions.items() if mix.get(name)}
+
+        if options["url"]:
+            results, elapsed = run_mix(
+                actions, mix, options["threads"], options["duration"], make_client)
+        else:
+            with test_environment():
+                results, elapsed = run_mix(
+                    actions, mix, options["threads"], options["duration"], make_client)
+
+        latencies = [latency for view in results.values() for latency in view[0]]
+        errors = sum(view[2] for view in results.values())
+        report = {
+            "meta": {
+                "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                "target": options["url"] or "test-client",
+                "database": connection.vendor,
+                "threads": options["threads"],
+                "duration": options["duration"],
+                "mix": mix,
+                "users": seeded.count(),
+                "posts": Post.objects.count(),
+            },
+            "total": summarize(latencies, elapsed, errors),
+            "views": summarize_mix(results, elapsed),
+        }
+        output = json.dumps(report, indent=2)
+        if options["output"]:
+            with open(options["output"], "w") as file:
+                file.write(output + "\n")
+        self.stdout.write(output)
@@ -0,0 +1,82 @@
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from network.benchmark import SEED_PREFIX, summarize, test_environment
+from network.models import User
+
+ENGINES = ("db", "cached_db", "signed_cookies")
+
+SESSION_TABLE = "django_session"
+
+
+class Command(BaseCommand):
+    help = (
+        "Request the feed pages with each session engine, as an anonymous visitor "
+        "and as a logged-in user, and report queries per request, how many of "
+        "them hit the session table, and latency. Run seed_network first."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=200, help="Per page and viewer.")
+        parser.add_argument(
+            "--engines", default=",".join(ENGINES),
+            help="Comma separated engines from django.contrib.sessions.backends.")
+
+    def handle(self, *args, **options):
+        viewer = (
+            User.objects.filter(username__startswith=SEED_PREFIX, following_count__gt=0)
+            .order_by("pk").first()
+        )
+        if viewer is None:
+            raise CommandError("No seeded users with follows; run seed_network first.")
+        pages = {
+            "anonymous": ["index", "api_posts"],
+            "logged_in": ["index", "api_posts", "following"],
+        }
+
+        report = {"database": connection.vendor, "requests": options["requests"], "engines": {}}
+        with test_environment():
+            for engine in options["engines"].split(","):
+                engine_path = f"django.contrib.sessions.backends.{engine}"
+                with override_settings(SESSION_ENGINE=engine_path):
+                    caches[settings.SESSION_CACHE_ALIAS].clear()
+                    results = {}
+                    for kind, names in pages.items():
+                        client = Client()
+                        if kind == "logged_in":
+                            client.force_login(viewer)
+                        for name in names:
+                            results[f"{kind}:{name}"] = self.measure(
+                                client, reverse(name), options["requests"])
+                    report["engines"][engine] = results
+        self.stdout.write(json.dumps(report, indent=2))
+
+    def measure(self, client, url, count):
+        """
+        Request `url` `count` times after one warm-up request, which fills
+        the page and session caches the way a running server would have.
+        """
+        client.get(url)
+        latencies, queries, session_queries = [], 0, 0
+        for _ in range(count):
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                response = client.get(url)
+                latencies.append(time.perf_counter() - started)
+            if response.status_code != 200:
+                raise CommandError(f"{url} returned {response.status_code}.")
+            queries += len(captured)
+            session_queries += sum(SESSION_TABLE in query["sql"] for query in captured)
+        return {
+            **summarize(latencies, sum(latencies)),
+            "queries_per_request": round(queries / count, 2),
+            "session_queries_per_request": round(session_queries / count, 2),
+        }
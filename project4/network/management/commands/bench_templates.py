@@ -0,0 +1,63 @@
+import json
+import time
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.template.loader import get_template
+from django.test import RequestFactory
+
+from network.benchmark import SEED_PREFIX, percentile
+from network.caching import attach_cache_versions
+from network.feeds import attach_viewer_context
+from network.models import User, Post
+from network.pagination import CursorPage
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure how long the feed template takes to render pages of 10, 50 and "
+        "100 posts for a logged-in viewer, with the post card fragment cache "
+        "cold (every card rendered) and warm. Run seed_network first."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", default="10,50,100", help="Comma separated page sizes.")
+        parser.add_argument("--repeat", type=int, default=50, help="Renders per measurement.")
+        parser.add_argument("--template", default="network/index.html")
+
+    def handle(self, *args, **options):
+        viewer = User.objects.filter(username__startswith=SEED_PREFIX).order_by("pk").first()
+        if viewer is None:
+            raise CommandError("No seeded users; run seed_network first.")
+        request = RequestFactory().get("/")
+        request.user = viewer
+        template = get_template(options["template"])
+
+        report = {"template": options["template"], "repeat": options["repeat"], "pages": {}}
+        for size in (int(size) for size in options["sizes"].split(",")):
+            posts = attach_viewer_context(
+                Post.objects.select_related("author")[:size], viewer)
+            if len(posts) < size:
+                raise CommandError(f"Only {len(posts)} posts; seed more for --sizes {size}.")
+
+            def render(cold):
+                if cold:
+                    cache.clear()
+                attach_cache_versions(posts)
+                page_obj = CursorPage(posts, True, False)
+                started = time.perf_counter()
+                template.render({"page_obj": page_obj}, request)
+                return time.perf_counter() - started
+
+            report["pages"][size] = {
+                mode: self.summarize([render(mode == "cold") for _ in range(options["repeat"])])
+                for mode in ("cold", "warm")
+            }
+        self.stdout.write(json.dumps(report, indent=2))
+
+    def summarize(self, timings):
+        return {
+            "mean_ms": round(sum(timings) / len(timings) * 1000, 3),
+            "p50_ms": round(percentile(timings, 50) * 1000, 3),
+            "p95_ms": round(percentile(timings, 95) * 1000, 3),
+        }
@@ -0,0 +1,66 @@
+import json
+import random
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.urls import reverse
+
+from network.benchmark import run_concurrently, summarize, test_environment
+from network.models import User, Post
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure write throughput under concurrent new_post/toggle_like traffic "
+        "against the configured database. Compare profiles by running it once per "
+        "environment, e.g. with NETWORK_SQLITE_TUNING=0 and =1 on separate "
+        "NETWORK_SQLITE_PATH files (WAL mode sticks to a database file), or with "
+        "NETWORK_DATABASE=postgresql."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=8)
+        parser.add_argument("--duration", type=float, default=10.0, help="Seconds.")
+        parser.add_argument("--users", type=int, default=20)
+        parser.add_argument("--posts", type=int, default=50)
+        parser.add_argument(
+            "--like-ratio", type=float, default=0.8,
+            help="Fraction of requests that toggle a like instead of posting.")
+        parser.add_argument("--keep", action="store_true", help="Keep the benchmark data.")
+
+    def handle(self, *args, **options):
+        users = [
+            User.objects.create_user(f"bench-writer-{i}", password="bench")
+            for i in range(options["users"])
+        ]
+        post_ids = [
+            Post.objects.create(author=random.choice(users), content="benchmark").id
+            for _ in range(options["posts"])
+        ]
+        like_ratio = options["like_ratio"]
+
+        def worker(client, index):
+            if not getattr(client, "logged_in", False):
+                client.force_login(users[index % len(users)])
+                client.logged_in = True
+            if random.random() < like_ratio:
+                url = reverse("toggle_like", args=[random.choice(post_ids)])
+                return client.put(url).status_code == 200
+            response = client.post(reverse("new_post"), {"content": "benchmark post"})
+            return response.status_code == 302
+
+        try:
+            with test_environment():
+                run = run_concurrently(worker, options["threads"], options["duration"])
+        finally:
+            if not options["keep"]:
+                User.objects.filter(username__startswith="bench-writer-").delete()
+
+        result = {
+            "database": connection.vendor,
+            "sqlite_pragmas": settings.NETWORK_SQLITE_PRAGMAS if connection.vendor == "sqlite" else None,
+            "threads": options["threads"],
+            **summarize(*run),
+        }
+        self.stdout.write(json.dumps(result, indent=2))
@@ -0,0 +1,30 @@
+import gzip
+import sys
+
+from django.core.management.base import BaseCommand
+
+from network.dataset import CHUNK_SIZE, export
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream all users, follows, posts and likes to an NDJSON file (gzipped "
+        "if the name ends in .gz) with constant memory. Load it with import_network."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("output", help="File to write, or - for standard output.")
+        parser.add_argument(
+            "--chunk-size", type=int, default=CHUNK_SIZE,
+            help="Rows fetched from the database at a time.")
+
+    def handle(self, *args, **options):
+        path = options["output"]
+        if path == "-":
+            counts = export(sys.stdout, options["chunk_size"])
+        else:
+            opener = gzip.open if path.endswith(".gz") else open
+            with opener(path, "wt", encoding="utf-8") as out:
+                counts = export(out, options["chunk_size"])
+        summary = ", ".join(f"{count} {kind}s" for kind, count in counts.items())
+        self.stderr.write(self.style.SUCCESS(f"Exported {summary}."))
@@ -0,0 +1,53 @@
+import gzip
+import os
+
+from django.core.management.base import BaseCommand
+
+from network import caching, timeline
+from network.counters import rebuild_counters
+from network.dataset import BATCH_SIZE, Importer
+
+
+class Command(BaseCommand):
+    help = (
+        "Load an export_network file with batched inserts, mapping its ids to new "
+        "ones and reusing existing users with the same username. Running it again "
+        "on the same file resumes after the last committed batch."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("input", help="File written by export_network.")
+        parser.add_argument(
+            "--batch-size", type=int, default=BATCH_SIZE,
+            help="Rows inserted per transaction.")
+        parser.add_argument(
+            "--name", help="Name the progress is saved under (default: the file name).")
+        parser.add_argument(
+            "--restart", action="store_true",
+            help="Ignore saved progress and start from the first line.")
+        parser.add_argument(
+            "--skip-timelines", action="store_true",
+            help="Do not rebuild the imported users' Following timelines.")
+
+    def handle(self, *args, **options):
+        path = options["input"]
+        importer = Importer(
+            options["name"] or os.path.basename(path),
+            batch_size=options["batch_size"],
+            restart=options["restart"],
+        )
+        if importer.resumed_from:
+            self.stdout.write(f"Resuming after line {importer.resumed_from}.")
+
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, "rt", encoding="utf-8") as lines:
+            counts = importer.run(lines)
+
+        rebuild_counters()
+        if not options["skip_timelines"]:
+            timeline.rebuild_many(sorted(set(importer.user_ids.values())))
+        caching.feed_changed()
+
+        summary = ", ".join(
+            f"{counts[kind]} {kind}s" for kind in ("user", "follow", "post", "like"))
+        self.stdout.write(self.style.SUCCESS(f"Imported {summary}."))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from network.counters import rebuild_counters
+
+
+class Command(BaseCommand):
+    help = "Recompute the denormalized like/follower/following/post counters."
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            user_rows, post_rows = rebuild_counters()
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt counters for {user_rows} users and {post_rows} posts."
+        ))
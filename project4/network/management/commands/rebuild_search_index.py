@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from network.search import REBUILD_BATCH_SIZE, rebuild_index
+
+
+class Command(BaseCommand):
+    help = "Repopulate the full-text search index from the posts table in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=REBUILD_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        indexed = rebuild_index(options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Indexed {indexed} posts."))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from network import timeline
+from network.models import User
+
+
+class Command(BaseCommand):
+    help = "Recompute the precomputed Following timelines from the Follow table."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "usernames", nargs="*",
+            help="Only rebuild these users' timelines (default: everyone).")
+
+    def handle(self, *args, **options):
+        users = User.objects.order_by("pk")
+        if options["usernames"]:
+            users = users.filter(username__in=options["usernames"])
+
+        total = timeline.rebuild_many(users.values_list("pk", flat=True).iterator())
+        self.stdout.write(self.style.SUCCESS(f"Wrote {total} timeline entries."))
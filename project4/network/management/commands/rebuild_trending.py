@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from network.trending import REBUILD_BATCH_SIZE, rebuild
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute every post's trending score from its like count and age. "
+        "Run it after changing NETWORK_TRENDING_DECAY."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=REBUILD_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        scored = rebuild(options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Scored {scored} posts."))
@@ -0,0 +1,51 @@
+import signal
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from network import tasks
+
+
+class Command(BaseCommand):
+    help = (
+        "Run queued background tasks until stopped. Start as many of these "
+        "processes as needed; each task is claimed by exactly one of them."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once", action="store_true", help="Run the tasks due now, then exit.")
+        parser.add_argument(
+            "--poll", type=float, default=1.0, help="Seconds to wait when the queue is empty.")
+        parser.add_argument("--batch", type=int, default=100, help="Tasks fetched per poll.")
+
+    def handle(self, *args, **options):
+        stopping = False
+
+        def stop(signum, frame):
+            nonlocal stopping
+            stopping = True
+
+        if not options["once"]:
+            signal.signal(signal.SIGTERM, stop)
+            signal.signal(signal.SIGINT, stop)
+
+        total = 0
+        last_purge = 0.0
+        while not stopping:
+            ran = tasks.run_due(options["batch"])
+            total += ran
+            if options["once"]:
+                if ran:
+                    continue
+                break
+            if time.monotonic() - last_purge > 60:
+                tasks.purge(settings.NETWORK_TASK_RETENTION)
+                last_purge = time.monotonic()
+            if not ran:
+                # Don't hold a connection open while idle.
+                connections.close_all()
+                time.sleep(options["poll"])
+        self.stdout.write(self.style.SUCCESS(f"Ran {total} tasks."))
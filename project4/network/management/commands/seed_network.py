@@ -0,0 +1,119 @@
+import random
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from network import caching, timeline
+from network.benchmark import SEED_PREFIX, WORDS, zipf_weights
+from network.counters import rebuild_counters
+from network.likes import Like
+from network.models import User, Post, Follow
+
+BATCH_SIZE = 2000
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill the database with synthetic data shaped like a real network for "
+        "benchmarks: a power-law follow graph where a few users have most of "
+        "the followers, posts from authors of skewed activity, and likes "
+        f"concentrated on a few posts. Users are named {SEED_PREFIX}<n> and share "
+        "the password 'seed'."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--posts", type=int, default=20000)
+        parser.add_argument(
+            "--follows", type=int, default=20, help="Average follows per user.")
+        parser.add_argument("--likes", type=int, default=50000)
+        parser.add_argument(
+            "--alpha", type=float, default=1.1,
+            help="Power-law exponent; higher means more skew.")
+        parser.add_argument(
+            "--days", type=int, default=30, help="Spread posts over this many days.")
+        parser.add_argument("--seed", type=int, default=0, help="Random seed.")
+        parser.add_argument(
+            "--clear", action="store_true",
+            help=f"Delete existing {SEED_PREFIX}* users and their data first.")
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        alpha = options["alpha"]
+
+        if options["clear"]:
+            User.objects.filter(username__startswith=SEED_PREFIX).delete()
+
+        with transaction.atomic():
+            user_ids = self.create_users(options["users"])
+            follows = self.create_follows(rng, user_ids, options["follows"], alpha)
+            posts = self.create_posts(rng, user_ids, options["posts"], options["days"], alpha)
+            likes = self.create_likes(rng, user_ids, posts, options["likes"], alpha)
+            rebuild_counters()
+            entries = timeline.rebuild_many(user_ids)
+        caching.feed_changed()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {len(user_ids)} users, {len(follows)} follows, {len(posts)} posts, "
+            f"{likes} likes and {entries} timeline entries."
+        ))
+
+    def create_users(self, count):
+        start = User.objects.filter(username__startswith=SEED_PREFIX).count()
+        password = make_password("seed")
+        users = User.objects.bulk_create([
+            User(username=f"{SEED_PREFIX}{i}", email=f"{SEED_PREFIX}{i}@example.com", password=password)
+            for i in range(start, start + count)
+        ], batch_size=BATCH_SIZE)
+        return [user.pk for user in users]
+
+    def create_follows(self, rng, user_ids, average, alpha):
+        # Popularity is a random ranking, so user ids carry no signal.
+        by_popularity = rng.sample(user_ids, len(user_ids))
+        weights = zipf_weights(len(by_popularity), alpha)
+        follows = set()
+        for follower_id in user_ids:
+            # Pareto with shape 2 has mean 2, so this averages `average`.
+            wanted = min(int(rng.paretovariate(2) * average / 2), len(user_ids) - 1)
+            for following_id in rng.choices(by_popularity, cum_weights=weights, k=wanted):
+                if following_id != follower_id:
+                    follows.add((follower_id, following_id))
+        Follow.objects.bulk_create(
+            [Follow(follower_id=f, following_id=t) for f, t in follows],
+            batch_size=BATCH_SIZE, ignore_conflicts=True,
+        )
+        return follows
+
+    def create_posts(self, rng, user_ids, count, days, alpha):
+        by_activity = rng.sample(user_ids, len(user_ids))
+        weights = zipf_weights(len(by_activity), alpha)
+        content_weights = zipf_weights(len(WORDS), 1.0)
+        now = timezone.now()
+        posts = [
+            Post(
+                author_id=author_id,
+                content=" ".join(rng.choices(WORDS, cum_weights=content_weights,
+                                             k=rng.randint(3, 40))),
+                timestamp=now - timedelta(seconds=rng.uniform(0, days * 86400)),
+            )
+            for author_id in rng.choices(by_activity, cum_weights=weights, k=count)
+        ]
+        return Post.objects.bulk_create(posts, batch_size=BATCH_SIZE)
+
+    def create_likes(self, rng, user_ids, posts, count, alpha):
+        if not posts:
+            return 0
+        by_popularity = rng.sample(posts, len(posts))
+        weights = zipf_weights(len(by_popularity), alpha)
+        likes = {
+            (post.pk, rng.choice(user_ids))
+            for post in rng.choices(by_popularity, cum_weights=weights, k=count)
+        }
+        Like.objects.bulk_create(
+            [Like(post_id=post_id, user_id=user_id) for post_id, user_id in likes],
+            batch_size=BATCH_SIZE, ignore_conflicts=True,
+        )
+        return len(likes)
@@ -0,0 +1,164 @@
+"""
+In-process request metrics, exposed in the Prometheus text format.
+
+A histogram keeps one count per bucket plus a sum and a total behind a
+lock, so recording a value costs a bisect and a few additions. Numbers are
+per process: with several workers, each one is scraped separately and
+Prometheus sums them.
+"""
+import threading
+from bisect import bisect_left
+
+TIME_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 4, 8, 16, 32, 64, 128)
+SIZE_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (
+        (name, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for name, value in labels
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+def _format_number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self._counts = [0] * (len(buckets) + 1)
+        self._sum = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+
+    def snapshot(self):
+        """
+        Return (cumulative bucket counts, sum, count).
+        """
+        with self._lock:
+            counts, total = list(self._counts), self._sum
+        cumulative, running = [], 0
+        for count in counts:
+            running += count
+            cumulative.append(running)
+        return cumulative, total, running
+
+
+class Counter:
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+
+class Family:
+    """
+    A named metric with one child per combination of label values.
+    """
+    kind = None
+
+    def __init__(self, name, documentation, label_names, **options):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self.options = options
+        self._children = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def labels(self, **labels):
+        key = tuple(labels[name] for name in self.label_names)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self.make_child())
+        return child
+
+    def clear(self):
+        with self._lock:
+            self._children.clear()
+
+    def expose(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            children = sorted(self._children.items())
+        for key, child in children:
+            lines.extend(self.expose_child(list(zip(self.label_names, key)), child))
+        return lines
+
+
+class HistogramFamily(Family):
+    kind = "histogram"
+
+    def make_child(self):
+        return Histogram(self.options["buckets"])
+
+    def expose_child(self, labels, child):
+        cumulative, total, count = child.snapshot()
+        bounds = [_format_number(bound) for bound in child.buckets] + ["+Inf"]
+        for bound, running in zip(bounds, cumulative):
+            yield f"{self.name}_bucket{_format_labels(labels + [('le', bound)])} {running}"
+        yield f"{self.name}_sum{_format_labels(labels)} {_format_number(total)}"
+        yield f"{self.name}_count{_format_labels(labels)} {count}"
+
+
+class CounterFamily(Family):
+    kind = "counter"
+
+    def make_child(self):
+        return Counter()
+
+    def expose_child(self, labels, child):
+        yield f"{self.name}{_format_labels(labels)} {child.value}"
+
+
+REGISTRY = []
+
+request_duration = HistogramFamily(
+    "network_request_duration_seconds", "Wall time of requests, by view.",
+    ("view",), buckets=TIME_BUCKETS)
+db_queries = HistogramFamily(
+    "network_db_queries", "Database queries per request, by view.",
+    ("view",), buckets=QUERY_BUCKETS)
+db_duration = HistogramFamily(
+    "network_db_duration_seconds", "Time spent in database queries per request, by view.",
+    ("view",), buckets=TIME_BUCKETS)
+template_duration = HistogramFamily(
+    "network_template_duration_seconds", "Time spent rendering templates per request, by view.",
+    ("view",), buckets=TIME_BUCKETS)
+response_size = HistogramFamily(
+    "network_response_size_bytes", "Size of non-streaming response bodies, by view.",
+    ("view",), buckets=SIZE_BUCKETS)
+requests = CounterFamily(
+    "network_requests_total", "Requests served, by view and status code.",
+    ("view", "status"))
+
+
+def render():
+    """
+    Return every metric in the Prometheus text exposition format.
+    """
+    lines = []
+    for family in REGISTRY:
+        lines.extend(family.expose())
+    return "\n".join(lines) + "\n"
+
+
+def reset():
+    for family in REGISTRY:
+        family.clear()
@@ -0,0 +1,60 @@
+# Generated by Django 5.1.15 on 2026-10-18 19:45
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_of(queryset, field):
+    counted = (
+        queryset.filter(**{field: OuterRef("pk")})
+        .order_by()
+        .values(field)
+        .annotate(n=Count("*"))
+        .values("n")
+    )
+    return Coalesce(Subquery(counted, output_field=IntegerField()), 0)
+
+
+def populate_counters(apps, schema_editor):
+    User = apps.get_model("network", "User")
+    Post = apps.get_model("network", "Post")
+    Follow = apps.get_model("network", "Follow")
+
+    Post.objects.update(like_count=count_of(Post.likes.through.objects.all(), "post"))
+    User.objects.update(
+        follower_count=count_of(Follow.objects.all(), "following"),
+        following_count=count_of(Follow.objects.all(), "follower"),
+        post_count=count_of(Post.objects.all(), "author"),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('network', '0003_follow'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='like_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='follower_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='following_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='post_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.1.15 on 2026-10-18 19:48
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+BACKFILL = 200
+
+
+def populate_timelines(apps, schema_editor):
+    Post = apps.get_model("network", "Post")
+    Follow = apps.get_model("network", "Follow")
+    TimelineEntry = apps.get_model("network", "TimelineEntry")
+
+    for follow in Follow.objects.iterator():
+        posts = (
+            Post.objects.filter(author_id=follow.following_id)
+            .order_by("-timestamp", "-id")
+            .values_list("id", "timestamp")[:BACKFILL]
+        )
+        TimelineEntry.objects.bulk_create([
+            TimelineEntry(owner_id=follow.follower_id, post_id=post_id, timestamp=timestamp)
+            for post_id, timestamp in posts
+        ], ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('network', '0004_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TimelineEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('timestamp', models.DateTimeField()),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline_entries', to=settings.AUTH_USER_MODEL)),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline_entries', to='network.post')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['owner', '-timestamp', '-post'], name='timeline_owner_time_idx')],
+                'constraints': [models.UniqueConstraint(fields=('owner', 'post'), name='unique_timeline_entry')],
+            },
+        ),
+        migrations.RunPython(populate_timelines, migrations.RunPython.noop),
+    ]
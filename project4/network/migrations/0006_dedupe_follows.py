@@ -0,0 +1,53 @@
+# Generated by Django 5.1.15 on 2026-10-18 19:49
+
+from django.db import migrations
+from django.db.models import Count, IntegerField, Min, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_of(queryset, field):
+    counted = (
+        queryset.filter(**{field: OuterRef("pk")})
+        .order_by()
+        .values(field)
+        .annotate(n=Count("*"))
+        .values("n")
+    )
+    return Coalesce(Subquery(counted, output_field=IntegerField()), 0)
+
+
+def dedupe_follows(apps, schema_editor):
+    """
+    Keep the oldest row of every duplicated (follower, following) pair so the
+    unique constraint added in the next migration can be created.
+    """
+    User = apps.get_model("network", "User")
+    Follow = apps.get_model("network", "Follow")
+
+    duplicates = (
+        Follow.objects.values("follower", "following")
+        .annotate(keep=Min("id"), n=Count("id"))
+        .filter(n__gt=1)
+    )
+    removed = 0
+    for pair in duplicates:
+        removed += Follow.objects.filter(
+            follower=pair["follower"], following=pair["following"]
+        ).exclude(id=pair["keep"]).delete()[0]
+
+    if removed:
+        User.objects.update(
+            follower_count=count_of(Follow.objects.all(), "following"),
+            following_count=count_of(Follow.objects.all(), "follower"),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('network', '0005_timelineentry'),
+    ]
+
+    operations = [
+        migrations.RunPython(dedupe_follows, migrations.RunPython.noop),
+    ]
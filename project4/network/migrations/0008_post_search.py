@@ -0,0 +1,71 @@
+# Generated by Django 5.1.15 on 2026-10-18 20:02
+
+from django.db import migrations
+
+SQLITE_FORWARD = [
+    """
+    CREATE VIRTUAL TABLE network_post_fts USING fts5(
+        content, content='network_post', content_rowid='id',
+        tokenize='porter unicode61'
+    )
+    """,
+    """
+    CREATE TRIGGER network_post_fts_insert AFTER INSERT ON network_post BEGIN
+        INSERT INTO network_post_fts(rowid, content) VALUES (new.id, new.content);
+    END
+    """,
+    """
+    CREATE TRIGGER network_post_fts_delete AFTER DELETE ON network_post BEGIN
+        INSERT INTO network_post_fts(network_post_fts, rowid, content)
+        VALUES ('delete', old.id, old.content);
+    END
+    """,
+    """
+    CREATE TRIGGER network_post_fts_update AFTER UPDATE OF content ON network_post BEGIN
+        INSERT INTO network_post_fts(network_post_fts, rowid, content)
+        VALUES ('delete', old.id, old.content);
+        INSERT INTO network_post_fts(rowid, content) VALUES (new.id, new.content);
+    END
+    """,
+    "INSERT INTO network_post_fts(network_post_fts) VALUES ('rebuild')",
+]
+
+SQLITE_BACKWARD = [
+    "DROP TRIGGER IF EXISTS network_post_fts_update",
+    "DROP TRIGGER IF EXISTS network_post_fts_delete",
+    "DROP TRIGGER IF EXISTS network_post_fts_insert",
+    "DROP TABLE IF EXISTS network_post_fts",
+]
+
+POSTGRES_FORWARD = [
+    """
+    CREATE INDEX network_post_search_idx ON network_post
+    USING GIN (to_tsvector('english', content))
+    """,
+]
+
+POSTGRES_BACKWARD = [
+    "DROP INDEX IF EXISTS network_post_search_idx",
+]
+
+
+def run(statements):
+    def apply(apps, schema_editor):
+        vendor = schema_editor.connection.vendor
+        for sql in statements.get(vendor, []):
+            schema_editor.execute(sql)
+    return apply
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('network', '0007_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run({"sqlite": SQLITE_FORWARD, "postgresql": POSTGRES_FORWARD}),
+            run({"sqlite": SQLITE_BACKWARD, "postgresql": POSTGRES_BACKWARD}),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.1.15 on 2026-10-18 20:47
+
+from importlib import import_module
+
+from django.db import migrations, models
+from django.template.defaultfilters import linebreaksbr
+
+BATCH_SIZE = 2000
+
+post_search = import_module("network.migrations.0008_post_search")
+
+
+def restore_search_triggers(apps, schema_editor):
+    # SQLite may add or drop a NOT NULL column by rebuilding network_post,
+    # which drops the triggers keeping the FTS index in sync.
+    if schema_editor.connection.vendor == "sqlite":
+        for sql in post_search.SQLITE_BACKWARD + post_search.SQLITE_FORWARD:
+            if "TRIGGER" in sql:
+                schema_editor.execute(sql)
+
+
+def render_contents(apps, schema_editor):
+    Post = apps.get_model("network", "Post")
+    last_id = 0
+    while True:
+        posts = list(Post.objects.filter(pk__gt=last_id).order_by("pk")[:BATCH_SIZE])
+        if not posts:
+            break
+        for post in posts:
+            post.content_html = linebreaksbr(post.content, autoescape=True)
+        Post.objects.bulk_update(posts, ["content_html"])
+        last_id = posts[-1].pk
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('network', '0009_importprogress'),
+    ]
+
+    operations = [
+        # Restores the triggers when migrating back, after RemoveField.
+        migrations.RunPython(migrations.RunPython.noop, restore_search_triggers),
+        migrations.AddField(
+            model_name='post',
+            name='content_html',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.RunPython(restore_search_triggers, migrations.RunPython.noop),
+        migrations.RunPython(render_contents, migrations.RunPython.noop),
+    ]
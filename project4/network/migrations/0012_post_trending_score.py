@@ -0,0 +1,53 @@
+# Generated by Django 5.1.15 on 2026-10-18 20:56
+
+import math
+from datetime import datetime, timezone
+from importlib import import_module
+
+from django.conf import settings
+from django.db import migrations, models
+
+BATCH_SIZE = 2000
+
+EPOCH = datetime(2020, 1, 1, tzinfo=timezone.utc)
+
+content_html = import_module("network.migrations.0010_post_content_html")
+
+
+def score_posts(apps, schema_editor):
+    # The historical model has no save() logic, so repeat trending_score.
+    Post = apps.get_model("network", "Post")
+    last_id = 0
+    while True:
+        posts = list(Post.objects.filter(pk__gt=last_id).order_by("pk")[:BATCH_SIZE])
+        if not posts:
+            break
+        for post in posts:
+            post.trending_score = (
+                math.log10(max(post.like_count, 1))
+                + (post.timestamp - EPOCH).total_seconds() / settings.NETWORK_TRENDING_DECAY
+            )
+        Post.objects.bulk_update(posts, ["trending_score"])
+        last_id = posts[-1].pk
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('network', '0011_task'),
+    ]
+
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop, content_html.restore_search_triggers),
+        migrations.AddField(
+            model_name='post',
+            name='trending_score',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.RunPython(content_html.restore_search_triggers, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['-trending_score', '-id'], name='post_trending_idx'),
+        ),
+        migrations.RunPython(score_posts, migrations.RunPython.noop),
+    ]
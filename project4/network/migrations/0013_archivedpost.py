@@ -0,0 +1,28 @@
+# Generated by Django 5.1.15 on 2026-10-18 21:08
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('network', '0012_post_trending_score'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedPost',
+            fields=[
+                ('id', models.IntegerField(primary_key=True, serialize=False)),
+                ('timestamp', models.DateTimeField()),
+                ('like_count', models.PositiveIntegerField(default=0)),
+                ('data', models.BinaryField()),
+                ('author', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='archived_posts', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['author', '-timestamp', '-id'], name='archived_author_time_idx')],
+            },
+        ),
+    ]
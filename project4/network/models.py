@@ -1,28 +1,158 @@
+import math
+import zlib
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from django.template.defaultfilters import linebreaksbr
 from django.utils import timezone
+from django.utils.functional import cached_property
 
 
 class User(AbstractUser):
-    pass
+    """
+    A network user. The counters are denormalized copies of the Follow and
+    Post tables, kept in sync by the views and rebuilt by `rebuild_counters`.
+    """
+    follower_count = models.PositiveIntegerField(default=0)
+    following_count = models.PositiveIntegerField(default=0)
+    post_count = models.PositiveIntegerField(default=0)
 
 
-from django.utils import timezone
+def render_content(content):
+    """
+    The HTML a post card shows for `content`: escaped, with line breaks.
+    """
+    return linebreaksbr(content, autoescape=True)
+
+
+# The first byte of ArchivedPost.data says how the rest is stored.
+RAW, ZLIB = b"r", b"z"
+
+
+def compress_content(content):
+    """
+    Pack post content for the archive: zlib compressed, or as plain UTF-8
+    when compressing would not make it smaller (as with most short posts).
+    """
+    raw = content.encode()
+    packed = zlib.compress(raw, 9)
+    if len(packed) < len(raw):
+        return ZLIB + packed
+    return RAW + raw
+
+
+def decompress_content(data):
+    data = bytes(data)
+    if data[:1] == ZLIB:
+        return zlib.decompress(data[1:]).decode()
+    return data[1:].decode()
+
+
+# Trending scores count seconds from here, keeping them small.
+TRENDING_EPOCH = datetime(2020, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def trending_score(like_count, timestamp):
+    """
+    A post's trending score: log10 of its likes plus its age bonus, which
+    grows by 1 every NETWORK_TRENDING_DECAY seconds. A post needs ten times
+    the likes to rank with one posted NETWORK_TRENDING_DECAY later, and as
+    every score carries its own bonus, ranks never need recomputing as
+    time passes.
+    """
+    return (math.log10(max(like_count, 1))
+            + (timestamp - TRENDING_EPOCH).total_seconds() / settings.NETWORK_TRENDING_DECAY)
+
+
+class PostQuerySet(models.QuerySet):
+
+    def bulk_create(self, objs, *args, **kwargs):
+        # bulk_create skips save(), so fill the derived columns here too.
+        objs = list(objs)
+        for post in objs:
+            post.content_html = render_content(post.content)
+            post.trending_score = trending_score(post.like_count, post.timestamp)
+        return super().bulk_create(objs, *args, **kwargs)
+
 
 class Post(models.Model):
     """
     A post created by a user, containing content and a timestamp.
+
+    `content_html` is the content as rendered on post cards, kept up to
+    date on every save so templates never run linebreaksbr per request.
     """
     author = models.ForeignKey(User, on_delete=models.CASCADE, related_name="posts")
     content = models.TextField(max_length=500)
+    content_html = models.TextField(blank=True, editable=False)
     timestamp = models.DateTimeField(default=timezone.now)
     likes = models.ManyToManyField(User, related_name="liked_posts", blank=True)
+    like_count = models.PositiveIntegerField(default=0)
+    # See trending_score; kept in step with like_count by every like write.
+    trending_score = models.FloatField(default=0, editable=False)
+
+    archived = False
+
+    objects = PostQuerySet.as_manager()
 
     def __str__(self):
         return f"{self.author.username}: {self.content[:30]}..."
 
+    def save(self, *args, update_fields=None, **kwargs):
+        self.content_html = render_content(self.content)
+        if self._state.adding:
+            self.trending_score = trending_score(self.like_count, self.timestamp)
+        if update_fields is not None and "content" in update_fields:
+            update_fields = {*update_fields, "content_html"}
+        super().save(*args, update_fields=update_fields, **kwargs)
+
     class Meta:
         ordering = ['-timestamp']
+        indexes = [
+            # Profile feeds: one author's posts, newest first.
+            models.Index(fields=["author", "-timestamp", "-id"], name="post_author_time_idx"),
+            # Global feed and keyset pagination over (timestamp, id).
+            models.Index(fields=["-timestamp", "-id"], name="post_time_idx"),
+            # Trending feed: the top posts are the head of this index.
+            models.Index(fields=["-trending_score", "-id"], name="post_trending_idx"),
+        ]
+
+
+class ArchivedPost(models.Model):
+    """
+    A post moved out of the Post table by `archive_posts` (see
+    network/archive.py). It keeps the post's id, its likes survive only as
+    `like_count`, and its content is stored compressed in `data`. Archived
+    posts are read-only.
+    """
+    id = models.IntegerField(primary_key=True)
+    # The index below leads with author, so the foreign key needs no other.
+    author = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="archived_posts", db_index=False)
+    timestamp = models.DateTimeField()
+    like_count = models.PositiveIntegerField(default=0)
+    data = models.BinaryField()
+
+    archived = True
+
+    def __str__(self):
+        return f"{self.author.username}: {self.content[:30]}... (archived)"
+
+    @cached_property
+    def content(self):
+        return decompress_content(self.data)
+
+    @cached_property
+    def content_html(self):
+        return render_content(self.content)
+
+    class Meta:
+        indexes = [
+            # Old profile pages, read like post_author_time_idx.
+            models.Index(fields=["author", "-timestamp", "-id"], name="archived_author_time_idx"),
+        ]
 
 
 class Follow(models.Model):
@@ -33,3 +163,83 @@ class Follow(models.Model):
 
     def __str__(self):
         return f"{self.follower.username} follows {self.following.username}"
+
+    class Meta:
+        constraints = [
+            # Also serves as the index for "does A follow B" lookups.
+            models.UniqueConstraint(
+                fields=["follower", "following"], name="unique_follow"),
+        ]
+
+
+class TimelineEntry(models.Model):
+    """
+    A post delivered to a follower's precomputed Following feed.
+
+    `timestamp` is copied from the post so that reading a page of a
+    timeline is a range scan on a single (owner, timestamp) index.
+    """
+    owner = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="timeline_entries")
+    post = models.ForeignKey(
+        Post, on_delete=models.CASCADE, related_name="timeline_entries")
+    timestamp = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.post_id} in {self.owner_id}'s timeline"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["owner", "post"], name="unique_timeline_entry"),
+        ]
+        indexes = [
+            models.Index(
+                fields=["owner", "-timestamp", "-post"], name="timeline_owner_time_idx"),
+        ]
+
+
+class ImportProgress(models.Model):
+    """
+    How many lines of an export file `import_network` has loaded. Saved in
+    the same transaction as each batch, so an interrupted import resumes
+    right after the last batch that was committed.
+    """
+    source = models.CharField(max_length=255, unique=True)
+    line = models.PositiveBigIntegerField(default=0)
+    updated = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.source}: {self.line} lines"
+
+
+class Task(models.Model):
+    """
+    A queued background job, see network/tasks.py. `key` makes enqueueing
+    idempotent: a second task with the same key is never created.
+    """
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATUSES = [(PENDING, "Pending"), (RUNNING, "Running"), (DONE, "Done"), (FAILED, "Failed")]
+
+    name = models.CharField(max_length=100)
+    args = models.JSONField(default=list)
+    key = models.CharField(max_length=255, unique=True, null=True, blank=True)
+    status = models.CharField(max_length=10, choices=STATUSES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_until = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    finished = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.name}{tuple(self.args)} ({self.status})"
+
+    class Meta:
+        indexes = [
+            # Workers look for due pending tasks and expired leases.
+            models.Index(fields=["status", "run_after"], name="task_due_idx"),
+        ]
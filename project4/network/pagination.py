@@ -0,0 +1,162 @@
+"""
+Keyset (cursor) pagination for the timelines.
+
+A page is addressed by an opaque cursor naming the (timestamp, id) of the
+post at its edge and the direction to read in. Fetching any page is then a
+range scan on the timestamp index, with no OFFSET and no COUNT(*). Old
+`?page=N` links still work through an OFFSET fallback.
+"""
+import base64
+from collections import namedtuple
+from datetime import datetime
+from functools import partial
+
+from django.db.models import Q
+
+KEYS = ("timestamp", "id")
+
+
+class Cursor(namedtuple("Cursor", ["backwards", "timestamp", "pk"])):
+    """
+    The position of a page edge. `backwards` cursors read towards newer
+    posts (the "Previous" link), the others towards older ones.
+    """
+
+    def encode(self):
+        raw = f"{'p' if self.backwards else 'n'}|{self.timestamp.isoformat()}|{self.pk}"
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+    @classmethod
+    def decode(cls, token):
+        """
+        Parse a token produced by `encode`, returning None if it is invalid.
+        """
+        try:
+            padded = token + "=" * (-len(token) % 4)
+            direction, timestamp, pk = (
+                base64.urlsafe_b64decode(padded.encode()).decode().split("|")
+            )
+            if direction not in ("n", "p"):
+                return None
+            return cls(direction == "p", datetime.fromisoformat(timestamp), int(pk))
+        except (ValueError, UnicodeError):
+            return None
+
+    @classmethod
+    def at(cls, post, backwards=False):
+        return cls(backwards, post.timestamp, post.id)
+
+
+def seek(queryset, cursor, limit, offset=0, keys=KEYS):
+    """
+    Return up to `limit` rows of `queryset` just past `cursor`, newest first.
+
+    Without a cursor this reads from the top of the queryset, skipping
+    `offset` rows (only used by the `?page=N` fallback).
+    """
+    time_key, id_key = keys
+    newest_first = (f"-{time_key}", f"-{id_key}")
+
+    if cursor is None:
+        return list(queryset.order_by(*newest_first)[offset:offset + limit])
+
+    if cursor.backwards:
+        newer = (
+            Q(**{f"{time_key}__gt": cursor.timestamp})
+            | Q(**{time_key: cursor.timestamp, f"{id_key}__gt": cursor.pk})
+        )
+        rows = list(queryset.filter(newer).order_by(time_key, id_key)[:limit])
+        rows.reverse()
+        return rows
+
+    older = (
+        Q(**{f"{time_key}__lt": cursor.timestamp})
+        | Q(**{time_key: cursor.timestamp, f"{id_key}__lt": cursor.pk})
+    )
+    return list(queryset.filter(older).order_by(*newest_first)[:limit])
+
+
+def queryset_fetcher(queryset, keys=KEYS):
+    """
+    Adapt a queryset to the fetch(cursor, limit, offset) callable that
+    `paginate` reads pages through.
+    """
+    return partial(seek, queryset, keys=keys)
+
+
+def merge(cursor, limit, offset, *row_lists):
+    """
+    Combine several newest-first lists of posts into the single window that
+    `seek` would have returned over their union. Each list must hold at
+    least offset + limit rows (or all of its rows); duplicates are dropped.
+    """
+    unique = {row.id: row for rows in row_lists for row in rows}
+    rows = sorted(unique.values(), key=lambda row: (row.timestamp, row.id), reverse=True)
+    if cursor is not None and cursor.backwards:
+        # The rows nearest the cursor are the oldest of the newer ones.
+        return rows[-limit:]
+    return rows[offset:offset + limit]
+
+
+class CursorPage:
+    """
+    One page of results with the cursors of its neighbours. Exposes the
+    parts of Django's Page that the templates use, minus the total count.
+    """
+
+    def __init__(self, object_list, has_next, has_previous):
+        self.object_list = object_list
+        self.has_next = has_next and bool(object_list)
+        self.has_previous = has_previous and bool(object_list)
+        self.next_cursor = None
+        self.previous_cursor = None
+        if self.has_next:
+            self.next_cursor = Cursor.at(object_list[-1]).encode()
+        if self.has_previous:
+            self.previous_cursor = Cursor.at(object_list[0], True).encode()
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+
+def get_position(request, per_page):
+    """
+    Read the page position from the query string, returning a
+    (cursor, offset) pair. `?cursor=` wins over the legacy `?page=`.
+    """
+    token = request.GET.get("cursor")
+    if token:
+        cursor = Cursor.decode(token)
+        if cursor is not None:
+            return cursor, 0
+
+    try:
+        number = max(int(request.GET.get("page", 1)), 1)
+    except ValueError:
+        number = 1
+    return None, (number - 1) * per_page
+
+
+def paginate(request, fetch, per_page):
+    """
+    Return the CursorPage addressed by the request, reading rows through
+    `fetch(cursor, limit, offset)` (see `seek`). One extra row is fetched to
+    learn whether a further page exists.
+    """
+    cursor, offset = get_position(request, per_page)
+    rows = fetch(cursor, per_page + 1, offset)
+
+    if cursor is not None and cursor.backwards:
+        # Rows come newest first, so the extra one is at the front.
+        has_previous = len(rows) > per_page
+        return CursorPage(rows[-per_page:], True, has_previous)
+
+    has_next = len(rows) > per_page
+    has_previous = cursor is not None or offset > 0
+    return CursorPage(rows[:per_page], has_next, has_previous)
@@ -0,0 +1,181 @@
+"""
+Read replica routing and per-request lookup memoization.
+
+Views marked with `replica_reads` (the feeds, profiles, trending and
+search) read from one of the NETWORK_READ_REPLICAS, picked at random for
+the whole request. Everything else uses the primary, and so do the
+session and logged-in user of a marked view: request.user is lazy, so the
+middleware loads it before switching to the replica rather than leaving
+it to the view. The follow graph also loads its lists from the primary
+(see graph.FollowGraph.following_many).
+
+Replicas lag behind the primary, so a client that just wrote must not be
+sent to one or it could miss its own post or like. ReplicaMiddleware
+tracks the request in a context variable (so it follows the request into
+async views' ORM threads, like instrumentation.RequestStats); ReplicaRouter
+marks it when anything is written, which sends the rest of its reads to
+the primary and makes the middleware set a cookie pinning the client to
+the primary for NETWORK_REPLICA_PIN_SECONDS. Writes always go to the
+primary.
+
+`get_user` is a request-scoped identity map for users looked up by name:
+each is loaded at most once per request, and the logged-in user is reused
+when it was already loaded, so a user viewing their own profile costs no
+extra query.
+"""
+import random
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.http import Http404
+
+from .models import User
+
+PIN_COOKIE = "network_primary"
+
+_current = ContextVar("network_request_routing", default=None)
+
+
+class RequestRouting:
+    __slots__ = ("pinned", "replica", "wrote")
+
+    def __init__(self, pinned):
+        self.pinned = pinned
+        self.replica = None
+        self.wrote = False
+
+
+def replica_reads(view):
+    """
+    Mark a view as safe to serve from a read replica.
+    """
+    view.replica_reads = True
+    return view
+
+
+def _pinned(request):
+    try:
+        return float(request.COOKIES.get(PIN_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+class ReplicaRouter:
+    """
+    Sends the reads of replica_reads views to the request's replica and
+    everything else to the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        state = _current.get()
+        if state is None or state.wrote:
+            return None
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        state = _current.get()
+        if state is not None:
+            state.wrote = True
+        # Explicitly, or rows read from a replica would be saved back to it.
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *settings.NETWORK_READ_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, **hints):
+        if db in settings.NETWORK_READ_REPLICAS:
+            return False
+        return None
+
+
+class ReplicaMiddleware:
+    """
+    Tracks each request for ReplicaRouter, picks its replica when the view
+    allows one and pins clients that wrote to the primary.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        state = RequestRouting(_pinned(request))
+        token = _current.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.pin(state, response)
+
+    async def __acall__(self, request):
+        state = RequestRouting(_pinned(request))
+        token = _current.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.pin(state, response)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        state = _current.get()
+        if (state is not None and not state.pinned and settings.NETWORK_READ_REPLICAS
+                and getattr(view_func, "replica_reads", False)):
+            _load_user(request)
+            state.replica = random.choice(settings.NETWORK_READ_REPLICAS)
+
+    def pin(self, state, response):
+        if state.wrote and settings.NETWORK_READ_REPLICAS:
+            seconds = settings.NETWORK_REPLICA_PIN_SECONDS
+            response.set_cookie(
+                PIN_COOKIE, str(time.time() + seconds), max_age=seconds,
+                httponly=True, samesite="Lax")
+        return response
+
+
+def _load_user(request):
+    """
+    Evaluate the lazy request.user, and with it the session, now.
+    """
+    return getattr(getattr(request, "user", None), "pk", None)
+
+
+def _memo(request):
+    try:
+        return request._network_users
+    except AttributeError:
+        request._network_users = {}
+        # Reuse the logged-in user if the auth middleware already loaded it.
+        # type() rather than isinstance() keeps a lazy request.user lazy.
+        for loaded in (vars(request).get("user"), getattr(request, "_cached_user", None),
+                       getattr(request, "_acached_user", None)):
+            if type(loaded) is User:
+                request._network_users[loaded.username] = loaded
+        return request._network_users
+
+
+def get_user(request, username):
+    """
+    The user called `username`, loaded at most once per request. Raises
+    Http404 if there is none.
+    """
+    users = _memo(request)
+    if username not in users:
+        users[username] = User.objects.filter(username=username).first()
+    if users[username] is None:
+        raise Http404("No User matches the given query.")
+    return users[username]
+
+
+async def aget_user(request, username):
+    return await sync_to_async(get_user)(request, username)
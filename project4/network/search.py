@@ -0,0 +1,121 @@
+"""
+Full-text search over post content.
+
+On SQLite the posts are indexed by an FTS5 table and on PostgreSQL by a GIN
+index over to_tsvector('english', content), both created by migration 0008
+and kept in sync with network_post by the database itself (triggers on
+SQLite, the expression index on PostgreSQL). A query therefore reads the
+inverted index instead of scanning every post, and any other backend falls
+back to a plain icontains filter.
+"""
+import re
+
+from django.db import connection, connections, router
+
+from .caching import attach_cache_versions
+from .feeds import attach_viewer_context
+from .models import Post
+
+PAGE_SIZE = 10
+REBUILD_BATCH_SIZE = 5000
+
+TERM = re.compile(r"\w+", re.UNICODE)
+
+
+def match_expression(query):
+    """
+    Turn free text into an FTS5 query that matches posts containing every
+    word, with each word quoted so user input can never use FTS5 syntax.
+    """
+    return " ".join(f'"{term}"' for term in TERM.findall(query))
+
+
+def search_post_ids(query, limit, offset=0):
+    """
+    Return the ids of the best matching posts for `query`, best first.
+    """
+    # Raw SQL skips the database routers, so ask them where Posts are read.
+    connection = connections[router.db_for_read(Post)]
+    if connection.vendor == "sqlite":
+        expression = match_expression(query)
+        if not expression:
+            return []
+        sql = (
+            "SELECT rowid FROM network_post_fts WHERE network_post_fts MATCH %s "
+            "ORDER BY rank LIMIT %s OFFSET %s"
+        )
+        params = [expression, limit, offset]
+    elif connection.vendor == "postgresql":
+        sql = (
+            "SELECT id FROM network_post, websearch_to_tsquery('english', %s) query "
+            "WHERE to_tsvector('english', content) @@ query "
+            "ORDER BY ts_rank(to_tsvector('english', content), query) DESC, id DESC "
+            "LIMIT %s OFFSET %s"
+        )
+        params = [query, limit, offset]
+    else:
+        return list(
+            Post.objects.filter(content__icontains=query)
+            .values_list("id", flat=True)[offset:offset + limit]
+        )
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [row[0] for row in cursor.fetchall()]
+
+
+def search(request, query):
+    """
+    Return one page of ranked results for the viewer, as a
+    (posts, page_number, has_next) tuple. Pages are addressed by `?page=`
+    because ranked results have no natural keyset; one extra id is fetched
+    instead of counting every match.
+    """
+    try:
+        number = max(int(request.GET.get("page", 1)), 1)
+    except ValueError:
+        number = 1
+
+    ids = search_post_ids(query, PAGE_SIZE + 1, (number - 1) * PAGE_SIZE) if query else []
+    has_next = len(ids) > PAGE_SIZE
+    ids = ids[:PAGE_SIZE]
+
+    found = Post.objects.select_related("author").in_bulk(ids)
+    posts = [found[post_id] for post_id in ids if post_id in found]
+    attach_viewer_context(posts, request.user)
+    attach_cache_versions(posts)
+    return posts, number, has_next
+
+
+def rebuild_index(batch_size=REBUILD_BATCH_SIZE):
+    """
+    Repopulate the search index from network_post in batches of
+    `batch_size` posts, returning the number of posts indexed.
+    """
+    if connection.vendor == "postgresql":
+        with connection.cursor() as cursor:
+            cursor.execute("REINDEX INDEX network_post_search_idx")
+        return Post.objects.count()
+    if connection.vendor != "sqlite":
+        return 0
+
+    indexed, last_id = 0, 0
+    with connection.cursor() as cursor:
+        cursor.execute("INSERT INTO network_post_fts(network_post_fts) VALUES ('delete-all')")
+        while True:
+            cursor.execute(
+                "SELECT MAX(id), COUNT(*) FROM ("
+                "SELECT id FROM network_post WHERE id > %s ORDER BY id LIMIT %s)",
+                [last_id, batch_size],
+            )
+            batch_last, batch_count = cursor.fetchone()
+            if not batch_count:
+                break
+            cursor.execute(
+                "INSERT INTO network_post_fts(rowid, content) "
+                "SELECT id, content FROM network_post WHERE id > %s AND id <= %s",
+                [last_id, batch_last],
+            )
+            indexed += batch_count
+            last_id = batch_last
+    return indexed
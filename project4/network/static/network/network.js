@@ -1,20 +1,4 @@
 (() => {
-  function getCookie(name) {
-    let cookieValue = null;
-    if (document.cookie && document.cookie !== '') {
-      const cookies = document.cookie.split(';');
-      for (let i = 0; i < cookies.length; i++) {
-        const cookie = cookies[i].trim();
-        if (cookie.substring(0, name.length + 1) === name + '=') {
-          cookieValue = decodeURIComponent(cookie.substring(name.length + 1));
-          break;
-        }
-      }
-    }
-    return cookieValue;
-  }
-  const csrftoken = getCookie('csrftoken');
-
   function toggleLike(postId) {
     fetch(`/toggle_like/${postId}`, {
       method: 'PUT',
@@ -45,4 +29,152 @@
 
   // Expose globally for templates
   window.toggleLike = toggleLike;
+
+  // --- Infinite scroll over the JSON feed API ---
+
+  const MONTHS = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun',
+                  'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec'];
+
+  // Same output as the template's date:"M d, Y H:i" (server time is UTC)
+  function formatTimestamp(iso) {
+    const date = new Date(iso);
+    const pad = (n) => String(n).padStart(2, '0');
+    return `${MONTHS[date.getUTCMonth()]} ${pad(date.getUTCDate())}, ` +
+      `${date.getUTCFullYear()} ${pad(date.getUTCHours())}:${pad(date.getUTCMinutes())}`;
+  }
+
+  function element(tag, className, text) {
+    const el = document.createElement(tag);
+    if (className) el.className = className;
+    if (text !== undefined) el.innerText = text;
+    return el;
+  }
+
+  // Build the same card markup as the feed templates
+  function renderPost(post, showAuthor, authenticated) {
+    const card = element('div', 'card mb-3');
+    const body = element('div', 'card-body');
+    card.appendChild(body);
+
+    if (showAuthor) {
+      const header = element('h6', 'card-subtitle mb-2 text-muted');
+      const link = element('a');
+      link.href = `/profile/${encodeURIComponent(post.author)}`;
+      link.appendChild(element('strong', '', post.author));
+      header.appendChild(link);
+      body.appendChild(header);
+    }
+
+    const content = element('p', 'card-text', post.content);
+    content.id = `post-content-${post.id}`;
+    body.appendChild(content);
+
+    const meta = element('small', 'text-muted', `${formatTimestamp(post.timestamp)} · `);
+    const count = element('span', '', post.likes);
+    count.id = `like-count-${post.id}`;
+    meta.appendChild(count);
+    meta.appendChild(document.createTextNode(' Likes'));
+    body.appendChild(meta);
+
+    // Archived posts can be neither edited nor liked
+    if (authenticated && !post.archived) {
+      const controls = element('div', 'mt-2');
+      if (post.editable) {
+        const edit = element('button', 'btn btn-sm btn-outline-secondary', 'Edit');
+        edit.onclick = () => window.editPost(post.id);
+        controls.appendChild(edit);
+        controls.appendChild(document.createTextNode(' '));
+      }
+      const like = element(
+        'button',
+        `btn btn-sm ${post.liked ? 'btn-success' : 'btn-outline-success'}`,
+        post.liked ? 'Unlike' : 'Like');
+      like.id = `like-btn-${post.id}`;
+      like.onclick = () => toggleLike(post.id);
+      controls.appendChild(like);
+      body.appendChild(controls);
+    }
+    return card;
+  }
+
+  function setUpInfiniteScroll() {
+    const posts = document.getElementById('posts');
+    if (!posts || !posts.dataset.feedUrl || !('IntersectionObserver' in window)) return;
+
+    const showAuthor = posts.dataset.showAuthor !== 'false';
+    const authenticated = document.body.dataset.authenticated === 'true';
+    let next = posts.dataset.nextCursor;
+    let loading = false;
+
+    // JavaScript takes over paging, the links stay as a fallback without it
+    document.querySelectorAll('.feed-pagination').forEach((nav) => { nav.hidden = true; });
+
+    const sentinel = element('div');
+    posts.after(sentinel);
+
+    const observer = new IntersectionObserver((entries) => {
+      if (!entries[0].isIntersecting || loading || !next) return;
+      loading = true;
+      // The browser revalidates with If-None-Match, unchanged pages come back as 304
+      fetch(`${posts.dataset.feedUrl}?cursor=${encodeURIComponent(next)}`, {
+        headers: { Accept: 'application/json' },
+      })
+        .then((response) => response.json())
+        .then((data) => {
+          data.posts.forEach((post) => {
+            posts.appendChild(renderPost(post, showAuthor, authenticated));
+          });
+          next = data.next;
+          if (!next) observer.disconnect();
+          connectEvents();
+        })
+        .catch((error) => console.error('Feed error:', error))
+        .finally(() => { loading = false; });
+    });
+    if (next) observer.observe(sentinel);
+  }
+
+  // --- Live updates over Server-Sent Events ---
+
+  let eventSource = null;
+
+  function showNewPostsNotice(count) {
+    const posts = document.getElementById('posts');
+    if (!posts) return;
+    let notice = document.getElementById('new-posts-notice');
+    if (!notice) {
+      notice = element('a', 'alert alert-info d-block text-center');
+      notice.id = 'new-posts-notice';
+      notice.href = window.location.pathname;
+      notice.dataset.count = 0;
+      posts.prepend(notice);
+    }
+    notice.dataset.count = Number(notice.dataset.count) + count;
+    const total = notice.dataset.count;
+    notice.innerText = `${total} new post${total === '1' ? '' : 's'} from people you follow`;
+  }
+
+  // (Re)open the stream for the posts currently on screen
+  function connectEvents() {
+    const url = document.body.dataset.eventsUrl;
+    if (!url || !('EventSource' in window)) return;
+
+    const ids = Array.from(document.querySelectorAll('[id^="like-count-"]'))
+      .map((el) => el.id.replace('like-count-', ''));
+    if (eventSource) eventSource.close();
+    eventSource = new EventSource(`${url}?posts=${ids.join(',')}`);
+
+    eventSource.addEventListener('likes', (event) => {
+      Object.entries(JSON.parse(event.data)).forEach(([postId, likes]) => {
+        const count = document.getElementById(`like-count-${postId}`);
+        if (count) count.innerText = likes;
+      });
+    });
+    eventSource.addEventListener('posts', (event) => {
+      showNewPostsNotice(JSON.parse(event.data).count);
+    });
+  }
+
+  document.addEventListener('DOMContentLoaded', setUpInfiniteScroll);
+  document.addEventListener('DOMContentLoaded', connectEvents);
 })();
@@ -0,0 +1,222 @@
+"""
+Background jobs for the work that follows a write.
+
+A view calls `enqueue(name, *args)` inside its transaction, which stores a
+Task row along with the write itself, so a job is never lost nor run for
+a write that rolled back. NETWORK_TASK_BACKEND decides who runs it:
+
+* "database": `manage.py run_tasks` worker processes poll for due tasks;
+* "local" (default): a background thread of the enqueuing process runs it
+  once the transaction commits and its delay has passed, and runs its
+  retries the same way. Tasks whose process exited before running them,
+  on a crash or a restart during a delay, are only picked up by
+  `run_tasks`, so at least one worker is still required;
+* "immediate": it runs inline, inside the caller's transaction, with no
+  Task row. Used by the tests.
+
+Workers claim a task with a conditional UPDATE, so only one of them runs
+it, and hold it for NETWORK_TASK_LEASE seconds; a task whose worker died
+becomes claimable again when its lease runs out. A failing task is
+retried with exponential backoff up to NETWORK_TASK_MAX_ATTEMPTS times.
+Delivery is therefore at least once, and jobs must be idempotent.
+Passing `key` to `enqueue` makes enqueueing idempotent too.
+"""
+import atexit
+import logging
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from . import caching, timeline
+from .counters import post_count
+from .models import User, Post, Follow, Task
+
+logger = logging.getLogger(__name__)
+
+registry = {}
+
+
+def job(name):
+    """
+    Decorator registering a function as the job `name`. Its arguments
+    must be JSON serializable.
+    """
+    def decorator(func):
+        registry[name] = func
+        return func
+    return decorator
+
+
+def enqueue(name, *args, key=None, delay=0):
+    """
+    Queue the job `name` with `args`, to run no sooner than `delay` seconds
+    from now. Returns the Task, or None if it ran immediately or a task
+    with the same `key` already exists.
+    """
+    if name not in registry:
+        raise KeyError(f"Unknown job {name!r}")
+    if settings.NETWORK_TASK_BACKEND == "immediate":
+        registry[name](*args)
+        return None
+
+    try:
+        with transaction.atomic():
+            task = Task.objects.create(
+                name=name, args=list(args), key=key,
+                run_after=timezone.now() + timedelta(seconds=delay),
+            )
+    except IntegrityError:
+        if key is None:
+            raise
+        return None
+    if settings.NETWORK_TASK_BACKEND == "local":
+        transaction.on_commit(lambda: schedule(task.pk, delay))
+    return task
+
+
+def _claimable(now):
+    return Q(status=Task.PENDING, run_after__lte=now) | Q(status=Task.RUNNING, locked_until__lt=now)
+
+
+def claim(task_id):
+    """
+    Take the task for this worker if it is due and nobody else holds it.
+    """
+    now = timezone.now()
+    return Task.objects.filter(_claimable(now), pk=task_id).update(
+        status=Task.RUNNING,
+        attempts=F("attempts") + 1,
+        locked_until=now + timedelta(seconds=settings.NETWORK_TASK_LEASE),
+    ) == 1
+
+
+def run(task_id):
+    """
+    Claim and run one task, recording the outcome. Returns False if the
+    task could not be claimed.
+    """
+    if not claim(task_id):
+        return False
+    task = Task.objects.get(pk=task_id)
+    try:
+        registry[task.name](*task.args)
+    except Exception:
+        error = traceback.format_exc()
+        logger.exception("Task %s failed (attempt %d)", task, task.attempts)
+        if task.attempts >= settings.NETWORK_TASK_MAX_ATTEMPTS:
+            Task.objects.filter(pk=task_id).update(
+                status=Task.FAILED, last_error=error, finished=timezone.now())
+        else:
+            delay = settings.NETWORK_TASK_RETRY_DELAY * 2 ** (task.attempts - 1)
+            Task.objects.filter(pk=task_id).update(
+                status=Task.PENDING, last_error=error, locked_until=None,
+                run_after=timezone.now() + timedelta(seconds=delay))
+            if settings.NETWORK_TASK_BACKEND == "local":
+                schedule(task_id, delay)
+    else:
+        Task.objects.filter(pk=task_id).update(
+            status=Task.DONE, locked_until=None, finished=timezone.now())
+    return True
+
+
+def run_due(limit=100):
+    """
+    Run up to `limit` due tasks, oldest first, returning how many this
+    worker ran.
+    """
+    due = (
+        Task.objects.filter(_claimable(timezone.now()))
+        .order_by("run_after", "pk").values_list("pk", flat=True)[:limit]
+    )
+    return sum(run(task_id) for task_id in list(due))
+
+
+def purge(older_than):
+    """
+    Delete finished tasks older than `older_than` seconds. Failed tasks are
+    kept for inspection.
+    """
+    cutoff = timezone.now() - timedelta(seconds=older_than)
+    deleted, _ = Task.objects.filter(status=Task.DONE, finished__lt=cutoff).delete()
+    return deleted
+
+
+def _run_in_thread(task_id):
+    try:
+        run(task_id)
+    except Exception:
+        # The task stays in the table for run_tasks to retry.
+        logger.exception("Could not run task %s", task_id)
+    finally:
+        connections.close_all()
+
+
+def schedule(task_id, delay=0):
+    """
+    Run the task in this process's thread pool (the local backend) once
+    `delay` seconds have passed.
+    """
+    if delay <= 0:
+        get_executor().submit(_run_in_thread, task_id)
+        return
+    timer = threading.Timer(delay, schedule, (task_id,))
+    # A pending retry must not keep the process alive; run_tasks takes it over.
+    timer.daemon = True
+    timer.start()
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """
+    Return this process's thread pool for the local backend, creating it
+    on first use.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                settings.NETWORK_TASK_LOCAL_THREADS, thread_name_prefix="network-tasks")
+            atexit.register(_executor.shutdown)
+        return _executor
+
+
+# Jobs
+
+@job("deliver_post")
+def deliver_post(post_id):
+    """
+    The follow-up work of a new post: its author's post count and the
+    fan-out to followers' timelines. Both are safe to repeat.
+    """
+    post = Post.objects.select_related("author").filter(pk=post_id).first()
+    if post is None:
+        return
+    with transaction.atomic():
+        User.objects.filter(pk=post.author_id).update(post_count=post_count())
+        timeline.fan_out(post)
+    # Feeds that were served before the fan-out finished must revalidate.
+    caching.feed_changed()
+
+
+@job("deliver_author")
+def deliver_author(author_id):
+    """
+    Deliver the latest posts of an author who is no longer a celebrity to
+    all of their followers. Safe to repeat.
+    """
+    author = User.objects.filter(pk=author_id).first()
+    if author is None:
+        return
+    with transaction.atomic():
+        timeline.backfill_followers(author)
+    for follower_id in Follow.objects.filter(following=author).values_list("follower_id", flat=True):
+        caching.timeline_changed(follower_id)
@@ -0,0 +1,21 @@
+from django import template
+from django.conf import settings
+from django.templatetags.static import static
+from django.utils.html import format_html_join
+
+register = template.Library()
+
+
+@register.simple_tag
+def bundle(name):
+    """
+    Include a bundle from NETWORK_STATIC_BUNDLES: the built file when the
+    static pipeline is on, otherwise each of its source files.
+    """
+    if settings.NETWORK_STATIC_PIPELINE:
+        urls = [static(name)]
+    else:
+        urls = [static(source) for source in settings.NETWORK_STATIC_BUNDLES[name]]
+    if name.endswith(".css"):
+        return format_html_join("\n", '<link href="{}" rel="stylesheet">', ((url,) for url in urls))
+    return format_html_join("\n", '<script src="{}"></script>', ((url,) for url in urls))
@@ -0,0 +1,24 @@
+from functools import lru_cache
+
+from django import template
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.urls import reverse
+
+register = template.Library()
+
+
+@register.filter
+@lru_cache(maxsize=10000)
+def profile_url(username):
+    """
+    The profile URL of `username`, reversed once per username rather than
+    once per post card.
+    """
+    return reverse("profile", args=[username])
+
+
+@receiver(setting_changed)
+def clear_profile_urls(setting, **kwargs):
+    if setting == "ROOT_URLCONF":
+        profile_url.cache_clear()
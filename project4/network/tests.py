@@ -1,3 +1,1645 @@
-from django.test import TestCase
+import asyncio
+import gzip
+import json
+import os
+import runpy
+import shutil
+import tempfile
+import time
+from array import array
+from contextlib import nullcontext
+from datetime import timedelta
+from io import StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.cache import cache, caches
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError, IntegrityError, connection, connections, router, transaction
+from django.db.models import F, Q
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.functional import SimpleLazyObject
+
+from . import (
+    archive, assets, benchmark, dataset, events, graph, likes, metrics, routing, tasks, throttling,
+    timeline, trending,
+)
+from .models import (
+    User, Post, ArchivedPost, Follow, TimelineEntry, ImportProgress, Task, compress_content,
+    decompress_content, trending_score,
+)
+from .pagination import Cursor
+
+
+@override_settings(
+    NETWORK_TASK_BACKEND="immediate",
+    SESSION_ENGINE="django.contrib.sessions.backends.cached_db",
+    NETWORK_SLOW_REQUEST_SECONDS=60,
+)
+class NetworkTestCase(TestCase):
+    """
+    Clears the cache between tests so cached pages and fragments from one
+    test never leak into the next. Background tasks run inline, so tests
+    see their effects as soon as the view returns. Sessions are cached as
+    with a shared NETWORK_CACHE, which the single test process amounts to.
+    Only tests that ask for it log slow requests (password hashing alone
+    makes a login slow).
+    """
+
+    def setUp(self):
+        cache.clear()
+        caches["sessions"].clear()
+        caches["throttle"].clear()
+
+
+class CounterTests(NetworkTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.alice = User.objects.create_user("alice", "alice@example.com", "pass")
+        self.bob = User.objects.create_user("bob", "bob@example.com", "pass")
+        self.client.force_login(self.alice)
+
+    def test_new_post_increments_post_count(self):
+        self.client.post(reverse("new_post"), {"content": "hello"})
+        self.alice.refresh_from_db()
+        self.assertEqual(self.alice.post_count, 1)
+
+    def test_toggle_like_updates_like_count(self):
+        post = Post.objects.create(author=self.bob, content="hi")
+        url = reverse("toggle_like", args=[post.id])
+
+        data = self.client.put(url).json()
+        self.assertEqual((data["liked"], data["likes"]), (True, 1))
+
+        data = self.client.put(url).json()
+        self.assertEqual((data["liked"], data["likes"]), (False, 0))
+        post.refresh_from_db()
+        self.assertEqual(post.like_count, 0)
+
+    def test_toggle_follow_updates_both_users(self):
+        url = reverse("toggle_follow", args=["bob"])
+        self.client.post(url)
+        self.alice.refresh_from_db()
+        self.bob.refresh_from_db()
+        self.assertEqual(self.alice.following_count, 1)
+        self.assertEqual(self.bob.follower_count, 1)
+
+        self.client.post(url)
+        self.bob.refresh_from_db()
+        self.assertEqual(self.bob.follower_count, 0)
+
+    def test_concurrent_unfollow_is_counted_once(self):
+        url = reverse("toggle_follow", args=["bob"])
+        self.client.post(url)
+        stale = Follow.objects.get(follower=self.alice, following=self.bob)
+        # Another request unfollows between our read and our delete.
+        self.client.post(url)
+        with mock.patch.object(Follow.objects, "get_or_create", return_value=(stale, False)):
+            self.client.post(url)
+        self.alice.refresh_from_db()
+        self.bob.refresh_from_db()
+        self.assertEqual((self.alice.following_count, self.bob.follower_count), (0, 0))
+
+    def test_rebuild_counters_repairs_drift(self):
+        post = Post.objects.create(author=self.bob, content="hi")
+        post.likes.add(self.alice)
+        Follow.objects.create(follower=self.alice, following=self.bob)
+
+        call_command("rebuild_counters", stdout=StringIO())
+
+        post.refresh_from_db()
+        self.bob.refresh_from_db()
+        self.alice.refresh_from_db()
+        self.assertEqual(post.like_count, 1)
+        self.assertEqual(self.bob.post_count, 1)
+        self.assertEqual(self.bob.follower_count, 1)
+        self.assertEqual(self.alice.following_count, 1)
+
+
+class FeedQueryBudgetTests(NetworkTestCase):
+    """
+    A feed page must cost a fixed number of queries no matter how many posts,
+    authors or likes are on it.
+    """
+
+    # viewer + page of posts + viewer likes; the session comes from the
+    # cached_db session cache
+    INDEX_BUDGET = 3
+    # ... + profile user + is_following + archived posts, read because
+    # the page reaches the author's oldest hot post
+    PROFILE_BUDGET = 6
+    # ... + celebrity posts merged in at read time + the follow lists of
+    # the viewer and of the people they follow + suggested users
+    FOLLOWING_BUDGET = 7
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.viewer = User.objects.create_user("viewer", "viewer@example.com", "pass")
+        authors = [
+            User.objects.create_user(f"author{i}", f"author{i}@example.com", "pass")
+            for i in range(5)
+        ]
+        for i in range(15):
+            post = Post.objects.create(author=authors[i % 5], content=f"post {i}")
+            if i % 2:
+                post.likes.add(cls.viewer, authors[0])
+        for author in authors:
+            Follow.objects.create(follower=cls.viewer, following=author)
+        outsider = User.objects.create_user("outsider", "outsider@example.com", "pass")
+        Follow.objects.create(follower=authors[0], following=outsider)
+        timeline.rebuild(cls.viewer)
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.viewer)
+
+    def assertWithinBudget(self, url, budget):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(
+            len(queries), budget,
+            f"{url} ran {len(queries)} queries (budget {budget})",
+        )
+        return response
+
+    def test_index_within_budget(self):
+        response = self.assertWithinBudget(reverse("index"), self.INDEX_BUDGET)
+        self.assertContains(response, "Unlike")
+
+    def test_profile_within_budget(self):
+        url = reverse("profile", args=["author1"])
+        self.assertWithinBudget(url, self.PROFILE_BUDGET)
+
+    def test_following_within_budget(self):
+        response = self.assertWithinBudget(reverse("following"), self.FOLLOWING_BUDGET)
+        self.assertEqual(len(response.context["page_obj"]), 10)
+        self.assertContains(response, "Who to follow")
+        self.assertWithinBudget(reverse("following") + "?page=2", self.FOLLOWING_BUDGET)
+
+
+class CursorPaginationTests(NetworkTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user("author", "author@example.com", "pass")
+        now = timezone.now()
+        # Pairs of posts share a timestamp so the id tie-breaker is exercised.
+        cls.posts = [
+            Post.objects.create(
+                author=cls.author, content=f"post {i}",
+                timestamp=now - timedelta(minutes=i // 2))
+            for i in range(25)
+        ]
+
+    def page_ids(self, query=""):
+        response = self.client.get(reverse("index") + query)
+        page_obj = response.context["page_obj"]
+        return [post.id for post in page_obj], page_obj
+
+    def test_walks_forward_and_back_without_gaps(self):
+        expected = [
+            post.id for post in
+            sorted(self.posts, key=lambda p: (p.timestamp, p.id), reverse=True)
+        ]
+        seen = []
+        ids, page_obj = self.page_ids()
+        seen += ids
+        self.assertFalse(page_obj.has_previous)
+        while page_obj.has_next:
+            ids, page_obj = self.page_ids(f"?cursor={page_obj.next_cursor}")
+            seen += ids
+        self.assertEqual(seen, expected)
+
+        ids, page_obj = self.page_ids(f"?cursor={page_obj.previous_cursor}")
+        self.assertEqual(ids, expected[10:20])
+
+    def test_legacy_page_links_still_work(self):
+        ids, page_obj = self.page_ids("?page=2")
+        self.assertEqual(len(ids), 10)
+        self.assertTrue(page_obj.has_previous)
+        self.assertTrue(page_obj.has_next)
+
+    def test_invalid_cursor_falls_back_to_first_page(self):
+        first, _ = self.page_ids()
+        ids, _ = self.page_ids("?cursor=not-a-cursor")
+        self.assertEqual(ids, first)
+
+    def test_no_count_query(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse("index") + "?page=2")
+        self.assertFalse(any("COUNT(" in q["sql"] for q in queries))
+
+    def test_cursor_round_trip(self):
+        cursor = Cursor(True, self.posts[0].timestamp, self.posts[0].id)
+        self.assertEqual(Cursor.decode(cursor.encode()), cursor)
+
+
+class TimelineTests(NetworkTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.alice = User.objects.create_user("alice", "alice@example.com", "pass")
+        self.bob = User.objects.create_user("bob", "bob@example.com", "pass")
+        self.carol = User.objects.create_user("carol", "carol@example.com", "pass")
+        self.client.force_login(self.alice)
+
+    def following_contents(self):
+        response = self.client.get(reverse("following"))
+        return [post.content for post in response.context["page_obj"]]
+
+    def test_follow_backfills_and_new_posts_fan_out(self):
+        Post.objects.create(author=self.bob, content="before")
+        self.client.post(reverse("toggle_follow", args=["bob"]))
+
+        self.client.force_login(self.bob)
+        self.client.post(reverse("new_post"), {"content": "after"})
+
+        self.client.force_login(self.alice)
+        self.assertEqual(self.following_contents(), ["after", "before"])
+
+    def test_unfollow_prunes_timeline(self):
+        Post.objects.create(author=self.bob, content="hello")
+        url = reverse("toggle_follow", args=["bob"])
+        self.client.post(url)
+        self.client.post(url)
+        self.assertFalse(TimelineEntry.objects.filter(owner=self.alice).exists())
+        self.assertEqual(self.following_contents(), [])
+
+    @override_settings(NETWORK_CELEBRITY_FOLLOWERS=2)
+    def test_celebrity_posts_are_merged_at_read_time(self):
+        self.client.post(reverse("toggle_follow", args=["bob"]))
+        self.client.post(reverse("toggle_follow", args=["carol"]))
+        User.objects.filter(pk=self.bob.pk).update(follower_count=5)
+        self.bob.refresh_from_db()
+
+        carol_post = Post.objects.create(author=self.carol, content="from carol")
+        bob_post = Post.objects.create(author=self.bob, content="from bob")
+        self.assertEqual(timeline.fan_out(carol_post), 1)
+        self.assertEqual(timeline.fan_out(bob_post), 0)
+
+        self.assertEqual(self.following_contents(), ["from bob", "from carol"])
+
+    @override_settings(NETWORK_CELEBRITY_FOLLOWERS=2)
+    def test_former_celebrity_posts_are_delivered(self):
+        self.client.post(reverse("toggle_follow", args=["bob"]))
+        self.client.force_login(self.carol)
+        self.client.post(reverse("toggle_follow", args=["bob"]))
+        self.client.force_login(self.bob)
+        self.client.post(reverse("new_post"), {"content": "while famous"})
+        self.assertFalse(TimelineEntry.objects.exists())
+
+        self.client.force_login(self.carol)
+        self.client.post(reverse("toggle_follow", args=["bob"]))
+        self.client.force_login(self.alice)
+        self.assertEqual(self.following_contents(), ["while famous"])
+
+    @override_settings(NETWORK_CELEBRITY_FOLLOWERS=3, NETWORK_TIMELINE_BACKFILL=2)
+    def test_rebuild_many_matches_backfill(self):
+        dave = User.objects.create_user("dave", "dave@example.com", "pass")
+        for i in range(3):
+            Post.objects.create(author=self.bob, content=f"bob {i}")
+            Post.objects.create(author=self.carol, content=f"carol {i}")
+        follows = [(self.alice, self.bob), (self.alice, self.carol), (dave, self.carol),
+                   (self.bob, self.carol), (dave, self.bob)]
+        for follower, author in follows:
+            Follow.objects.create(follower=follower, following=author)
+        User.objects.filter(pk=self.carol.pk).update(follower_count=3)
+
+        def entries():
+            return set(TimelineEntry.objects.values_list("owner_id", "post_id", "timestamp"))
+
+        for follower, author in follows:
+            author.refresh_from_db()
+            timeline.backfill(follower, author)
+        expected = entries()
+        self.assertEqual(len(expected), 4)  # Carol is a celebrity.
+        TimelineEntry.objects.create(
+            owner=self.alice, post=Post.objects.filter(author=self.carol).first(),
+            timestamp=timezone.now())
+
+        with CaptureQueriesContext(connection) as captured:
+            written = timeline.rebuild_many(
+                [self.alice.pk, self.bob.pk, dave.pk], batch_size=3)
+        self.assertEqual(written, 4)
+        self.assertEqual(entries(), expected)
+        # The follows and the latest posts, whatever the number of users.
+        self.assertEqual(sum(q["sql"].startswith("SELECT") for q in captured), 2)
+
+
+@skipUnless(connection.vendor == "sqlite", "EXPLAIN output is SQLite specific")
+class IndexUsageTests(NetworkTestCase):
+    """
+    The feed and follow queries must be served by the indexes added for them
+    rather than by table scans and temporary sorts.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = User.objects.create_user("alice", "alice@example.com", "pass")
+        cls.bob = User.objects.create_user("bob", "bob@example.com", "pass")
+        cls.cursor = Cursor(False, timezone.now(), 10)
+
+    def assertUsesIndex(self, queryset, index):
+        plan = queryset.explain()
+        self.assertIn(index, plan)
+        self.assertNotIn("TEMP B-TREE", plan)
+
+    def test_global_feed_uses_time_index(self):
+        self.assertUsesIndex(Post.objects.order_by("-timestamp", "-id")[:11], "post_time_idx")
+
+    def test_global_feed_page_uses_time_index(self):
+        older = Post.objects.filter(
+            Q(timestamp__lt=self.cursor.timestamp)
+            | Q(timestamp=self.cursor.timestamp, id__lt=self.cursor.pk))
+        self.assertUsesIndex(older.order_by("-timestamp", "-id")[:11], "post_time_idx")
+
+    def test_profile_feed_uses_author_index(self):
+        posts = Post.objects.filter(author=self.alice).order_by("-timestamp", "-id")[:11]
+        self.assertUsesIndex(posts, "post_author_time_idx")
+
+    def test_is_following_uses_unique_index(self):
+        plan = Follow.objects.filter(follower=self.alice, following=self.bob).explain()
+        self.assertIn("COVERING INDEX", plan)
+        self.assertIn("follower_id=? AND following_id=?", plan)
+
+    def test_duplicate_follow_is_rejected(self):
+        Follow.objects.create(follower=self.alice, following=self.bob)
+        with self.assertRaises(IntegrityError):
+            with transaction.atomic():
+                Follow.objects.create(follower=self.alice, following=self.bob)
+
+
+class CachingTests(NetworkTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.alice = User.objects.create_user("alice", "alice@example.com", "pass")
+        self.post = Post.objects.create(author=self.alice, content="original")
+
+    def test_anonymous_index_is_served_from_cache(self):
+        self.client.get(reverse("index"))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("index"))
+        self.assertEqual(len(queries), 0)
+        self.assertContains(response, "original")
+
+    def test_new_post_invalidates_anonymous_page(self):
+        self.client.get(reverse("index"))
+        self.client.force_login(self.alice)
+        self.client.post(reverse("new_post"), {"content": "fresh"})
+        self.client.logout()
+        self.assertContains(self.client.get(reverse("index")), "fresh")
+
+    def test_edit_and_like_refresh_the_cached_card(self):
+        self.client.force_login(self.alice)
+        self.client.get(reverse("index"))
+
+        self.client.put(
+            reverse("edit_post", args=[self.post.id]),
+            json.dumps({"content": "edited"}), content_type="application/json")
+        self.client.put(reverse("toggle_like", args=[self.post.id]))
+
+        response = self.client.get(reverse("index"))
+        self.assertContains(response, "edited")
+        self.assertContains(response, f'<span id="like-count-{self.post.id}">1</span>')
+        self.assertContains(response, "Unlike")
+
+    def test_viewer_controls_are_not_cached(self):
+        bob = User.objects.create_user("bob", "bob@example.com", "pass")
+        self.client.force_login(self.alice)
+        self.assertContains(self.client.get(reverse("index")), "editPost(")
+        self.client.force_login(bob)
+        self.assertNotContains(self.client.get(reverse("index")), "editPost(")
+
+
+class FeedApiTests(NetworkTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.alice = User.objects.create_user("alice", "alice@example.com", "pass")
+        self.bob = User.objects.create_user("bob", "bob@example.com", "pass")
+        for i in range(12):
+            Post.objects.create(author=self.bob, content=f"post {i}")
+        self.client.force_login(self.alice)
+
+    def test_global_feed_pages_with_cursor(self):
+        data = self.client.get(reverse("api_posts")).json()
+        self.assertEqual(len(data["posts"]), 10)
+        self.assertEqual(
+            set(data["posts"][0]),
+            {"id", "author", "content", "timestamp", "likes", "liked", "editable", "archived"})
+
+        data = self.client.get(reverse("api_posts"), {"cursor": data["next"]}).json()
+        self.assertEqual(len(data["posts"]), 2)
+        self.assertIsNone(data["next"])
+
+    def test_unchanged_feed_returns_not_modified(self):
+        response = self.client.get(reverse("api_profile_posts", args=["bob"]))
+        self.assertTrue(response.has_header("Last-Modified"))
+
+        response = self.client.get(
+            reverse("api_profile_posts", args=["bob"]),
+            HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+
+    def test_like_changes_etag(self):
+        etag = self.client.get(reverse("api_posts"))["ETag"]
+        post = Post.objects.first()
+        self.client.put(reverse("toggle_like", args=[post.id]))
+
+        response = self.client.get(reverse("api_posts"), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()["posts"][0]["liked"])
+
+    def test_follow_changes_following_etag(self):
+        etag = self.client.get(reverse("api_following"))["ETag"]
+        self.client.post(reverse("toggle_follow", args=["bob"]))
+
+        response = self.client.get(reverse("api_following"), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()["posts"]), 10)
+
+    def test_profile_and_following_apis_require_login(self):
+        self.client.logout()
+        for url in (reverse("api_profile_posts", args=["bob"]), reverse("api_following")):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 401)
+            self.assertEqual(response.json(), {"error": "Authentication required."})
+        self.assertEqual(self.client.get(reverse("api_posts")).status_code, 200)
+
+
+class LikeWriteTests(NetworkTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.alice = User.objects.create_user("alice", "alice@example.com", "pass")
+        self.bob = User.objects.create_user("bob", "bob@example.com", "pass")
+        self.post = Post.objects.create(author=self.bob, content="hi")
+
+    def test_write_like_does_not_load_the_post(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(likes.write_like(self.post.id, self.alice.id), (True, 1))
+        # Only the final read of the new counter, no post or likes loads.
+        selects = [q["sql"] for q in queries if q["sql"].startswith("SELECT")]
+        self.assertEqual(len(selects), 1)
+        self.assertEqual(likes.write_like(self.post.id, self.alice.id), (False, 0))
+
+    def test_write_like_unknown_post(self):
+        with self.assertRaises(Post.DoesNotExist):
+            likes.write_like(self.post.id + 1, self.alice.id)
+        self.assertFalse(likes.Like.objects.exists())
+
+    def test_buffer_collapses_and_flushes_in_bulk(self):
+        buffer = likes.LikeBuffer(max_events=100, max_delay=60)
+        self.assertEqual(buffer.toggle(self.post.id, self.alice.id), (True, 1))
+        self.assertEqual(buffer.toggle(self.post.id, self.alice.id), (False, 0))
+        self.assertEqual(buffer.toggle(self.post.id, self.alice.id), (True, 1))
+        self.assertEqual(buffer.toggle(self.post.id, self.bob.id), (True, 2))
+        self.assertEqual(len(buffer), 2)
+        self.assertFalse(likes.Like.objects.exists())
+
+        self.assertEqual(buffer.flush(), 2)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 2)
+        self.assertEqual(buffer.toggle(self.post.id, self.bob.id), (False, 1))
+        buffer.flush()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 1)
+
+    def test_failed_flush_keeps_events_for_retry(self):
+        buffer = likes.LikeBuffer(max_events=100, max_delay=60)
+        buffer.toggle(self.post.id, self.alice.id)
+        with mock.patch.object(likes.Like.objects, "bulk_create", side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                buffer.flush()
+        self.assertEqual(len(buffer), 1)
+
+        buffer.flush()
+        buffer._write({(self.post.id, self.alice.id): True})  # replayed batch
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 1)
+
+    def test_toggle_during_flush_sees_the_batch_in_flight(self):
+        buffer = likes.LikeBuffer(max_events=100, max_delay=60)
+        self.assertEqual(buffer.toggle(self.post.id, self.alice.id), (True, 1))
+        write = buffer._write
+        during = []
+
+        def toggle_then_write(batch):
+            during.append(buffer.toggle(self.post.id, self.alice.id))
+            during.append(buffer.toggle(self.post.id, self.bob.id))
+            return write(batch)
+
+        with mock.patch.object(buffer, "_write", toggle_then_write):
+            buffer.flush()
+        self.assertEqual(during, [(False, 0), (True, 1)])
+        self.assertEqual(buffer.toggle(self.post.id, self.bob.id), (False, 0))
+        buffer.flush()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 0)
+        self.assertFalse(likes.Like.objects.exists())
+
+    def test_toggle_after_failed_flush_counts_the_returned_batch(self):
+        buffer = likes.LikeBuffer(max_events=100, max_delay=60)
+        buffer.toggle(self.post.id, self.alice.id)
+        with mock.patch.object(buffer, "_write", side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                buffer.flush()
+        self.assertEqual(buffer.toggle(self.post.id, self.bob.id), (True, 2))
+        self.assertEqual(buffer.flush(), 2)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 2)
+
+    def test_flush_drops_events_for_deleted_posts(self):
+        other = Post.objects.create(author=self.bob, content="other")
+        buffer = likes.LikeBuffer(max_events=100, max_delay=60)
+        buffer.toggle(self.post.id, self.alice.id)
+        buffer.toggle(other.id, self.alice.id)
+        self.post.delete()
+        self.assertEqual(buffer.flush(), 1)
+        self.assertEqual(len(buffer), 0)
+        other.refresh_from_db()
+        self.assertEqual(other.like_count, 1)
+
+    @override_settings(NETWORK_LIKE_BUFFERING=True)
+    def test_view_uses_buffer_when_enabled(self):
+        self.client.force_login(self.alice)
+        with mock.patch.object(likes, "_buffer", likes.LikeBuffer(max_delay=60)) as buffer:
+            data = self.client.put(reverse("toggle_like", args=[self.post.id])).json()
+            self.assertEqual((data["liked"], data["likes"]), (True, 1))
+            self.assertEqual(len(buffer), 1)
+            buffer.flush()
+        self.assertTrue(self.post.likes.filter(pk=self.alice.pk).exists())
+
+
+@skipUnless(connection.vendor == "sqlite", "SQLite connection tuning")
+class SqliteTuningTests(TestCase):
+
+    def test_pragmas_applied_to_connections(self):
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA busy_timeout")
+            self.assertEqual(cursor.fetchone()[0], settings.NETWORK_SQLITE_PRAGMAS["busy_timeout"])
+            cursor.execute("PRAGMA synchronous")
+            self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+
+
+@skipUnless(connection.vendor == "sqlite", "Uses the SQLite FTS5 index")
+class SearchTests(NetworkTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.alice = User.objects.create_user("alice", "alice@example.com", "pass")
+        self.cats = Post.objects.create(author=self.alice, content="Cats are running the house")
+        self.dogs = Post.objects.create(author=self.alice, content="Dogs love a long run")
+
+    def result_ids(self, query):
+        return [post["id"] for post in
+                self.client.get(reverse("api_search"), {"q": query}).json()["posts"]]
+
+    def test_matches_stemmed_words(self):
+        self.assertEqual(set(self.result_ids("run")), {self.cats.id, self.dogs.id})
+        self.assertEqual(self.result_ids("cats house"), [self.cats.id])
+
+    def test_index_follows_edits_and_deletes(self):
+        self.client.force_login(self.alice)
+        self.client.put(
+            reverse("edit_post", args=[self.dogs.id]),
+            json.dumps({"content": "Parrots talk"}), content_type="application/json")
+        self.assertEqual(self.result_ids("dogs"), [])
+        self.assertEqual(self.result_ids("parrots"), [self.dogs.id])
+
+        self.cats.delete()
+        self.assertEqual(self.result_ids("cats"), [])
+
+    def test_fts_syntax_in_query_is_ignored(self):
+        self.assertEqual(self.result_ids('cats"* ('), [self.cats.id])
+
+    def test_search_page_renders_results(self):
+        response = self.client.get(reverse("search"), {"q": "cats"})
+        self.assertContains(response, "Cats are running the house")
+
+    def test_rebuild_command(self):
+        with connection.cursor() as cursor:
+            cursor.execute("INSERT INTO network_post_fts(network_post_fts) VALUES ('delete-all')")
+        self.assertEqual(self.result_ids("cats"), [])
+        call_command("rebuild_search_index", batch_size=1, stdout=StringIO())
+        self.assertEqual(self.result_ids("cats"), [self.cats.id])
+
+
+@override_settings(ROOT_URLCONF="network.async_urls")
+class AsyncViewTests(NetworkTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = User.objects.create_user("alice", "alice@example.com", "pass")
+        cls.bob = User.objects.create_user("bob", "bob@example.com", "pass")
+        cls.post = Post.objects.create(author=cls.bob, content="hello async")
+        Follow.objects.create(follower=cls.alice, following=cls.bob)
+        timeline.rebuild(cls.alice)
+
+    async def test_feed_pages(self):
+        response = await self.async_client.get(reverse("index"))
+        self.assertContains(response, "hello async")
+
+        await self.async_client.aforce_login(self.alice)
+        for url in (reverse("index"), reverse("following"), reverse("profile", args=["bob"])):
+            response = await self.async_client.get(url)
+            self.assertContains(response, "hello async")
+        self.assertTrue(response.context["is_following"])
+
+    async def test_toggle_like_and_edit(self):
+        await self.async_client.aforce_login(self.alice)
+        response = await self.async_client.put(reverse("toggle_like", args=[self.post.id]))
+        self.assertEqual(response.json()["likes"], 1)
+
+        url = reverse("edit_post", args=[self.post.id])
+        body = json.dumps({"content": "edited"})
+        response = await self.async_client.put(url, body, content_type="application/json")
+        self.assertEqual(response.status_code, 403)
+
+        await self.async_client.aforce_login(self.bob)
+        response = await self.async_client.put(url, body, content_type="application/json")
+        self.assertEqual(response.json()["new_content"], "edited")
+
+
+
+class FollowGraphTests(NetworkTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.graph = graph.FollowGraph(max_ids=100)
+        self.alice, self.bob, self.carol, self.dave, self.erin = [
+            User.objects.create_user(name, f"{name}@example.com", "pass")
+            for name in ("alice", "bob", "carol", "dave", "erin")
+        ]
+        for follower, following in [
+            (self.alice, self.bob), (self.alice, self.carol), (self.bob, self.alice),
+            (self.bob, self.dave), (self.carol, self.dave), (self.carol, self.erin),
+        ]:
+            Follow.objects.create(follower=follower, following=following)
+
+    def test_lookups_are_served_from_memory(self):
+        self.graph.following(self.alice.pk)
+        with self.assertNumQueries(0):
+            self.assertTrue(self.graph.is_following(self.alice.pk, self.bob.pk))
+            self.assertFalse(self.graph.is_following(self.alice.pk, self.dave.pk))
+            self.assertEqual(
+                self.graph.following_among(
+                    self.alice.pk, [self.bob.pk, self.carol.pk, self.dave.pk]),
+                {self.bob.pk, self.carol.pk},
+            )
+
+    def test_mutual_follows(self):
+        self.assertTrue(self.graph.is_mutual(self.alice.pk, self.bob.pk))
+        self.assertFalse(self.graph.is_mutual(self.alice.pk, self.carol.pk))
+        self.assertEqual(self.graph.relationship(self.carol.pk, self.alice.pk), (False, True))
+
+    def test_suggestions_rank_friends_of_friends_by_overlap(self):
+        self.assertEqual(
+            self.graph.suggestions(self.alice.pk),
+            [(self.dave.pk, 2), (self.erin.pk, 1)],
+        )
+
+    def test_follow_changes_update_the_cached_list(self):
+        self.graph.following(self.alice.pk)
+        Follow.objects.create(follower=self.alice, following=self.dave)
+        self.graph.follow_changed(self.alice.pk, self.dave.pk, True)
+        with self.assertNumQueries(0):
+            self.assertTrue(self.graph.is_following(self.alice.pk, self.dave.pk))
+
+    def test_changes_from_other_processes_are_picked_up(self):
+        other_process = graph.FollowGraph(max_ids=100)
+        self.assertTrue(self.graph.is_following(self.alice.pk, self.bob.pk))
+        Follow.objects.filter(follower=self.alice, following=self.bob).delete()
+        other_process.follow_changed(self.alice.pk, self.bob.pk, False)
+        self.assertFalse(self.graph.is_following(self.alice.pk, self.bob.pk))
+
+    def test_lists_expire_without_a_shared_cache(self):
+        self.assertTrue(self.graph.is_following(self.alice.pk, self.bob.pk))
+        # A follow made by a process whose version bump this one never sees.
+        Follow.objects.filter(follower=self.alice, following=self.bob).delete()
+        with self.assertNumQueries(0):
+            self.assertTrue(self.graph.is_following(self.alice.pk, self.bob.pk))
+        later = time.monotonic() + settings.NETWORK_GRAPH_MAX_AGE + 1
+        with mock.patch.object(graph.time, "monotonic", return_value=later):
+            self.assertFalse(self.graph.is_following(self.alice.pk, self.bob.pk))
+
+    def test_cache_is_bounded(self):
+        small = graph.FollowGraph(max_ids=6)
+        small.following_many([self.alice.pk, self.bob.pk])
+        small.following(self.carol.pk)
+        self.assertEqual(list(small._lists), [self.bob.pk, self.carol.pk])
+        self.assertLessEqual(small._size, 6)
+
+    def test_profile_shows_whether_the_user_follows_back(self):
+        self.client.force_login(self.alice)
+        response = self.client.get(reverse("profile", args=["bob"]))
+        self.assertTrue(response.context["is_following"])
+        self.assertContains(response, "Follows you")
+        response = self.client.get(reverse("profile", args=["carol"]))
+        self.assertNotContains(response, "Follows you")
+
+    def test_toggle_follow_updates_suggestions(self):
+        self.client.force_login(self.alice)
+        response = self.client.get(reverse("following"))
+        self.assertEqual(
+            [user.username for user in response.context["suggested_users"]],
+            ["dave", "erin"])
+        self.client.post(reverse("toggle_follow", args=["dave"]))
+        response = self.client.get(reverse("following"))
+        self.assertEqual(
+            [user.username for user in response.context["suggested_users"]], ["erin"])
+
+
+class BenchmarkTests(NetworkTestCase):
+
+    def test_seed_network_builds_consistent_data(self):
+        call_command(
+            "seed_network", users=40, posts=200, follows=5, likes=300, stdout=StringIO())
+        users = User.objects.filter(username__startswith=benchmark.SEED_PREFIX)
+        self.assertEqual(users.count(), 40)
+        self.assertEqual(Post.objects.count(), 200)
+        self.assertFalse(Follow.objects.filter(follower=F("following")).exists())
+        self.assertGreater(TimelineEntry.objects.count(), 0)
+
+        # Counters were rebuilt from the generated rows.
+        for user in users:
+            self.assertEqual(user.follower_count, user.followers.count())
+            self.assertEqual(user.post_count, user.posts.count())
+
+        # Followers follow a power law: the top user has far more than average.
+        counts = sorted(users.values_list("follower_count", flat=True), reverse=True)
+        self.assertGreater(counts[0], 3 * sum(counts) / len(counts))
+
+    def test_compare_flags_regressions(self):
+        def report(throughput, p95, queries):
+            return {"views": {"index": {
+                "throughput": throughput, "p95_ms": p95, "queries_per_request": queries}}}
+
+        baseline = report(100, 20, 4)
+        self.assertEqual(benchmark.compare(baseline, report(95, 21, 4)), [])
+        self.assertEqual(len(benchmark.compare(baseline, report(80, 30, 5))), 3)
+
+    def test_bench_compare_fails_on_regression(self):
+        baseline = {"views": {"index": {
+            "throughput": 100, "p95_ms": 20, "queries_per_request": 4}}}
+        current = {"views": {"index": {
+            "throughput": 100, "p95_ms": 20, "queries_per_request": 6}}}
+        paths = []
+        for data in (baseline, current):
+            with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as file:
+                json.dump(data, file)
+            paths.append(file.name)
+            self.addCleanup(os.remove, file.name)
+
+        call_command("bench_compare", paths[0], paths[0], stdout=StringIO())
+        with self.assertRaisesMessage(CommandError, "queries per request 4 -> 6"):
+            call_command("bench_compare", *paths, stdout=StringIO())
+
+
+class DatasetTests(NetworkTestCase):
+
+    def setUp(self):
+        super().setUp()
+        alice = User.objects.create_user("alice", "alice@example.com", "pass")
+        bob = User.objects.create_user("bob", "bob@example.com", "pass")
+        Follow.objects.create(follower=bob, following=alice)
+        for i in range(5):
+            post = Post.objects.create(author=alice, content=f"post {i}")
+            if i % 2:
+                post.likes.add(bob)
+        Post.objects.create(author=bob, content="hello")
+
+    def export(self):
+        out = StringIO()
+        counts = dataset.export(out, chunk_size=2)
+        return out.getvalue().splitlines(), counts
+
+    def snapshot(self):
+        return sorted(
+            (post.author.username, post.content, post.timestamp,
+             sorted(user.username for user in post.likes.all()))
+            for post in Post.objects.all()
+        )
+
+    def test_round_trip_remaps_ids(self):
+        lines, counts = self.export()
+        self.assertEqual(counts, {"user": 2, "follow": 1, "post": 6, "like": 2})
+        before = self.snapshot()
+        Post.objects.all().delete()
+        Follow.objects.all().delete()
+        User.objects.create_user("carol")  # Shifts the ids new rows get.
+        User.objects.filter(username="bob").delete()
+
+        counts = dataset.Importer("dump", batch_size=2).run(lines)
+        self.assertEqual(counts, {"user": 2, "follow": 1, "post": 6, "like": 2})
+        self.assertEqual(self.snapshot(), before)
+        self.assertTrue(Follow.objects.filter(
+            follower__username="bob", following__username="alice").exists())
+
+    def test_import_resumes_after_last_batch(self):
+        lines, _ = self.export()
+        Post.objects.all().delete()
+
+        def fail_third_batch(original, calls=[]):
+            def import_posts(self, rows):
+                calls.append(rows)
+                if len(calls) == 3:
+                    raise DatabaseError("interrupted")
+                return original(self, rows)
+            return import_posts
+
+        patched = fail_third_batch(dataset.Importer.import_posts)
+        with mock.patch.object(dataset.Importer, "import_posts", patched):
+            with self.assertRaises(DatabaseError):
+                dataset.Importer("dump", batch_size=2).run(lines)
+        self.assertEqual(Post.objects.count(), 4)
+
+        counts = dataset.Importer("dump", batch_size=2).run(lines)
+        self.assertEqual(counts["post"], 2)
+        self.assertEqual(Post.objects.count(), 6)
+        self.assertEqual(ImportProgress.objects.get(source="dump").line, len(lines))
+
+    def test_commands_round_trip_gzip(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(os.rmdir, directory)
+        path = os.path.join(directory, "network.ndjson.gz")
+        self.addCleanup(os.remove, path)
+        call_command("export_network", path, stderr=StringIO())
+        Post.objects.all().delete()
+
+        out = StringIO()
+        call_command("import_network", path, stdout=out)
+        self.assertIn("6 posts, 2 likes", out.getvalue())
+        alice = User.objects.get(username="alice")
+        self.assertEqual(alice.post_count, 5)
+        self.assertEqual(
+            TimelineEntry.objects.filter(owner__username="bob").count(), 5)
+
+
+class SessionTests(NetworkTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.alice = User.objects.create_user("alice", "alice@example.com", "pass")
+        Post.objects.create(author=self.alice, content="hello")
+
+    def session_queries(self, url):
+        with CaptureQueriesContext(connection) as captured:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        return [query["sql"] for query in captured if "django_session" in query["sql"]]
+
+    @override_settings(SESSION_ENGINE="django.contrib.sessions.backends.db")
+    def test_anonymous_feeds_never_touch_sessions(self):
+        for name in ("index", "api_posts", "login"):
+            self.assertEqual(self.session_queries(reverse(name)), [])
+        self.assertNotIn(settings.SESSION_COOKIE_NAME, self.client.cookies)
+
+    def test_cached_db_reads_sessions_from_cache(self):
+        self.client.force_login(self.alice)
+        self.assertEqual(self.session_queries(reverse("index")), [])
+        self.assertEqual(self.session_queries(reverse("following")), [])
+
+    @override_settings(SESSION_ENGINE="django.contrib.sessions.backends.signed_cookies")
+    def test_signed_cookie_sessions(self):
+        response = self.client.post(reverse("login"), {"username": "alice", "password": "pass"})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.session_queries(reverse("following")), [])
+        self.client.get(reverse("logout"))
+        self.assertEqual(self.client.get(reverse("following")).status_code, 302)
+
+    def test_default_engine_follows_the_cache(self):
+        path = os.path.join(settings.BASE_DIR, "project4", "settings.py")
+        for backend, engine in (("locmem", "db"), ("redis", "cached_db")):
+            env = {"NETWORK_CACHE": backend, "NETWORK_CACHE_LOCATION": "redis://cache:6379"}
+            with mock.patch.dict(os.environ, env):
+                os.environ.pop("NETWORK_SESSION_ENGINE", None)
+                configured = runpy.run_path(path)
+            self.assertEqual(
+                configured["SESSION_ENGINE"], f"django.contrib.sessions.backends.{engine}")
+
+    def test_bench_sessions_reports_session_queries(self):
+        call_command("seed_network", users=10, posts=30, follows=3, likes=20, stdout=StringIO())
+        out = StringIO()
+        # The test runner has already set up the test environment.
+        with mock.patch(
+                "network.management.commands.bench_sessions.test_environment", nullcontext):
+            call_command("bench_sessions", requests=3, stdout=out)
+        engines = json.loads(out.getvalue())["engines"]
+        self.assertEqual(engines["db"]["logged_in:following"]["session_queries_per_request"], 1)
+        for engine in ("cached_db", "signed_cookies"):
+            for result in engines[engine].values():
+                self.assertEqual(result["session_queries_per_request"], 0)
+        self.assertEqual(engines["db"]["anonymous:index"]["session_queries_per_request"], 0)
+
+
+class StaticAssetTests(NetworkTestCase):
+
+    def collect(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        storages = {**settings.STORAGES, "staticfiles": {"BACKEND": "network.assets.StaticStorage"}}
+        overrides = override_settings(
+            STATIC_ROOT=root, STORAGES=storages, NETWORK_STATIC_PIPELINE=True)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        call_command("collectstatic", interactive=False, verbosity=0)
+        return root
+
+    def test_collectstatic_bundles_and_compresses(self):
+        root = self.collect()
+        bundle = staticfiles_storage.stored_name("network/bundle.js")
+        self.assertRegex(bundle, r"^network/bundle\.[0-9a-f]{12}\.js$")
+        with open(os.path.join(root, bundle)) as file:
+            content = file.read()
+        self.assertEqual(content.count("function getCookie"), 1)
+        self.assertIn("window.toggleLike", content)
+        with open(os.path.join(root, bundle + ".gz"), "rb") as file:
+            self.assertEqual(gzip.decompress(file.read()).decode(), content)
+
+        response = self.client.get(reverse("login"))
+        self.assertContains(response, f'<script src="/static/{bundle}"></script>', html=True)
+        self.assertNotContains(response, "network/network.js")
+
+    def test_middleware_serves_immutable_precompressed_files(self):
+        self.collect()
+        bundle = staticfiles_storage.stored_name("network/bundle.js")
+        middleware = assets.StaticFilesMiddleware(lambda request: HttpResponse(status=404))
+        factory = RequestFactory()
+
+        response = middleware(factory.get(f"/static/{bundle}", HTTP_ACCEPT_ENCODING="gzip, br;q=0"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Cache-Control"], assets.IMMUTABLE)
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(response["Vary"], "Accept-Encoding")
+
+        response = middleware(factory.get("/static/network/bundle.js"))
+        self.assertEqual(response["Cache-Control"], assets.REVALIDATE)
+        self.assertFalse(response.has_header("Content-Encoding"))
+        response = middleware(factory.get(
+            "/static/network/bundle.js", HTTP_IF_MODIFIED_SINCE=response["Last-Modified"]))
+        self.assertEqual(response.status_code, 304)
+
+        self.assertEqual(middleware(factory.get("/static/missing.js")).status_code, 404)
+        self.assertEqual(middleware(factory.get("/static/../settings.py")).status_code, 404)
+
+    def test_sources_are_included_without_the_pipeline(self):
+        response = self.client.get(reverse("login"))
+        for source in settings.NETWORK_STATIC_BUNDLES["network/bundle.js"]:
+            self.assertContains(response, f'<script src="/static/{source}"></script>', html=True)
+
+    def test_fallback_minifiers(self):
+        with mock.patch.object(assets, "rjsmin", None), mock.patch.object(assets, "rcssmin", None):
+            self.assertEqual(
+                assets.minify_js("// note\n/* a\n b */\n  const a = 1;\n\n  f(a)\n"),
+                "const a = 1;\nf(a)")
+            self.assertEqual(
+                assets.minify_css("/* x */ .card ,\n .body {\n  padding: 1rem;\n}\n"),
+                ".card,.body{padding: 1rem}")
+
+
+class PostCardTests(NetworkTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.alice = User.objects.create_user("alice", "alice@example.com", "pass")
+        self.client.force_login(self.alice)
+
+    def test_content_html_is_stored_on_save_and_edit(self):
+        post = Post.objects.create(author=self.alice, content="<b>hi</b>\nthere")
+        self.assertEqual(post.content_html, "&lt;b&gt;hi&lt;/b&gt;<br>there")
+
+        response = self.client.put(
+            reverse("edit_post", args=[post.id]),
+            json.dumps({"content": "one\ntwo"}), content_type="application/json")
+        self.assertEqual(response.status_code, 200)
+        post.refresh_from_db()
+        self.assertEqual(post.content_html, "one<br>two")
+
+        post.content = "three"
+        post.save(update_fields=["content"])
+        post.refresh_from_db()
+        self.assertEqual(post.content_html, "three")
+
+        [bulk] = Post.objects.bulk_create([Post(author=self.alice, content="a\nb")])
+        self.assertEqual(Post.objects.get(pk=bulk.pk).content_html, "a<br>b")
+
+    def test_feeds_share_the_post_card(self):
+        post = Post.objects.create(author=self.alice, content="line one\nline two")
+        Follow.objects.create(follower=self.alice, following=self.alice)
+        timeline.rebuild(self.alice)
+        card = f'<p class="card-text" id="post-content-{post.id}">line one<br>line two</p>'
+        for url in (reverse("index"), reverse("following"),
+                    reverse("profile", args=["alice"]), reverse("search") + "?q=line"):
+            response = self.client.get(url)
+            self.assertContains(response, card, html=True)
+            self.assertContains(response, f'id="like-btn-{post.id}"')
+        # Only the profile page leaves out the author.
+        self.assertNotContains(
+            self.client.get(reverse("profile", args=["alice"])), 'href="/profile/alice"')
+        self.assertContains(self.client.get(reverse("index")), 'href="/profile/alice"')
+
+    def test_profile_urls_are_memoized(self):
+        from .templatetags.posts import profile_url
+
+        profile_url.cache_clear()
+        with mock.patch("network.templatetags.posts.reverse", return_value="/profile/x") as rev:
+            self.assertEqual(profile_url("x"), "/profile/x")
+            self.assertEqual(profile_url("x"), "/profile/x")
+        self.assertEqual(rev.call_count, 1)
+        profile_url.cache_clear()
+
+    def test_bench_templates_reports_each_page_size(self):
+        call_command("seed_network", users=10, posts=60, follows=3, likes=20, stdout=StringIO())
+        out = StringIO()
+        call_command("bench_templates", sizes="10,50", repeat=2, stdout=out)
+        pages = json.loads(out.getvalue())["pages"]
+        self.assertEqual(set(pages), {"10", "50"})
+        self.assertEqual(set(pages["50"]), {"cold", "warm"})
+
+
+class ThrottleTests(NetworkTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.alice = User.objects.create_user("alice", "alice@example.com", "pass")
+        self.post = Post.objects.create(author=self.alice, content="hello")
+        self.client.force_login(self.alice)
+        self.like_url = reverse("toggle_like", args=[self.post.id])
+
+    @override_settings(NETWORK_THROTTLE_RATES={"toggle_like": {"user": "3/m"}})
+    def test_over_limit_requests_get_a_429_without_queries(self):
+        for _ in range(3):
+            self.assertEqual(self.client.put(self.like_url).status_code, 200)
+        with self.assertNumQueries(0):
+            response = self.client.put(self.like_url)
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response["Retry-After"], "20")
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 1)
+
+    @override_settings(NETWORK_THROTTLE_RATES={"toggle_like": {"user": "1/m"}})
+    def test_cache_churn_does_not_reset_buckets(self):
+        self.assertEqual(self.client.put(self.like_url).status_code, 200)
+        for i in range(1000):
+            cache.set(f"churn:{i}", i)
+        self.assertEqual(self.client.put(self.like_url).status_code, 429)
+
+    @override_settings(NETWORK_THROTTLE_RATES={"new_post": {"user": "10/m", "ip": "2/m"}})
+    def test_ip_limit_spans_users(self):
+        bob = User.objects.create_user("bob", "bob@example.com", "pass")
+        self.client.post(reverse("new_post"), {"content": "one"})
+        self.client.force_login(bob)
+        self.assertEqual(self.client.post(reverse("new_post"), {"content": "two"}).status_code, 302)
+        self.assertEqual(self.client.post(reverse("new_post"), {"content": "three"}).status_code, 429)
+        # Another address has its own bucket.
+        response = self.client.post(
+            reverse("new_post"), {"content": "four"}, REMOTE_ADDR="10.0.0.2")
+        self.assertEqual(response.status_code, 302)
+
+    def test_buckets_refill_over_time(self):
+        rate = throttling.Rate.parse("2/s")
+        self.assertEqual(rate, (2, 1))
+        allowed, state, _ = throttling.take(None, rate, 100.0)
+        allowed, state, _ = throttling.take(state, rate, 100.0)
+        allowed, state, retry_after = throttling.take(state, rate, 100.0)
+        self.assertFalse(allowed)
+        self.assertEqual(retry_after, 0.5)
+        allowed, state, _ = throttling.take(state, rate, 100.5)
+        self.assertTrue(allowed)
+
+    @override_settings(NETWORK_THROTTLE_RATES={"toggle_like": {"user": "1/m"}})
+    def test_falls_back_to_local_buckets(self):
+        throttling.local_buckets.clear()
+        self.addCleanup(throttling.local_buckets.clear)
+        broken = mock.patch.object(
+            throttling.CacheBuckets, "take", side_effect=ConnectionError("cache down"))
+        with broken, self.assertLogs("network.throttling", "WARNING"):
+            self.assertEqual(self.client.put(self.like_url).status_code, 200)
+            self.assertEqual(self.client.put(self.like_url).status_code, 429)
+
+    def test_local_buckets_expire_and_stay_bounded(self):
+        buckets = throttling.LocalBuckets(max_keys=2)
+        rate = throttling.Rate.parse("1/s")
+        buckets.take("a", rate, 0)
+        buckets.take("b", rate, 0)
+        buckets.take("c", rate, 0.5)
+        self.assertEqual(list(buckets._buckets), ["b", "c"])
+        buckets.take("d", rate, 1.2)  # "b" refilled at 1.0, "c" is still draining
+        self.assertEqual(list(buckets._buckets), ["c", "d"])
+
+    @override_settings(
+        ROOT_URLCONF="network.async_urls",
+        NETWORK_THROTTLE_RATES={"toggle_like": {"user": "1/m"}})
+    async def test_async_views_are_throttled(self):
+        await self.async_client.aforce_login(self.alice)
+        self.assertEqual((await self.async_client.put(self.like_url)).status_code, 200)
+        self.assertEqual((await self.async_client.put(self.like_url)).status_code, 429)
+
+
+class TaskTests(NetworkTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.alice = User.objects.create_user("alice", "alice@example.com", "pass")
+        self.bob = User.objects.create_user("bob", "bob@example.com", "pass")
+        Follow.objects.create(follower=self.bob, following=self.alice)
+        self.client.force_login(self.alice)
+
+    @override_settings(NETWORK_TASK_BACKEND="database")
+    def test_new_post_defers_fan_out_to_workers(self):
+        self.client.post(reverse("new_post"), {"content": "hello"})
+        post = Post.objects.get()
+        task = Task.objects.get()
+        self.assertEqual((task.name, task.args, task.key),
+                         ("deliver_post", [post.id], f"deliver_post:{post.id}"))
+        self.assertFalse(TimelineEntry.objects.exists())
+
+        call_command("run_tasks", once=True, stdout=StringIO())
+        self.assertTrue(TimelineEntry.objects.filter(owner=self.bob, post=post).exists())
+        self.alice.refresh_from_db()
+        self.assertEqual(self.alice.post_count, 1)
+        self.assertEqual(Task.objects.get().status, Task.DONE)
+
+        # Running it again changes nothing.
+        tasks.deliver_post(post.id)
+        self.alice.refresh_from_db()
+        self.assertEqual(self.alice.post_count, 1)
+        self.assertEqual(TimelineEntry.objects.count(), 1)
+
+    @override_settings(NETWORK_TASK_BACKEND="database")
+    def test_idempotency_keys(self):
+        self.assertIsNotNone(tasks.enqueue("deliver_post", 1, key="k"))
+        self.assertIsNone(tasks.enqueue("deliver_post", 1, key="k"))
+        self.assertEqual(Task.objects.count(), 1)
+
+    @override_settings(
+        NETWORK_TASK_BACKEND="database", NETWORK_TASK_MAX_ATTEMPTS=2, NETWORK_TASK_RETRY_DELAY=0)
+    def test_failures_are_retried_then_given_up(self):
+        calls = []
+
+        def flaky(value):
+            calls.append(value)
+            raise RuntimeError("boom")
+
+        with mock.patch.dict(tasks.registry, {"flaky": flaky}):
+            task = tasks.enqueue("flaky", 7)
+            with self.assertLogs("network.tasks", "ERROR"):
+                self.assertEqual(tasks.run_due(), 1)
+                task.refresh_from_db()
+                self.assertEqual((task.status, task.attempts), (Task.PENDING, 1))
+                self.assertEqual(tasks.run_due(), 1)
+            task.refresh_from_db()
+            self.assertEqual((task.status, task.attempts), (Task.FAILED, 2))
+            self.assertIn("RuntimeError: boom", task.last_error)
+            self.assertEqual(tasks.run_due(), 0)
+        self.assertEqual(calls, [7, 7])
+
+    @override_settings(NETWORK_TASK_BACKEND="database")
+    def test_tasks_are_claimed_once_and_expired_leases_reclaimed(self):
+        task = tasks.enqueue("deliver_post", 1)
+        self.assertTrue(tasks.claim(task.pk))
+        self.assertFalse(tasks.claim(task.pk))
+        Task.objects.filter(pk=task.pk).update(
+            locked_until=timezone.now() - timedelta(seconds=1))
+        self.assertTrue(tasks.claim(task.pk))
+
+    @override_settings(NETWORK_TASK_BACKEND="local")
+    def test_local_backend_runs_after_commit(self):
+        with mock.patch.object(tasks, "get_executor") as get_executor:
+            with self.captureOnCommitCallbacks(execute=True):
+                with transaction.atomic():
+                    task = tasks.enqueue("deliver_post", 1)
+                    get_executor.assert_not_called()
+        get_executor.return_value.submit.assert_called_once_with(tasks._run_in_thread, task.pk)
+
+    @override_settings(NETWORK_TASK_BACKEND="local", NETWORK_TASK_RETRY_DELAY=3)
+    def test_local_backend_schedules_delays_and_retries(self):
+        def failing(value):
+            raise RuntimeError("boom")
+
+        with mock.patch.dict(tasks.registry, {"failing": failing}), \
+                mock.patch.object(tasks, "schedule") as schedule:
+            with self.captureOnCommitCallbacks(execute=True):
+                task = tasks.enqueue("failing", 7, delay=5)
+            schedule.assert_called_once_with(task.pk, 5)
+            Task.objects.filter(pk=task.pk).update(run_after=timezone.now())
+            with self.assertLogs("network.tasks", "ERROR"):
+                self.assertTrue(tasks.run(task.pk))
+            schedule.assert_called_with(task.pk, 3)
+
+        with mock.patch.object(tasks, "get_executor") as get_executor:
+            tasks.schedule(task.pk, 0.01)
+            submit = get_executor.return_value.submit
+            for _ in range(100):
+                if submit.called:
+                    break
+                time.sleep(0.01)
+            submit.assert_called_once_with(tasks._run_in_thread, task.pk)
+
+
+class TrendingTests(NetworkTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.users = [
+            User.objects.create_user(f"user{i}", f"user{i}@example.com", "pass") for i in range(21)
+        ]
+        now = timezone.now()
+        decay = timedelta(seconds=settings.NETWORK_TRENDING_DECAY)
+        self.old = Post.objects.create(author=self.users[0], content="old", timestamp=now - decay)
+        self.new = Post.objects.create(author=self.users[0], content="new", timestamp=now)
+
+    def like(self, post, count):
+        for user in self.users[:count]:
+            likes.write_like(post.id, user.id)
+
+    def assertScoresExact(self):
+        for post in Post.objects.all():
+            self.assertAlmostEqual(post.trending_score, trending_score(post.like_count, post.timestamp))
+
+    def test_like_writes_keep_scores_exact(self):
+        self.like(self.old, 5)
+        likes.write_like(self.old.id, self.users[0].id)  # unlike
+        buffer = likes.LikeBuffer(max_events=100, max_delay=60)
+        buffer.toggle(self.new.id, self.users[0].id)
+        buffer.toggle(self.new.id, self.users[1].id)
+        buffer.flush()
+        self.assertScoresExact()
+
+    def test_ten_times_the_likes_per_decay_period(self):
+        self.like(self.new, 2)
+        self.like(self.old, 19)
+        self.assertEqual(list(trending.top_posts(self.users[0])), [self.new, self.old])
+        likes.write_like(self.old.id, self.users[19].id)
+        likes.write_like(self.old.id, self.users[20].id)
+        self.assertEqual(list(trending.top_posts(self.users[0])), [self.old, self.new])
+
+    def test_top_posts_is_one_bounded_read(self):
+        with CaptureQueriesContext(connection) as captured:
+            posts = trending.top_posts(AnonymousUser(), limit=1)
+        self.assertEqual(posts, [self.new])
+        self.assertEqual(len(captured), 1)
+        self.assertIn("LIMIT 1", captured[0]["sql"])
+
+    def test_rebuild_and_counter_repair_rescore(self):
+        self.like(self.old, 3)
+        Post.objects.update(trending_score=0)
+        self.assertEqual(trending.rebuild(batch_size=1), 2)
+        self.assertScoresExact()
+
+        likes.Like.objects.filter(post=self.old).delete()
+        call_command("rebuild_counters", stdout=StringIO())
+        self.assertScoresExact()
+
+    def test_edit_keeps_score(self):
+        self.client.force_login(self.users[0])
+        stale = Post.objects.get(pk=self.old.pk)
+        self.like(self.old, 2)
+        stale.content = "edited"
+        stale.save(update_fields=["content"])
+        self.client.put(reverse("edit_post", args=[self.old.id]), json.dumps({"content": "again"}))
+        self.assertScoresExact()
+
+    def test_trending_page_and_api(self):
+        self.like(self.old, 2)
+        self.client.force_login(self.users[0])
+        response = self.client.get(reverse("trending"))
+        self.assertContains(response, "old")
+        data = self.client.get(reverse("api_trending")).json()
+        self.assertEqual([post["id"] for post in data["posts"]], [self.new.id, self.old.id])
+        self.assertEqual(data["posts"][1]["liked"], True)
+
+
+@override_settings(NETWORK_READ_REPLICAS=["replica0"])
+class RoutingTests(NetworkTestCase):
+    """
+    "replica0" is a separate SQLite file, migrated but not replicated to,
+    so each test can give it different data from the primary and see which
+    one a request read. The test runner only knows the configured databases,
+    so the alias is added, and allowed, here.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.replica_dir = tempfile.mkdtemp()
+        connections.settings["replica0"] = connections.configure_settings({
+            "default": {},
+            "replica0": {
+                "ENGINE": "django.db.backends.sqlite3",
+                "NAME": os.path.join(cls.replica_dir, "replica.sqlite3"),
+            },
+        })["replica0"]
+        call_command("migrate", database="replica0", verbosity=0)
+        cls.databases = {"default", "replica0"}
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections["replica0"].close()
+        del connections["replica0"]
+        del connections.settings["replica0"]
+        shutil.rmtree(cls.replica_dir)
+
+    def setUp(self):
+        super().setUp()
+        self.alice = User.objects.create_user("alice", "alice@example.com", "pass")
+        self.bob = User.objects.create_user("bob", "bob@example.com", "pass")
+        self.post = Post.objects.create(author=self.bob, content="hello")
+        # The replica lags: it has the users but an older version of the post.
+        for user in (self.alice, self.bob):
+            User.objects.using("replica0").create(pk=user.pk, username=user.username)
+        Post.objects.using("replica0").create(
+            pk=self.post.pk, author_id=self.bob.pk, content="hello (stale)",
+            timestamp=self.post.timestamp)
+
+    def serve(self, view, cookies=None, user=None):
+        """
+        Run `view` through ReplicaMiddleware, returning the response and
+        where the view's reads went before and after it wrote.
+        """
+        seen = []
+
+        def recording_view(request):
+            seen.append(router.db_for_read(Post))
+            view(request)
+            seen.append(router.db_for_read(Post))
+            return HttpResponse()
+
+        recording_view.replica_reads = getattr(view, "replica_reads", False)
+        middleware = routing.ReplicaMiddleware(
+            lambda request: middleware.process_view(request, recording_view, (), {})
+            or recording_view(request))
+        request = RequestFactory().get("/")
+        request.COOKIES.update(cookies or {})
+        if user is not None:
+            request.user = user
+        return middleware(request), seen
+
+    def test_marked_views_read_from_replica(self):
+        response, seen = self.serve(routing.replica_reads(lambda request: None))
+        self.assertEqual(seen, ["replica0", "replica0"])
+        self.assertNotIn(routing.PIN_COOKIE, response.cookies)
+
+        _, seen = self.serve(lambda request: None)
+        self.assertEqual(seen, ["default", "default"])
+        self.assertEqual(router.db_for_read(Post), "default")
+
+    def test_write_reads_own_writes_and_pins_client(self):
+        def like(request):
+            likes.write_like(self.post.id, self.alice.id)
+
+        response, seen = self.serve(routing.replica_reads(like))
+        self.assertEqual(seen, ["replica0", "default"])
+        cookie = response.cookies[routing.PIN_COOKIE]
+        self.assertEqual(cookie["max-age"], settings.NETWORK_REPLICA_PIN_SECONDS)
+
+        _, seen = self.serve(routing.replica_reads(lambda request: None),
+                             {routing.PIN_COOKIE: cookie.value})
+        self.assertEqual(seen, ["default", "default"])
+        _, seen = self.serve(routing.replica_reads(lambda request: None),
+                             {routing.PIN_COOKIE: "0"})
+        self.assertEqual(seen, ["replica0", "replica0"])
+
+    def test_session_user_and_graph_load_from_primary(self):
+        loaded_from = []
+
+        def load_user():
+            loaded_from.append(router.db_for_read(User))
+            return self.alice
+
+        def view(request):
+            self.assertEqual(request.user, self.alice)
+            # The follow is only on the primary.
+            self.assertEqual(graph.FollowGraph(max_ids=100).following_many([self.alice.pk]),
+                             {self.alice.pk: array("q", [self.bob.pk])})
+
+        Follow.objects.create(follower=self.alice, following=self.bob)
+
+        _, seen = self.serve(routing.replica_reads(view), user=SimpleLazyObject(load_user))
+        self.assertEqual(loaded_from, ["default"])
+        self.assertEqual(seen, ["replica0", "replica0"])
+
+    def test_writes_go_to_primary(self):
+        self.post._state.db = "replica0"
+        self.assertEqual(router.db_for_write(Post, instance=self.post), "default")
+        self.assertFalse(router.allow_migrate("replica0", "network"))
+
+    def test_requests_read_the_replica_until_the_client_writes(self):
+        self.client.force_login(self.alice)
+
+        def contents():
+            data = self.client.get(reverse("api_posts")).json()
+            return [post["content"] for post in data["posts"]]
+
+        self.assertEqual(contents(), ["hello (stale)"])
+        response = self.client.put(reverse("toggle_like", args=[self.post.id]))
+        self.assertEqual(response.json()["likes"], 1)
+        self.assertIn(routing.PIN_COOKIE, response.cookies)
+        self.assertEqual(contents(), ["hello"])
+
+        self.client.cookies.pop(routing.PIN_COOKIE)
+        self.assertEqual(contents(), ["hello (stale)"])
+
+    @override_settings(NETWORK_READ_REPLICAS=[])
+    def test_user_lookups_are_memoized(self):
+        self.client.force_login(self.alice)
+
+        def username_queries(url):
+            with CaptureQueriesContext(connection) as captured:
+                self.assertEqual(self.client.get(url).status_code, 200)
+            return sum('"username" =' in query["sql"] for query in captured)
+
+        self.assertEqual(username_queries(reverse("profile", args=["alice"])), 0)
+        self.assertEqual(username_queries(reverse("profile", args=["bob"])), 1)
+        self.assertEqual(username_queries(reverse("api_profile_posts", args=["bob"])), 1)
+        self.assertEqual(self.client.get(reverse("api_profile_posts", args=["nobody"])).status_code, 404)
+
+
+class ArchiveTests(NetworkTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.alice = User.objects.create_user("alice", "alice@example.com", "pass")
+        self.bob = User.objects.create_user("bob", "bob@example.com", "pass")
+        Follow.objects.create(follower=self.bob, following=self.alice)
+        now = timezone.now()
+        self.old = [
+            Post.objects.create(author=self.alice, content=f"old {i}", timestamp=now - timedelta(days=400 + i))
+            for i in range(5)
+        ]
+        self.new = [
+            Post.objects.create(author=self.alice, content=f"new {i}", timestamp=now - timedelta(minutes=i))
+            for i in range(12)
+        ]
+        for post in self.old + self.new:
+            timeline.fan_out(post)
+        likes.write_like(self.old[0].id, self.bob.id)
+        self.client.force_login(self.bob)
+
+    def test_compression_round_trip(self):
+        for content in ["hi", "x" * 500, "héllo\nwörld " * 20]:
+            self.assertEqual(decompress_content(compress_content(content)), content)
+        self.assertLess(len(compress_content("x" * 500)), 50)
+
+    def test_archive_moves_old_posts(self):
+        self.assertEqual(archive.archive_posts(365, batch_size=2), 5)
+        self.assertEqual(archive.archive_posts(365), 0)
+        self.assertFalse(Post.objects.filter(pk__in=[post.id for post in self.old]).exists())
+        archived = ArchivedPost.objects.get(pk=self.old[0].id)
+        self.assertEqual((archived.content, archived.like_count, archived.author), ("old 0", 1, self.alice))
+        self.assertFalse(likes.Like.objects.exists())
+        self.assertEqual(TimelineEntry.objects.count(), 12)
+
+        call_command("rebuild_counters", stdout=StringIO())
+        self.alice.refresh_from_db()
+        self.assertEqual(self.alice.post_count, 17)
+
+    def test_profile_pages_continue_into_archive(self):
+        archive.archive_posts(365)
+        url = reverse("api_profile_posts", args=["alice"])
+        with CaptureQueriesContext(connection) as captured:
+            first = self.client.get(url).json()
+        self.assertFalse(any("network_archivedpost" in query["sql"] for query in captured))
+        self.assertEqual([post["content"] for post in first["posts"]], [f"new {i}" for i in range(10)])
+
+        second = self.client.get(url, {"cursor": first["next"]}).json()
+        self.assertEqual([post["content"] for post in second["posts"]],
+                         ["new 10", "new 11"] + [f"old {i}" for i in range(5)])
+        self.assertIsNone(second["next"])
+        self.assertEqual([post["archived"] for post in second["posts"]], [False] * 2 + [True] * 5)
+        self.assertFalse(second["posts"][-1]["editable"])
+
+        back = self.client.get(url, {"cursor": second["previous"]}).json()
+        self.assertEqual(back["posts"], first["posts"])
+
+    def test_hot_feeds_skip_archive(self):
+        archive.archive_posts(365)
+        with CaptureQueriesContext(connection) as captured:
+            self.client.get(reverse("index"))
+            self.client.get(reverse("following"))
+        self.assertFalse(any("network_archivedpost" in query["sql"] for query in captured))
+
+    def test_archived_posts_are_read_only(self):
+        archive.archive_posts(365)
+        post_id = self.old[0].id
+        response = self.client.get(reverse("profile", args=["alice"]), {"page": 2})
+        self.assertContains(response, "old 0")
+        self.assertNotContains(response, f'id="like-btn-{post_id}"')
+        self.assertEqual(self.client.put(reverse("toggle_like", args=[post_id])).status_code, 404)
+
+    def test_export_includes_archived_posts(self):
+        archive.archive_posts(365)
+        out = StringIO()
+        counts = dataset.export(out)
+        self.assertEqual(counts["post"], 17)
+        self.assertIn('"old 0"', out.getvalue())
+
+
+class InstrumentationTests(NetworkTestCase):
+
+    def setUp(self):
+        super().setUp()
+        metrics.reset()
+        self.addCleanup(metrics.reset)
+        self.alice = User.objects.create_user("alice", "alice@example.com", "pass")
+        Post.objects.create(author=self.alice, content="hello")
+
+    def sample(self, name, view):
+        for line in metrics.render().splitlines():
+            if line.startswith(f'{name}{{view="{view}"}} '):
+                return float(line.split()[-1])
+        return None
+
+    def test_requests_are_recorded_per_view(self):
+        self.client.force_login(self.alice)
+        self.client.get(reverse("index"))
+        self.client.get(reverse("index"))
+
+        self.assertEqual(self.sample("network_request_duration_seconds_count", "index"), 2)
+        self.assertEqual(
+            self.sample("network_db_queries_sum", "index"),
+            2 * FeedQueryBudgetTests.INDEX_BUDGET)
+        self.assertGreater(self.sample("network_template_duration_seconds_sum", "index"), 0)
+        self.assertGreater(self.sample("network_response_size_bytes_sum", "index"), 0)
+        self.assertIn('network_requests_total{view="index",status="200"} 2', metrics.render())
+
+    @override_settings(ROOT_URLCONF="network.async_urls")
+    async def test_async_views_record_their_queries(self):
+        await self.async_client.aforce_login(self.alice)
+        await self.async_client.get(reverse("index"))
+        self.assertGreater(self.sample("network_db_queries_sum", "index"), 0)
+
+    @override_settings(NETWORK_METRICS_ALLOWED_IPS=["127.0.0.1"])
+    def test_metrics_endpoint(self):
+        self.client.get(reverse("index"))
+        response = self.client.get(reverse("metrics"))
+        self.assertEqual(response["Content-Type"], "text/plain; version=0.0.4; charset=utf-8")
+        self.assertContains(response, "# TYPE network_request_duration_seconds histogram")
+        self.assertContains(
+            response, 'network_request_duration_seconds_bucket{view="index",le="+Inf"} 1')
+        self.assertEqual(
+            self.client.get(reverse("metrics"), REMOTE_ADDR="203.0.113.9").status_code, 403)
+
+    def test_metrics_endpoint_is_closed_by_default(self):
+        path = os.path.join(settings.BASE_DIR, "project4", "settings.py")
+        with mock.patch.dict(os.environ):
+            os.environ.pop("NETWORK_METRICS_ALLOWED_IPS", None)
+            allowed = runpy.run_path(path)["NETWORK_METRICS_ALLOWED_IPS"]
+        self.assertEqual(allowed, [])
+        with override_settings(NETWORK_METRICS_ALLOWED_IPS=allowed):
+            self.assertEqual(self.client.get(reverse("metrics")).status_code, 403)
+
+    @override_settings(NETWORK_SLOW_REQUEST_SECONDS=0)
+    def test_slow_requests_are_logged_with_their_queries(self):
+        self.client.force_login(self.alice)
+        with self.assertLogs("network.slow_requests", "WARNING") as logs:
+            self.client.get(reverse("profile", args=["alice"]))
+        self.assertIn("GET /profile/alice -> 200", logs.output[0])
+        self.assertIn('SELECT "network_post"', logs.output[0])
+
+
+class LiveEventTests(NetworkTestCase):
+
+    async def test_stream_coalesces_and_filters_events(self):
+        broker = events.LocalBroker()
+        stream = events.stream(1, {2}, {10}, interval=0.05, broker=broker)
+        self.assertEqual(await anext(stream), ": connected\n\n")
+
+        for likes_count in range(1, 6):
+            await asyncio.to_thread(broker.publish, {"type": "likes", "post": 10, "likes": likes_count})
+        broker.publish({"type": "likes", "post": 11, "likes": 7})
+        broker.publish({"type": "post", "id": 100, "author_id": 2})
+        broker.publish({"type": "post", "id": 101, "author_id": 3})
+
+        self.assertEqual(
+            await anext(stream),
+            events.format_event("posts", {"count": 1, "ids": [100]}))
+        self.assertEqual(await anext(stream), events.format_event("likes", {10: 5}))
+        await stream.aclose()
+        self.assertEqual(len(broker._subscriptions), 0)
+
+    async def test_stream_follows_new_follows(self):
+        broker = events.LocalBroker()
+        stream = events.stream(1, set(), set(), interval=0.05, broker=broker)
+        await anext(stream)
+        broker.publish({"type": "follow", "follower": 1, "following": 3, "active": True})
+        broker.publish({"type": "post", "id": 5, "author_id": 3})
+        self.assertEqual(
+            await anext(stream), events.format_event("posts", {"count": 1, "ids": [5]}))
+        await stream.aclose()
+
+    def test_wsgi_stream_tells_client_not_to_reconnect(self):
+        alice = User.objects.create_user("alice", "alice@example.com", "pass")
+        self.client.force_login(alice)
+        self.assertEqual(self.client.get(reverse("events")).status_code, 204)
@@ -0,0 +1,190 @@
+"""
+Rate limiting for the write views.
+
+Each throttled view has a token bucket per user and per client IP, sized
+by NETWORK_THROTTLE_RATES. A bucket holds up to N tokens, refills at N per
+period and every request takes one; a request finding either of its
+buckets empty gets a 429 with Retry-After.
+
+A bucket is stored as a (tokens, updated) pair in the NETWORK_THROTTLE_CACHE
+cache, so it is shared by every process using that cache. It expires once
+it would have refilled completely, because a missing bucket counts as full:
+idle users cost nothing. If the cache fails, buckets are kept in this
+process instead (LocalBuckets), which bounds and expires them the same way.
+Updates are read-modify-write, so concurrent requests for the same key can
+occasionally let an extra request through; that is fine for abuse control.
+
+`throttle` runs before the view and its login check. It reads the user id
+straight from the session, so a rejected request never loads the user or
+touches the posts.
+"""
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from functools import lru_cache, wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.auth import SESSION_KEY
+from django.core.cache import caches
+from django.http import JsonResponse
+
+logger = logging.getLogger(__name__)
+
+KEY = "network:throttle:{}:{}:{}"
+
+PERIODS = {"s": 1, "sec": 1, "m": 60, "min": 60, "h": 3600, "hour": 3600, "d": 86400, "day": 86400}
+
+
+class Rate(namedtuple("Rate", ["capacity", "period"])):
+    """
+    `capacity` requests per `period` seconds, also the largest burst.
+    """
+
+    @classmethod
+    @lru_cache(maxsize=None)
+    def parse(cls, value):
+        """
+        Parse "10/min" style rates; the units are s, m, h and d (or sec,
+        min, hour and day).
+        """
+        count, _, unit = value.partition("/")
+        if unit not in PERIODS:
+            raise ValueError(f"Invalid rate {value!r}")
+        return cls(int(count), PERIODS[unit])
+
+    def refill_time(self, tokens):
+        """
+        Seconds until a bucket holding `tokens` is full again.
+        """
+        return (self.capacity - tokens) * self.period / self.capacity
+
+
+def take(state, rate, now):
+    """
+    Try to take a token from a bucket in `state` ((tokens, updated), or
+    None for a full bucket). Returns (allowed, new_state, retry_after).
+    """
+    if state is None:
+        tokens = rate.capacity
+    else:
+        tokens, updated = state
+        tokens = min(rate.capacity, tokens + (now - updated) * rate.capacity / rate.period)
+    if tokens >= 1:
+        return True, (tokens - 1, now), 0
+    return False, (tokens, now), (1 - tokens) * rate.period / rate.capacity
+
+
+class CacheBuckets:
+    """
+    Buckets kept in a Django cache, each expiring once it is full again.
+    """
+
+    def __init__(self, alias):
+        self.cache = caches[alias]
+
+    def take(self, key, rate, now):
+        allowed, state, retry_after = take(self.cache.get(key), rate, now)
+        self.cache.set(key, state, max(math.ceil(rate.refill_time(state[0])), 1))
+        return allowed, retry_after
+
+
+class LocalBuckets:
+    """
+    In-process buckets, the fallback when the cache is unavailable. Keeps
+    at most `max_keys` buckets in least recently used order, dropping the
+    oldest as well as any at the old end that have refilled completely.
+    """
+
+    def __init__(self, max_keys=100_000):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key, rate, now):
+        with self._lock:
+            while self._buckets:
+                oldest, (state, expires) = next(iter(self._buckets.items()))
+                if expires > now and len(self._buckets) < self.max_keys:
+                    break
+                del self._buckets[oldest]
+            entry = self._buckets.pop(key, None)
+            allowed, state, retry_after = take(entry and entry[0], rate, now)
+            self._buckets[key] = (state, now + rate.refill_time(state[0]))
+        return allowed, retry_after
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+local_buckets = LocalBuckets()
+
+
+def _take(key, rate, now):
+    try:
+        return CacheBuckets(settings.NETWORK_THROTTLE_CACHE).take(key, rate, now)
+    except Exception:
+        logger.warning("Throttle cache unavailable, using in-process buckets", exc_info=True)
+        return local_buckets.take(key, rate, now)
+
+
+def check(request, scope):
+    """
+    Take a token from each of the request's buckets for `scope`, returning
+    the seconds to wait if any was empty, else None.
+    """
+    rates = settings.NETWORK_THROTTLE_RATES.get(scope)
+    if not settings.NETWORK_THROTTLING or not rates:
+        return None
+    identities = {
+        "user": request.session.get(SESSION_KEY),
+        "ip": request.META.get("REMOTE_ADDR"),
+    }
+    now = time.time()
+    wait = 0
+    for kind, rate in rates.items():
+        identity = identities.get(kind)
+        if identity is None:
+            continue
+        allowed, retry_after = _take(KEY.format(scope, kind, identity), Rate.parse(rate), now)
+        if not allowed:
+            wait = max(wait, retry_after)
+    return wait or None
+
+
+def too_many_requests(retry_after):
+    response = JsonResponse({"error": "Too many requests."}, status=429)
+    response["Retry-After"] = max(math.ceil(retry_after), 1)
+    return response
+
+
+def throttle(scope):
+    """
+    Decorator limiting a view with the NETWORK_THROTTLE_RATES of `scope`.
+    Put it above login_required so rejected requests skip the user lookup.
+    Works on both sync and async views.
+    """
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                retry_after = await sync_to_async(check)(request, scope)
+                if retry_after:
+                    return too_many_requests(retry_after)
+                return await view(request, *args, **kwargs)
+
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            retry_after = check(request, scope)
+            if retry_after:
+                return too_many_requests(retry_after)
+            return view(request, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
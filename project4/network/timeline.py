@@ -0,0 +1,187 @@
+"""
+Precomputed Following feeds (fan-out on write).
+
+New posts are copied into a TimelineEntry row for each of the author's
+followers, so reading a Following page is a bounded range scan on the
+(owner, timestamp) index instead of a sort over every followed author's
+posts. Authors with NETWORK_CELEBRITY_FOLLOWERS or more followers are not
+fanned out; their posts are pulled in when the feed is read and merged
+with the precomputed entries. An author who drops back below the
+threshold has their latest posts delivered to all of their followers
+(`backfill_followers`), since those posts would otherwise vanish from
+the feeds that were pulling them in.
+
+`rebuild_many` recomputes timelines wholesale, after an import or to
+repair them, with a few queries per REBUILD_CHUNK users.
+"""
+from collections import defaultdict
+from itertools import islice
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+
+from .models import Post, Follow, TimelineEntry
+from .pagination import merge, seek
+
+ENTRY_KEYS = ("timestamp", "post_id")
+
+REBUILD_CHUNK = 500
+
+REBUILD_BATCH_SIZE = 2000
+
+
+def is_celebrity(user):
+    return user.follower_count >= settings.NETWORK_CELEBRITY_FOLLOWERS
+
+
+def fan_out(post):
+    """
+    Deliver a new post to the timeline of every follower of its author.
+    Returns the number of timelines written to.
+    """
+    if is_celebrity(post.author):
+        return 0
+    follower_ids = Follow.objects.filter(
+        following_id=post.author_id).values_list("follower_id", flat=True)
+    entries = [
+        TimelineEntry(owner_id=follower_id, post=post, timestamp=post.timestamp)
+        for follower_id in follower_ids.iterator()
+    ]
+    TimelineEntry.objects.bulk_create(entries, batch_size=500, ignore_conflicts=True)
+    return len(entries)
+
+
+def backfill(follower, author):
+    """
+    Copy the author's latest posts into the timeline of a new follower.
+    """
+    if is_celebrity(author):
+        return 0
+    posts = (
+        Post.objects.filter(author=author)
+        .order_by("-timestamp", "-id")
+        .values_list("id", "timestamp")[:settings.NETWORK_TIMELINE_BACKFILL]
+    )
+    entries = [
+        TimelineEntry(owner=follower, post_id=post_id, timestamp=timestamp)
+        for post_id, timestamp in posts
+    ]
+    TimelineEntry.objects.bulk_create(entries, ignore_conflicts=True)
+    return len(entries)
+
+
+def backfill_followers(author):
+    """
+    Copy the author's latest posts into the timeline of every follower.
+    Returns the number of timelines written to.
+    """
+    if is_celebrity(author):
+        return 0
+    posts = list(
+        Post.objects.filter(author=author)
+        .order_by("-timestamp", "-id")
+        .values_list("id", "timestamp")[:settings.NETWORK_TIMELINE_BACKFILL]
+    )
+    follower_ids = Follow.objects.filter(
+        following=author).values_list("follower_id", flat=True)
+    followers = 0
+    for follower_id in follower_ids.iterator():
+        TimelineEntry.objects.bulk_create([
+            TimelineEntry(owner_id=follower_id, post_id=post_id, timestamp=timestamp)
+            for post_id, timestamp in posts
+        ], ignore_conflicts=True)
+        followers += 1
+    return followers
+
+
+def prune(follower, author):
+    """
+    Remove the author's posts from the timeline of a former follower.
+    """
+    deleted, _ = TimelineEntry.objects.filter(
+        owner=follower, post__author=author).delete()
+    return deleted
+
+
+def rebuild(user):
+    """
+    Recompute a user's whole timeline from their current follows.
+    """
+    return rebuild_many([user.pk])
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def latest_posts(author_ids):
+    """
+    (author_id, post_id, timestamp) of the NETWORK_TIMELINE_BACKFILL latest
+    posts of each of `author_ids`, in one query.
+    """
+    return (
+        Post.objects.filter(author_id__in=author_ids)
+        .annotate(rank=Window(
+            RowNumber(), partition_by=F("author_id"),
+            order_by=[F("timestamp").desc(), F("id").desc()]))
+        .filter(rank__lte=settings.NETWORK_TIMELINE_BACKFILL)
+        .values_list("author_id", "id", "timestamp")
+    )
+
+
+def rebuild_many(user_ids, batch_size=REBUILD_BATCH_SIZE):
+    """
+    Recompute the timelines of the users in `user_ids` (any iterable), as
+    `backfill` would follow by follow, in one transaction per REBUILD_CHUNK
+    users: their follows and their authors' latest posts are read in bulk
+    and the entries written `batch_size` at a time. Returns the number of
+    entries written.
+    """
+    written = 0
+    for chunk in _chunks(user_ids, REBUILD_CHUNK):
+        with transaction.atomic():
+            TimelineEntry.objects.filter(owner_id__in=chunk).delete()
+            followers = defaultdict(list)
+            follows = Follow.objects.filter(
+                follower_id__in=chunk,
+                following__follower_count__lt=settings.NETWORK_CELEBRITY_FOLLOWERS,
+            ).values_list("following_id", "follower_id")
+            for author_id, follower_id in follows.iterator():
+                followers[author_id].append(follower_id)
+
+            for author_ids in _chunks(followers, REBUILD_CHUNK):
+                entries = (
+                    TimelineEntry(owner_id=follower_id, post_id=post_id, timestamp=timestamp)
+                    for author_id, post_id, timestamp in latest_posts(author_ids).iterator()
+                    for follower_id in followers[author_id]
+                )
+                for batch in _chunks(entries, batch_size):
+                    TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+                    written += len(batch)
+    return written
+
+
+def fetcher(user):
+    """
+    Return the fetch(cursor, limit, offset) callable for `user`'s Following
+    feed, merging precomputed entries with posts from followed celebrities.
+    """
+    entries = TimelineEntry.objects.filter(owner=user).select_related("post__author")
+    celebrity_posts = Post.objects.filter(
+        author__in=Follow.objects.filter(
+            follower=user,
+            following__follower_count__gte=settings.NETWORK_CELEBRITY_FOLLOWERS,
+        ).values("following")
+    ).select_related("author")
+
+    def fetch(cursor, limit, offset=0):
+        window = limit if cursor is not None else offset + limit
+        delivered = [entry.post for entry in seek(entries, cursor, window, keys=ENTRY_KEYS)]
+        pulled = seek(celebrity_posts, cursor, window)
+        return merge(cursor, limit, offset, delivered, pulled)
+
+    return fetch
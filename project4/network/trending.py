@@ -0,0 +1,70 @@
+"""
+The trending feed: the posts with the highest `trending_score`.
+
+A score is log10 of the post's likes plus a bonus for how recently it was
+posted (see models.trending_score), so newer posts outrank older ones with
+fewer than ten times their likes per NETWORK_TRENDING_DECAY. Since the
+bonus is fixed when the post is created, scores never go stale as time
+passes: only a like or unlike changes one, and it is updated in the same
+UPDATE that changes `like_count` (see `rescored`). The top of the feed is
+then the head of the (-trending_score, -id) index, read with one query.
+
+`rebuild` recomputes every score from the stored counts, after changing
+NETWORK_TRENDING_DECAY or to remove drift from the incremental updates.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Greatest, Log
+
+from .caching import attach_cache_versions
+from .feeds import attach_viewer_context
+from .models import Post, trending_score
+
+REBUILD_BATCH_SIZE = 2000
+
+
+def _likes_term(like_count):
+    return Log(10, Greatest(like_count, 1))
+
+
+def rescored(like_count):
+    """
+    An expression for `trending_score` once `like_count` (a value or an
+    expression) replaces the stored count. Put it in the same update() as
+    the new count: both read the row as it was before the update.
+    """
+    return F("trending_score") - _likes_term(F("like_count")) + _likes_term(like_count)
+
+
+def top_posts(viewer, limit=None):
+    """
+    The `limit` (NETWORK_TRENDING_SIZE by default) highest scoring posts,
+    ready for the post card template.
+    """
+    limit = limit or settings.NETWORK_TRENDING_SIZE
+    posts = Post.objects.select_related("author").order_by("-trending_score", "-id")[:limit]
+    posts = attach_viewer_context(posts, viewer)
+    attach_cache_versions(posts)
+    return posts
+
+
+def rebuild(batch_size=REBUILD_BATCH_SIZE):
+    """
+    Recompute every post's score in batches of `batch_size`, returning the
+    number of posts scored.
+    """
+    scored, last_id = 0, 0
+    while True:
+        with transaction.atomic():
+            posts = list(
+                Post.objects.filter(pk__gt=last_id).order_by("pk")
+                .select_for_update().only("pk", "like_count", "timestamp")[:batch_size]
+            )
+            if not posts:
+                return scored
+            for post in posts:
+                post.trending_score = trending_score(post.like_count, post.timestamp)
+            Post.objects.bulk_update(posts, ["trending_score"])
+        scored += len(posts)
+        last_id = posts[-1].pk
@@ -15,5 +15,15 @@ urlpatterns = [
     path("following", views.following, name="following"),
     path("edit_post/<int:post_id>", views.edit_post, name="edit_post"),
     path("toggle_like/<int:post_id>", views.toggle_like, name="toggle_like"),
+    path("api/posts", views.api_posts, name="api_posts"),
+    path("api/posts/<str:username>",
+         views.api_profile_posts, name="api_profile_posts"),
+    path("api/following", views.api_following, name="api_following"),
+    path("trending", views.trending_posts, name="trending"),
+    path("api/trending", views.api_trending, name="api_trending"),
+    path("search", views.search_posts, name="search"),
+    path("api/search", views.api_search, name="api_search"),
+    path("events", views.events_stream, name="events"),
+    path("metrics", views.metrics_view, name="metrics"),
 
 ]
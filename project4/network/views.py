@@ -1,27 +1,29 @@
-from django.core.paginator import Paginator
-
 from django.http import JsonResponse
 import json
+from functools import wraps
+
+from django.db.models import Max
 
+from django.conf import settings
 from django.contrib.auth import authenticate, login, logout
-from django.db import IntegrityError
+from django.db import IntegrityError, transaction
 from django.http import HttpResponse, HttpResponseRedirect, HttpResponseBadRequest
-from django.views.decorators.http import require_http_methods
+from django.views.decorators.http import condition, require_http_methods
 from django.shortcuts import render
 from django.urls import reverse
 from django.contrib.auth.decorators import login_required
-from django.shortcuts import get_object_or_404
 
+from . import archive, caching, events, graph, likes, metrics, routing, search, tasks, throttling, timeline, trending
+from .counters import adjust
+from .feeds import load_feed, load_page, serialize_page, serialize_post
 from .models import User, Post, Follow
 
 
+@routing.replica_reads
+@caching.cache_anonymous_page
 def index(request):
-    posts = Post.objects.all().order_by("-timestamp")
-
     # Paginate posts 10 per page
-    paginator = Paginator(posts, 10)
-    page_number = request.GET.get("page")
-    page_obj = paginator.get_page(page_number)
+    page_obj = load_feed(request, Post.objects.all())
     return render(request, "network/index.html", {
         "page_obj": page_obj
     })
@@ -68,7 +70,6 @@ def register(request):
         # Attempt to create new user
         try:
             user = User.objects.create_user(username, email, password)
-            user.save()
         except IntegrityError:
             return render(request, "network/register.html", {
                 "message": "Username already taken."
@@ -79,6 +80,7 @@ def register(request):
         return render(request, "network/register.html")
 
 
+@throttling.throttle("new_post")
 @login_required
 def new_post(request):
     """
@@ -96,13 +98,19 @@ def new_post(request):
             return render(request, "network/index.html", {
                 "message": "Post cannot be empty."
             })
-        post = Post(author=request.user, content=content)
-        post.save()
+        with transaction.atomic():
+            post = Post(author=request.user, content=content)
+            post.save()
+            # Counters and timeline fan-out run in the background.
+            tasks.enqueue("deliver_post", post.id, key=f"deliver_post:{post.id}")
+        caching.feed_changed()
+        events.post_created(post)
         return HttpResponseRedirect(reverse("index"))
     else:
         return HttpResponseRedirect(reverse("index"))
 
 
+@routing.replica_reads
 @login_required
 def profile(request, username):
     """
@@ -119,35 +127,26 @@ def profile(request, username):
     Returns:
         A rendered HttpResponse containing the profile information.
     """
-    profile_user = get_object_or_404(User, username=username)
-
-    # All posts by this user (newest first)
-    posts = Post.objects.filter(author=profile_user).order_by("-timestamp")
+    profile_user = routing.get_user(request, username)
 
-    # Paginate posts
-    paginator = Paginator(posts, 10)
-    page_number = request.GET.get("page")
-    page_obj = paginator.get_page(page_number)
+    # Paginated posts by this user (newest first)
+    page_obj = load_page(request, archive.profile_fetcher(profile_user))
 
-    # Follower / following counts
-    followers_count = Follow.objects.filter(following=profile_user).count()
-    following_count = Follow.objects.filter(follower=profile_user).count()
-
-    # Check if current user already follows this profile
-    is_following = False
+    # Check whether the current user and this profile follow each other
+    is_following = follows_you = False
     if request.user.is_authenticated and request.user != profile_user:
-        is_following = Follow.objects.filter(
-            follower=request.user, following=profile_user).exists()
+        is_following, follows_you = graph.get_graph().relationship(
+            request.user.pk, profile_user.pk)
 
     return render(request, "network/profile.html", {
         "profile_user": profile_user,
-        "followers_count": followers_count,
-        "following_count": following_count,
         "is_following": is_following,
+        "follows_you": follows_you,
         "page_obj": page_obj,
     })
 
 
+@throttling.throttle("toggle_follow")
 @login_required
 def toggle_follow(request, username):
     """
@@ -160,20 +159,40 @@ def toggle_follow(request, username):
     Returns:
         A rendered HttpResponse containing the profile information.
     """
-    profile_user = get_object_or_404(User, username=username)
+    profile_user = routing.get_user(request, username)
     if request.user == profile_user:
         return HttpResponseRedirect(reverse("profile", args=[username]))
 
-    follow_relation, created = Follow.objects.get_or_create(
-        follower=request.user,
-        following=profile_user
-    )
-    if not created:
-        # Already following -> unfollow
-        follow_relation.delete()
+    with transaction.atomic():
+        follow_relation, created = Follow.objects.get_or_create(
+            follower=request.user,
+            following=profile_user
+        )
+        delta = 1
+        if not created:
+            # Already following -> unfollow. A concurrent unfollow may have
+            # deleted the row first, in which case it adjusted the counters.
+            deleted, _ = follow_relation.delete()
+            timeline.prune(request.user, profile_user)
+            delta = -1 if deleted else 0
+        else:
+            timeline.backfill(request.user, profile_user)
+        if delta:
+            adjust(User.objects.filter(pk=request.user.pk), following_count=delta)
+            adjust(User.objects.filter(pk=profile_user.pk), follower_count=delta)
+        if delta < 0:
+            # Read after our own update, so exactly one unfollow sees the
+            # count cross the threshold.
+            followers = User.objects.values_list("follower_count", flat=True).get(pk=profile_user.pk)
+            if followers == settings.NETWORK_CELEBRITY_FOLLOWERS - 1:
+                tasks.enqueue("deliver_author", profile_user.pk)
+    caching.timeline_changed(request.user.pk)
+    graph.get_graph().follow_changed(request.user.pk, profile_user.pk, created)
+    events.follow_changed(request.user.pk, profile_user.pk, created)
     return HttpResponseRedirect(reverse("profile", args=[username]))
 
 
+@routing.replica_reads
 @login_required
 def following(request):
     # Get all users the current user follows
@@ -181,23 +200,19 @@ def following(request):
     Displays a feed of posts from all users that the current user follows.
 
     Returns:
-        A rendered HttpResponse containing the followed users' posts.
+        A rendered HttpResponse containing the followed users' posts and
+        suggestions of people to follow.
     """
-    followed_users = Follow.objects.filter(follower=request.user).values_list("following", flat=True)
-
-    # Get posts from those users only
-    posts = Post.objects.filter(author__in=followed_users).order_by("-timestamp")
-
-    # Paginate
-    paginator = Paginator(posts, 10)
-    page_number = request.GET.get("page")
-    page_obj = paginator.get_page(page_number)
+    # Paginated posts from the user's precomputed timeline
+    page_obj = load_page(request, timeline.fetcher(request.user))
 
     return render(request, "network/following.html", {
-        "page_obj": page_obj
+        "page_obj": page_obj,
+        "suggested_users": graph.suggested_users(request.user),
     })
 
 
+@throttling.throttle("edit_post")
 @login_required
 @require_http_methods(["PUT"])
 def edit_post(request, post_id):
@@ -222,11 +237,14 @@ def edit_post(request, post_id):
 
     # Save and return new content
     post.content = new_content
-    post.save()
+    # Only the content: a full save would write back a stale like count.
+    post.save(update_fields=["content"])
+    caching.post_changed(post.id)
 
     return JsonResponse({"success": True, "new_content": post.content})
 
 
+@throttling.throttle("toggle_like")
 @login_required
 def toggle_like(request, post_id):
     """
@@ -247,21 +265,150 @@ def toggle_like(request, post_id):
         return JsonResponse({"error": "Invalid request method."}, status=400)
 
     try:
-        post = Post.objects.get(id=post_id)
+        liked, like_count = likes.toggle(post_id, request.user.id)
     except Post.DoesNotExist:
         return JsonResponse({"error": "Post not found."}, status=404)
 
-    user = request.user
-
-    if user in post.likes.all():
-        post.likes.remove(user)
-        liked = False
-    else:
-        post.likes.add(user)
-        liked = True
-
     return JsonResponse({
         "success": True,
         "liked": liked,
-        "likes": post.likes.count()
-    })
\ No newline at end of file
+        "likes": like_count
+    })
+
+
+def _newest(queryset):
+    return queryset.aggregate(newest=Max("timestamp"))["newest"]
+
+
+def api_login_required(view):
+    """
+    login_required for the JSON API: anonymous callers get a 401 JSON
+    error rather than a redirect to the HTML login page.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return JsonResponse({"error": "Authentication required."}, status=401)
+        return view(request, *args, **kwargs)
+    return wrapper
+
+
+@routing.replica_reads
+@require_http_methods(["GET", "HEAD"])
+@condition(
+    etag_func=lambda request: caching.feed_etag(request),
+    last_modified_func=lambda request: _newest(Post.objects.all()),
+)
+def api_posts(request):
+    """
+    JSON version of the global feed, paged with `?cursor=`.
+
+    Responses carry an ETag and Last-Modified, and clients revalidating an
+    unchanged page get a 304 without the page being loaded.
+    """
+    page_obj = load_feed(request, Post.objects.all())
+    return JsonResponse(serialize_page(page_obj, request.user))
+
+
+@routing.replica_reads
+@api_login_required
+@require_http_methods(["GET", "HEAD"])
+@condition(
+    etag_func=lambda request, username: caching.feed_etag(request),
+    last_modified_func=lambda request, username: _newest(
+        Post.objects.filter(author=routing.get_user(request, username))),
+)
+def api_profile_posts(request, username):
+    """
+    JSON version of a user's profile feed, paged with `?cursor=`. Like the
+    profile page, it requires a login.
+    """
+    profile_user = routing.get_user(request, username)
+    page_obj = load_page(request, archive.profile_fetcher(profile_user))
+    return JsonResponse(serialize_page(page_obj, request.user))
+
+
+@routing.replica_reads
+@api_login_required
+@require_http_methods(["GET", "HEAD"])
+@condition(
+    etag_func=lambda request: caching.feed_etag(
+        request, caching.timeline_version(request.user.pk)),
+)
+def api_following(request):
+    """
+    JSON version of the Following feed, paged with `?cursor=`.
+    """
+    page_obj = load_page(request, timeline.fetcher(request.user))
+    return JsonResponse(serialize_page(page_obj, request.user))
+
+
+@routing.replica_reads
+def trending_posts(request):
+    """
+    Displays the NETWORK_TRENDING_SIZE posts with the highest trending score.
+    """
+    return render(request, "network/trending.html", {
+        "posts": trending.top_posts(request.user),
+    })
+
+
+@routing.replica_reads
+@require_http_methods(["GET", "HEAD"])
+def api_trending(request):
+    """
+    JSON version of the trending feed.
+    """
+    return JsonResponse({
+        "posts": [serialize_post(post, request.user) for post in trending.top_posts(request.user)],
+    })
+
+
+@routing.replica_reads
+def search_posts(request):
+    """
+    Displays the posts matching the `q` query string, best match first.
+
+    Returns:
+        A rendered HttpResponse containing one page of search results.
+    """
+    query = request.GET.get("q", "").strip()
+    posts, number, has_next = search.search(request, query)
+    return render(request, "network/search.html", {
+        "query": query,
+        "posts": posts,
+        "page_number": number,
+        "has_next": has_next,
+    })
+
+
+@routing.replica_reads
+@require_http_methods(["GET", "HEAD"])
+def api_search(request):
+    """
+    JSON version of the search results, paged with `?page=`.
+    """
+    query = request.GET.get("q", "").strip()
+    posts, number, has_next = search.search(request, query)
+    return JsonResponse({
+        "posts": [serialize_post(post, request.user) for post in posts],
+        "next": number + 1 if has_next else None,
+    })
+
+
+def events_stream(request):
+    """
+    Live updates need the async stream in async_views, served under ASGI.
+    Under WSGI a 204 tells the browser's EventSource not to reconnect.
+    """
+    return HttpResponse(status=204)
+
+
+def metrics_view(request):
+    """
+    Prometheus scrape endpoint with this process's request metrics, only
+    served to addresses in NETWORK_METRICS_ALLOWED_IPS (nobody by default).
+    """
+    if request.META.get("REMOTE_ADDR") not in settings.NETWORK_METRICS_ALLOWED_IPS:
+        return HttpResponse(status=403)
+    return HttpResponse(metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'project4.settings')
+# Serve the async versions of the feed and interaction views.
+os.environ.setdefault('NETWORK_ASYNC_VIEWS', '1')
 
 application = get_asgi_application()
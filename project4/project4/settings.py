@@ -20,12 +20,16 @@ BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 # See https://docs.djangoproject.com/en/3.0/howto/deployment/checklist/
 
 # SECURITY WARNING: keep the secret key used in production secret!
-SECRET_KEY = '13kl@xtukpwe&xj2xoysxe9_6=tf@f8ewxer5n&ifnd46+6$%8'
+SECRET_KEY = os.environ.get(
+    'NETWORK_SECRET_KEY', '13kl@xtukpwe&xj2xoysxe9_6=tf@f8ewxer5n&ifnd46+6$%8')
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+# DEBUG also keeps a log of every query, which grows without limit.
+DEBUG = os.environ.get('NETWORK_DEBUG', '1') == '1'
 
-ALLOWED_HOSTS = []
+ALLOWED_HOSTS = [
+    host for host in os.environ.get('NETWORK_ALLOWED_HOSTS', '').split(',') if host
+]
 
 
 # Application definition
@@ -41,7 +45,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'network.assets.StaticFilesMiddleware',
+    'network.instrumentation.InstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'network.routing.ReplicaMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -54,7 +61,10 @@ ROOT_URLCONF = 'project4.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # Django's backend, timing renders for the request metrics. Without
+        # explicit 'loaders' it wraps the app loader in the cached loader,
+        # so shared components like post_card.html compile once per process.
+        'BACKEND': 'network.instrumentation.DjangoTemplates',
         'DIRS': [],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -70,19 +80,170 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'project4.wsgi.application'
 
+# Route the feed and interaction URLs to network/async_views.py. Set by
+# project4/asgi.py, there is no benefit under WSGI.
+NETWORK_ASYNC_VIEWS = os.environ.get('NETWORK_ASYNC_VIEWS', '0') == '1'
+
 
 # Database
 # https://docs.djangoproject.com/en/3.0/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+# NETWORK_DATABASE picks the backend: "sqlite" (default) or "postgresql".
+
+NETWORK_DATABASE = os.environ.get('NETWORK_DATABASE', 'sqlite')
+
+# Set NETWORK_SQLITE_TUNING=0 to run SQLite with its defaults.
+NETWORK_SQLITE_TUNING = os.environ.get('NETWORK_SQLITE_TUNING', '1') == '1'
+
+if NETWORK_DATABASE == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('POSTGRES_DB', 'network'),
+            'USER': os.environ.get('POSTGRES_USER', 'network'),
+            'PASSWORD': os.environ.get('POSTGRES_PASSWORD', ''),
+            'HOST': os.environ.get('POSTGRES_HOST', 'localhost'),
+            'PORT': os.environ.get('POSTGRES_PORT', '5432'),
+            # Reuse connections across requests, checking them before use.
+            'CONN_MAX_AGE': int(os.environ.get('NETWORK_CONN_MAX_AGE', '60')),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {},
+        }
     }
-}
+    # A psycopg connection pool (needs psycopg[pool]) replaces persistent
+    # connections, Django does not allow both.
+    if os.environ.get('NETWORK_DB_POOL_SIZE'):
+        DATABASES['default']['CONN_MAX_AGE'] = 0
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': 2,
+            'max_size': int(os.environ['NETWORK_DB_POOL_SIZE']),
+        }
+    # Comma separated hosts of streaming replicas of the primary.
+    for number, host in enumerate(filter(None, os.environ.get('POSTGRES_REPLICA_HOSTS', '').split(','))):
+        DATABASES[f'replica{number}'] = {
+            **DATABASES['default'],
+            'HOST': host.strip(),
+            'TEST': {'MIRROR': 'default'},
+        }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('NETWORK_SQLITE_PATH', os.path.join(BASE_DIR, 'db.sqlite3')),
+            'OPTIONS': {},
+        }
+    }
+    if NETWORK_SQLITE_TUNING:
+        # Take the write lock when a transaction starts, so a writer never
+        # has to upgrade a read lock and fail mid-transaction.
+        DATABASES['default']['OPTIONS']['transaction_mode'] = 'IMMEDIATE'
+    # Comma separated copies of the database kept up to date by an external
+    # tool (e.g. Litestream), standing in for replicas in development.
+    for number, path in enumerate(filter(None, os.environ.get('NETWORK_SQLITE_REPLICA_PATHS', '').split(','))):
+        DATABASES[f'replica{number}'] = {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': path.strip(),
+            'OPTIONS': {},
+            'TEST': {'MIRROR': 'default'},
+        }
+
+# Read replicas (see network/routing.py): every database but the primary.
+# Clients that wrote read from the primary for NETWORK_REPLICA_PIN_SECONDS
+# afterwards, which should exceed the replication lag.
+
+NETWORK_READ_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+
+NETWORK_REPLICA_PIN_SECONDS = int(os.environ.get('NETWORK_REPLICA_PIN_SECONDS', '5'))
+
+DATABASE_ROUTERS = ['network.routing.ReplicaRouter']
+
+# PRAGMAs applied to every new SQLite connection (see network/db.py).
+# busy_timeout is how long (ms) a writer waits for the lock before failing
+# with "database is locked".
+NETWORK_SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'busy_timeout': 20000,
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+} if NETWORK_SQLITE_TUNING else {}
 
 AUTH_USER_MODEL = "network.User"
 
+
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+
+# NETWORK_CACHE picks the backend: "locmem" (default) keeps each process's
+# cache to itself and is only for development and tests; "redis" or
+# "memcached" (needs pymemcache) at NETWORK_CACHE_LOCATION is shared, which
+# production needs: the version bumps that invalidate cached pages, cards
+# and follow lists (see network/caching.py) only reach the processes that
+# share the cache.
+
+NETWORK_CACHE = os.environ.get('NETWORK_CACHE', 'locmem')
+
+NETWORK_SHARED_CACHE = NETWORK_CACHE != 'locmem'
+
+if NETWORK_SHARED_CACHE:
+    _shared_cache = {
+        'BACKEND': {
+            'redis': 'django.core.cache.backends.redis.RedisCache',
+            'memcached': 'django.core.cache.backends.memcached.PyMemcacheCache',
+        }[NETWORK_CACHE],
+        'LOCATION': os.environ['NETWORK_CACHE_LOCATION'],
+    }
+    CACHES = {
+        'default': {**_shared_cache, 'KEY_PREFIX': 'network'},
+        'sessions': {**_shared_cache, 'KEY_PREFIX': 'network-sessions'},
+        'throttle': {**_shared_cache, 'KEY_PREFIX': 'network-throttle'},
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'network',
+        },
+        'sessions': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'network-sessions',
+        },
+        # Kept apart from the page and fragment churn of the default cache:
+        # culling a bucket would reset its limit.
+        'throttle': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'network-throttle',
+            'OPTIONS': {'MAX_ENTRIES': 100000},
+        },
+    }
+
+# Seconds an anonymous feed page stays cached. Writes invalidate it sooner
+# by bumping its version (see network/caching.py).
+NETWORK_PAGE_CACHE_TIMEOUT = 60
+
+
+# Sessions
+# https://docs.djangoproject.com/en/5.1/topics/http/sessions/#configuring-the-session-engine
+
+# NETWORK_SESSION_ENGINE picks where sessions live:
+# * "cached_db" reads sessions from the "sessions" cache and only goes to
+#   the database on a miss, writes go to both;
+# * "signed_cookies" keeps the session in the cookie itself, with no server
+#   side I/O at all, but a logout cannot revoke a copied cookie;
+# * "db" is Django's default, one query per logged-in request;
+# * "cache" keeps sessions in the cache only, they are lost on eviction.
+# The default is "cached_db" with a shared NETWORK_CACHE and "db" without
+# one: a logout only evicts the session from the caches it can reach, so
+# with per-process caches other processes would keep accepting it.
+# Requests without a session cookie, as from most anonymous visitors, never
+# touch the session store whatever the engine (see SessionTests).
+
+NETWORK_SESSION_ENGINE = os.environ.get(
+    'NETWORK_SESSION_ENGINE', 'cached_db' if NETWORK_SHARED_CACHE else 'db')
+
+SESSION_ENGINE = f'django.contrib.sessions.backends.{NETWORK_SESSION_ENGINE}'
+
+SESSION_CACHE_ALIAS = 'sessions'
+
 # Password validation
 # https://docs.djangoproject.com/en/3.0/ref/settings/#auth-password-validators
 
@@ -120,3 +281,179 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/3.0/howto/static-files/
 
 STATIC_URL = '/static/'
+
+STATIC_ROOT = os.environ.get('NETWORK_STATIC_ROOT', os.path.join(BASE_DIR, 'staticfiles'))
+
+# With the pipeline on (the default without DEBUG), collectstatic bundles,
+# minifies, fingerprints and precompresses the assets, and the app serves
+# STATIC_ROOT itself with far-future cache headers (see network/assets.py).
+# Run collectstatic before starting the server.
+NETWORK_STATIC_PIPELINE = os.environ.get(
+    'NETWORK_STATIC_PIPELINE', '0' if DEBUG else '1') == '1'
+
+# Files concatenated into each bundle, in order. The {% bundle %} tag
+# includes the sources one by one when the pipeline is off.
+NETWORK_STATIC_BUNDLES = {
+    'network/bundle.js': [
+        'network/csrf.js',
+        'network/edit_post.js',
+        'network/network.js',
+    ],
+    'network/bundle.css': [
+        'network/styles.css',
+    ],
+}
+
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': (
+            'network.assets.StaticStorage' if NETWORK_STATIC_PIPELINE
+            else 'django.contrib.staticfiles.storage.StaticFilesStorage'),
+    },
+}
+
+
+# Following feed fan-out
+# Posts are written to each follower's timeline, except for authors with at
+# least NETWORK_CELEBRITY_FOLLOWERS followers, whose posts are merged in when
+# the feed is read. Following someone copies up to NETWORK_TIMELINE_BACKFILL
+# of their latest posts into the new follower's timeline, and so does an
+# author's dropping below the threshold, into every follower's timeline.
+
+NETWORK_CELEBRITY_FOLLOWERS = 1000
+
+NETWORK_TIMELINE_BACKFILL = 200
+
+
+# Trending feed (see network/trending.py)
+# Seconds after which a post needs ten times the likes to keep its rank.
+# Run rebuild_trending after changing it.
+
+NETWORK_TRENDING_DECAY = 12 * 3600
+
+NETWORK_TRENDING_SIZE = 50
+
+
+# Archive (see network/archive.py)
+# archive_posts moves posts older than this out of the hot Post table.
+
+NETWORK_ARCHIVE_AFTER_DAYS = int(os.environ.get('NETWORK_ARCHIVE_AFTER_DAYS', '365'))
+
+
+# Follow graph (see network/graph.py)
+# Each process caches who users follow, evicting least recently used users
+# once the cached lists hold NETWORK_GRAPH_CACHE_IDS ids (8 bytes each).
+# "Who to follow" reads the lists of at most NETWORK_GRAPH_SUGGESTION_SOURCES
+# of the people a user follows. Lists are reloaded after
+# NETWORK_GRAPH_MAX_AGE seconds, the longest another process's follow can
+# go unseen when the default cache is not shared.
+
+NETWORK_GRAPH_CACHE_IDS = 1_000_000
+
+NETWORK_GRAPH_MAX_AGE = 30
+
+NETWORK_GRAPH_SUGGESTION_SOURCES = 100
+
+
+# Like writes
+# With NETWORK_LIKE_BUFFERING on, like toggles are collected in memory and
+# written in bulk once NETWORK_LIKE_BUFFER_SIZE events are pending or
+# NETWORK_LIKE_BUFFER_DELAY seconds have passed (see network/likes.py).
+
+NETWORK_LIKE_BUFFERING = False
+
+NETWORK_LIKE_BUFFER_SIZE = 500
+
+NETWORK_LIKE_BUFFER_DELAY = 1.0
+
+
+# Write throttling (see network/throttling.py)
+# Token buckets per user and per client IP for each write view, as
+# "requests/period" with periods s, m, h or d; the count is also the
+# largest burst. Over-limit requests get a 429. Buckets live in the
+# NETWORK_THROTTLE_CACHE cache, which must be large enough to never evict a
+# live bucket; point it at a shared cache so all processes enforce one
+# limit. REMOTE_ADDR must be the client's address, so set it
+# from the proxy's header when running behind one.
+
+NETWORK_THROTTLING = os.environ.get('NETWORK_THROTTLING', '1') == '1'
+
+NETWORK_THROTTLE_CACHE = 'throttle'
+
+NETWORK_THROTTLE_RATES = {
+    'new_post': {'user': '10/m', 'ip': '60/m'},
+    'edit_post': {'user': '30/m', 'ip': '120/m'},
+    'toggle_like': {'user': '120/m', 'ip': '600/m'},
+    'toggle_follow': {'user': '60/m', 'ip': '300/m'},
+}
+
+# Background tasks (see network/tasks.py)
+# NETWORK_TASK_BACKEND is "local" (a thread pool in the web process runs
+# tasks after commit), "database" (only `manage.py run_tasks` workers run
+# them) or "immediate" (inline, for tests). Either of the first two needs
+# a shared cache once tasks run outside the process that serves the page.
+# The local backend still needs a `run_tasks` worker, for the tasks of web
+# processes that exited before running them.
+# Failed tasks are retried NETWORK_TASK_MAX_ATTEMPTS times in total, after
+# NETWORK_TASK_RETRY_DELAY seconds, doubling each time; a worker holds a
+# task for NETWORK_TASK_LEASE seconds before others may take it over.
+# Finished tasks are deleted after NETWORK_TASK_RETENTION seconds.
+
+NETWORK_TASK_BACKEND = os.environ.get('NETWORK_TASK_BACKEND', 'local')
+
+NETWORK_TASK_LOCAL_THREADS = 2
+
+NETWORK_TASK_MAX_ATTEMPTS = 5
+
+NETWORK_TASK_RETRY_DELAY = 2
+
+NETWORK_TASK_LEASE = 300
+
+NETWORK_TASK_RETENTION = 86400
+
+# Live updates (Server-Sent Events, ASGI only)
+# Streams batch events for NETWORK_PUSH_INTERVAL seconds before sending.
+# NETWORK_EVENT_BROKER must reach every process serving streams; the local
+# broker only works with a single ASGI process.
+
+NETWORK_EVENT_BROKER = 'network.events.LocalBroker'
+
+NETWORK_PUSH_INTERVAL = 1.0
+
+
+# Request instrumentation (see network/instrumentation.py)
+# Per-view timings are served in the Prometheus text format at /metrics to
+# NETWORK_METRICS_ALLOWED_IPS, a comma separated list that is empty (the
+# endpoint refuses everyone) unless set. The check is on REMOTE_ADDR: behind
+# a reverse proxy every client has the proxy's address, so list the
+# scraper's own address only if the proxy does not forward /metrics, or
+# set REMOTE_ADDR from the proxy's header first (as for throttling).
+# Requests taking NETWORK_SLOW_REQUEST_SECONDS or longer are logged to
+# "network.slow_requests" with their slowest queries, for a
+# NETWORK_SLOW_REQUEST_SAMPLE_RATE fraction of them.
+
+NETWORK_METRICS_ALLOWED_IPS = [
+    ip for ip in os.environ.get('NETWORK_METRICS_ALLOWED_IPS', '').split(',') if ip
+]
+
+NETWORK_SLOW_REQUEST_SECONDS = 0.5
+
+NETWORK_SLOW_REQUEST_SAMPLE_RATE = 1.0
+
+NETWORK_SLOW_REQUEST_TOP_QUERIES = 5
+
+# The app's warnings (slow requests, failed tasks and flushes) go to stderr.
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'network': {'handlers': ['console'], 'level': 'WARNING'},
+    },
+}